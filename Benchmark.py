@@ -0,0 +1,305 @@
+import argparse
+import io
+import json
+import logging
+import time
+from datetime import datetime
+from typing import Optional
+
+import numpy as np
+
+from BenchmarkServer import BenchmarkServer
+from ChangeRecord import ChangeRecord
+from HttpClient import HttpClient
+from Osm2RdfBackend import FakeOsm2RdfBackend
+from Osm2RdfConnector import Osm2RdfConnector
+from OsmChangeReader import OsmChangeReader
+from OsmLiveUpdates import OsmLiveUpdates
+from ReplicationClient import ReplicationClient
+from SparqlConnector import SparqlConnector, OutputFormat
+from SyntheticDiffGenerator import SyntheticDiffGenerator
+
+STAGES = ('fetch', 'parse', 'convert', 'update', 'end_to_end')
+
+
+class Benchmark:
+    generator: SyntheticDiffGenerator
+    number_of_diffs: int
+    first_sequence_number: int
+    latency: float
+    batch_conversion: bool
+    prefetch_depth: int
+    sparql_max_batch_operations: int
+    osm2rdf_workers: int
+    pipeline: bool
+    graph_store: bool
+    latencies: dict[str, list[float]]
+    number_of_changes: dict[str, int]
+
+    def __init__(
+            self,
+            generator: SyntheticDiffGenerator,
+            number_of_diffs: int = 10,
+            first_sequence_number: int = 1000,
+            latency: float = 0,
+            batch_conversion: bool = True,
+            prefetch_depth: int = 0,
+            sparql_max_batch_operations: int = 100,
+            osm2rdf_workers: int = 1,
+            pipeline: bool = False,
+            graph_store: bool = False) -> None:
+        """
+        Measures the throughput and latency of each stage of the pipeline with synthetic diffs, without network
+        access, docker or a real sparql endpoint. The replication server, the node api and the sparql endpoint are
+        replaced by a local BenchmarkServer and osm2rdf by the FakeOsm2RdfBackend. The stages fetch, parse, convert
+        and update are measured separately, diff by diff, and the whole pipeline of OsmLiveUpdates end to end.
+
+        :param generator: The generator of the synthetic diffs
+        :param number_of_diffs: The number of diffs to process
+        :param first_sequence_number: The sequence number of the first diff
+        :param latency: The time in seconds that each response of the local server is delayed
+        :param batch_conversion: If True, the end to end run converts the elements of a diff together
+        :param prefetch_depth: The number of diffs that the end to end run fetches ahead
+        :param sparql_max_batch_operations: The maximum number of operations in one sparql update request
+        :param osm2rdf_workers: The number of conversions that the end to end run executes at the same time
+        :param pipeline: If True, the end to end run overlaps parsing, conversion and the sparql updates
+        :param graph_store: If True, the triples are inserted through the graph store protocol instead of sparql
+        updates
+        """
+        self.generator = generator
+        self.number_of_diffs = number_of_diffs
+        self.first_sequence_number = first_sequence_number
+        self.latency = latency
+        self.batch_conversion = batch_conversion
+        self.prefetch_depth = prefetch_depth
+        self.sparql_max_batch_operations = sparql_max_batch_operations
+        self.osm2rdf_workers = osm2rdf_workers
+        self.pipeline = pipeline
+        self.graph_store = graph_store
+        self.latencies = {stage: [] for stage in STAGES}
+        self.number_of_changes = {stage: 0 for stage in STAGES}
+
+    def run(self) -> dict[str, dict[str, float]]:
+        """
+        Runs all stages one after another.
+        :return: The report of each stage, see get_report()
+        """
+        last_sequence_number = self.first_sequence_number + self.number_of_diffs - 1
+        server = BenchmarkServer(self.generator, self.first_sequence_number, last_sequence_number, self.latency)
+        server.start()
+
+        # Generate the diffs up front, so that the generation is not measured as part of any stage
+        for sequence_number in range(self.first_sequence_number, last_sequence_number + 1):
+            server.get_diff(sequence_number)
+
+        try:
+            diffs = self.__run_fetch(server)
+            changes = self.__run_parse(diffs)
+            triples = self.__run_convert(changes)
+            self.__run_update(server, changes, triples)
+            self.__run_end_to_end(server)
+        finally:
+            server.stop()
+
+        logging.info(f"Requests to the local server: {dict(server.number_of_requests)}, "
+                     f"{server.number_of_sparql_bytes} bytes of sparql updates")
+        return self.get_report()
+
+    def __run_fetch(self, server: BenchmarkServer) -> list[bytes]:
+        """
+        Fetches the state files and diffs from the local replication server.
+        :return: The compressed diffs
+        """
+        http_client = HttpClient()
+        replication_client = ReplicationClient(http_client, base_url=server.get_replication_url())
+        diffs: list[bytes] = []
+        for sequence_number in range(self.first_sequence_number, self.first_sequence_number + self.number_of_diffs):
+            start_time = time.perf_counter()
+            data, _ = replication_client.fetch_diff_if_state_exists(sequence_number)
+            self.__record('fetch', start_time, 0)
+            diffs.append(data)
+
+        http_client.close()
+        return diffs
+
+    def __run_parse(self, diffs: list[bytes]) -> list[list[tuple[str, ChangeRecord]]]:
+        """
+        Reads the changes of each diff.
+        :return: The changes of each diff
+        """
+        changes: list[list[tuple[str, ChangeRecord]]] = []
+        for diff in diffs:
+            start_time = time.perf_counter()
+            diff_changes = list(OsmChangeReader(io.BytesIO(diff)))
+            self.__record('parse', start_time, len(diff_changes))
+            changes.append(diff_changes)
+
+        # The number of changes is only known after parsing, so it is added to the fetch stage afterward
+        self.number_of_changes['fetch'] = self.number_of_changes['parse']
+        return changes
+
+    def __run_convert(self, changes: list[list[tuple[str, ChangeRecord]]]) -> list[str]:
+        """
+        Converts the created and modified elements of each diff with one run of the fake osm2rdf backend.
+        :return: The triples of each diff
+        """
+        connector = Osm2RdfConnector("", "", FakeOsm2RdfBackend())
+        triples: list[str] = []
+        for diff_changes in changes:
+            start_time = time.perf_counter()
+            osm_data = b''.join(element.to_xml() for action, element in diff_changes if action != 'delete')
+            triples.append(connector.convert(osm_data) if osm_data != b'' else '')
+            self.__record('convert', start_time, len(diff_changes))
+
+        return triples
+
+    def __run_update(
+            self,
+            server: BenchmarkServer,
+            changes: list[list[tuple[str, ChangeRecord]]],
+            triples: list[str]) -> None:
+        """
+        Sends the deletes of all changed elements and the inserts of the converted triples to the stub sparql
+        endpoint.
+        """
+        connector = SparqlConnector(server.get_sparql_url(), self.__get_output_format(),
+                                    self.sparql_max_batch_operations, graph_store_url=server.get_graph_store_url())
+        for diff_changes, diff_triples in zip(changes, triples):
+            start_time = time.perf_counter()
+            for action, element in diff_changes:
+                if action != 'create':
+                    name = 'rel' if element.type == 'relation' else element.type
+                    connector.delete_subject(f"osm{name}:{element.id}")
+            for line in diff_triples.split('\n'):
+                if line != '':
+                    connector.insert_triples(line)
+            connector.flush()
+            self.__record('update', start_time, len(diff_changes))
+
+    def __run_end_to_end(self, server: BenchmarkServer) -> None:
+        """
+        Processes all diffs with OsmLiveUpdates, from fetching them to sending the updates to the stub sparql
+        endpoint.
+        """
+        olu = OsmLiveUpdates("", "", server.get_sparql_url(), self.__get_output_format(), self.batch_conversion,
+                             osm2rdf_backend=FakeOsm2RdfBackend(),
+                             sparql_max_batch_operations=self.sparql_max_batch_operations,
+                             osm_api_url=server.get_api_url(), replication_base_url=server.get_replication_url(),
+                             osm2rdf_workers=self.osm2rdf_workers, pipeline=self.pipeline,
+                             graph_store_url=server.get_graph_store_url())
+        try:
+            olu.fetch_change(self.first_sequence_number - 1, self.prefetch_depth)
+        finally:
+            olu.close()
+
+        for summary in olu.metrics.diff_summaries:
+            self.latencies['end_to_end'].append(summary['seconds'])
+            self.number_of_changes['end_to_end'] += sum(value for name, value in summary['counters'].items()
+                                                        if name.startswith('changes.'))
+
+    def __get_output_format(self) -> OutputFormat:
+        return OutputFormat.GRAPH_STORE if self.graph_store else OutputFormat.SPARQL_ENDPOINT
+
+    def __record(self, stage: str, start_time: float, number_of_changes: int) -> None:
+        """
+        Records the latency and the number of changes of one unit of work of a stage.
+        """
+        self.latencies[stage].append(time.perf_counter() - start_time)
+        self.number_of_changes[stage] += number_of_changes
+
+    def get_report(self) -> dict[str, dict[str, float]]:
+        """
+        :return: For each stage the number of changes, the total time in seconds, the throughput in changes per
+        second and the mean, median, 95th percentile and maximum latency in seconds. The latencies are measured per
+        diff.
+        """
+        report: dict[str, dict[str, float]] = {}
+        for stage in STAGES:
+            latencies = np.array(self.latencies[stage])
+            if len(latencies) == 0:
+                continue
+
+            seconds = float(latencies.sum())
+            report[stage] = {
+                'changes': self.number_of_changes[stage],
+                'seconds': seconds,
+                'changes_per_second': self.number_of_changes[stage] / seconds if seconds > 0 else 0,
+                'mean_latency': float(latencies.mean()),
+                'p50_latency': float(np.percentile(latencies, 50)),
+                'p95_latency': float(np.percentile(latencies, 95)),
+                'max_latency': float(latencies.max()),
+            }
+
+        return report
+
+    @staticmethod
+    def format_report(report: dict[str, dict[str, float]]) -> str:
+        """
+        Formats the report as a table with one row per stage.
+        """
+        lines = [f"{'stage':<12}{'changes':>10}{'seconds':>10}{'changes/s':>12}{'mean ms':>10}{'p50 ms':>10}"
+                 f"{'p95 ms':>10}{'max ms':>10}"]
+        for stage, result in report.items():
+            lines.append(f"{stage:<12}{result['changes']:>10}{result['seconds']:>10.3f}"
+                         f"{result['changes_per_second']:>12.1f}{result['mean_latency'] * 1000:>10.2f}"
+                         f"{result['p50_latency'] * 1000:>10.2f}{result['p95_latency'] * 1000:>10.2f}"
+                         f"{result['max_latency'] * 1000:>10.2f}")
+        return '\n'.join(lines)
+
+
+def parse_mix(value: str) -> tuple[float, float, float]:
+    """
+    Parses a mix of three shares, like '0.8,0.15,0.05'.
+    """
+    shares = tuple(float(share) for share in value.split(','))
+    if len(shares) != 3:
+        raise argparse.ArgumentTypeError(f"Expected three comma separated shares, got \"{value}\"")
+    return shares
+
+
+def main(arguments: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Offline benchmark of the live update pipeline with synthetic diffs")
+    parser.add_argument('--diffs', type=int, default=10, help="The number of diffs to process")
+    parser.add_argument('--changes', type=int, default=1000, help="The number of changes per diff")
+    parser.add_argument('--element-mix', type=parse_mix, default=(0.8, 0.15, 0.05),
+                        help="The share of nodes, ways and relations, like 0.8,0.15,0.05")
+    parser.add_argument('--action-mix', type=parse_mix, default=(0.4, 0.45, 0.15),
+                        help="The share of created, modified and deleted elements, like 0.4,0.45,0.15")
+    parser.add_argument('--nodes-per-way', type=int, default=10)
+    parser.add_argument('--members-per-relation', type=int, default=5)
+    parser.add_argument('--tags-per-element', type=int, default=2)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--latency', type=float, default=0,
+                        help="The delay of each response of the local server in seconds")
+    parser.add_argument('--no-batch-conversion', action='store_true',
+                        help="Convert every element on its own in the end to end run")
+    parser.add_argument('--prefetch-depth', type=int, default=0)
+    parser.add_argument('--sparql-max-batch-operations', type=int, default=100)
+    parser.add_argument('--osm2rdf-workers', type=int, default=1,
+                        help="The number of conversions that the end to end run executes at the same time")
+    parser.add_argument('--pipeline', action='store_true',
+                        help="Overlap parsing, conversion and the sparql updates in the end to end run")
+    parser.add_argument('--graph-store', action='store_true',
+                        help="Insert the triples through the graph store protocol instead of sparql updates")
+    parser.add_argument('--output', help="Path of a JSON file to which the report is written")
+    args = parser.parse_args(arguments)
+
+    logging.getLogger().setLevel(logging.WARNING)
+    generator = SyntheticDiffGenerator(args.changes, args.element_mix, args.action_mix, args.nodes_per_way,
+                                       args.members_per_relation, args.tags_per_element, seed=args.seed)
+    benchmark = Benchmark(generator, args.diffs, latency=args.latency, batch_conversion=not args.no_batch_conversion,
+                          prefetch_depth=args.prefetch_depth,
+                          sparql_max_batch_operations=args.sparql_max_batch_operations,
+                          osm2rdf_workers=args.osm2rdf_workers, pipeline=args.pipeline,
+                          graph_store=args.graph_store)
+    report = benchmark.run()
+    print(Benchmark.format_report(report))
+
+    if args.output is not None:
+        with open(args.output, 'w') as file:
+            json.dump({'created': datetime.now().isoformat(), 'arguments': vars(args), 'stages': report}, file,
+                      indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,223 @@
+import re
+import socket
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import urlsplit, parse_qs
+
+from SyntheticDiffGenerator import SyntheticDiffGenerator
+
+REPLICATION_PATH = "/replication"
+API_PATH = "/api/0.6"
+SPARQL_PATH = "/sparql"
+GRAPH_STORE_PATH = "/data"
+
+SPARQL_UPDATE_RESPONSE = b'<?xml version="1.0"?><sparql xmlns="http://www.w3.org/2005/sparql-results#"></sparql>'
+
+
+class BenchmarkServer:
+    generator: SyntheticDiffGenerator
+    first_sequence_number: int
+    latest_sequence_number: int
+    latency: float
+    diffs: dict[int, bytes]
+    number_of_requests: Counter
+    number_of_sparql_bytes: int
+    number_of_graph_store_bytes: int
+    number_of_graph_store_triples: int
+    record_graph_store_documents: bool
+    graph_store_documents: list[bytes]
+
+    def __init__(
+            self,
+            generator: SyntheticDiffGenerator,
+            first_sequence_number: int,
+            latest_sequence_number: int,
+            latency: float = 0,
+            record_graph_store_documents: bool = False) -> None:
+        """
+        Local stand-in for the osm replication server, the node api of osm, a sparql endpoint and a graph store
+        protocol endpoint, so that the whole pipeline can be benchmarked without network access. The diffs are
+        generated by the passed generator when they are requested for the first time, the sparql endpoint accepts
+        every update and only counts it, and the graph store counts the triples of every posted turtle document.
+
+        :param generator: The generator of the diffs and of the nodes of the node api
+        :param first_sequence_number: The sequence number of the first diff that has a state file
+        :param latest_sequence_number: The sequence number of the latest diff
+        :param latency: The time in seconds that each response is delayed, to simulate the network
+        :param record_graph_store_documents: If True, the posted turtle documents are kept, so that they can be
+        compared with the inserted triples
+        """
+        self.generator = generator
+        self.first_sequence_number = first_sequence_number
+        self.latest_sequence_number = latest_sequence_number
+        self.latency = latency
+        self.diffs = {}
+        self.number_of_requests = Counter()
+        self.number_of_sparql_bytes = 0
+        self.number_of_graph_store_bytes = 0
+        self.number_of_graph_store_triples = 0
+        self.record_graph_store_documents = record_graph_store_documents
+        self.graph_store_documents = []
+        self.__lock = threading.Lock()
+        self.__server: Optional[ThreadingHTTPServer] = None
+        self.__thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """
+        Starts the server on a free port of localhost in a background thread.
+        """
+        self.__server = ThreadingHTTPServer(('127.0.0.1', 0), self.__create_handler())
+        self.__server.daemon_threads = True
+        self.__thread = threading.Thread(target=self.__server.serve_forever, daemon=True)
+        self.__thread.start()
+
+    def stop(self) -> None:
+        """
+        Stops the server.
+        """
+        if self.__server is not None:
+            self.__server.shutdown()
+            self.__server.server_close()
+            self.__server = None
+
+    def get_url(self) -> str:
+        return f"http://127.0.0.1:{self.__server.server_address[1]}"
+
+    def get_replication_url(self) -> str:
+        return f"{self.get_url()}{REPLICATION_PATH}"
+
+    def get_api_url(self) -> str:
+        return f"{self.get_url()}{API_PATH}"
+
+    def get_sparql_url(self) -> str:
+        return f"{self.get_url()}{SPARQL_PATH}"
+
+    def get_graph_store_url(self) -> str:
+        return f"{self.get_url()}{GRAPH_STORE_PATH}?default"
+
+    def get_diff(self, sequence_number: int) -> bytes:
+        """
+        :param sequence_number: The sequence number of the diff
+        :return: The gzip compressed diff, which is generated once and then kept in memory
+        """
+        with self.__lock:
+            diff = self.diffs.get(sequence_number)
+        if diff is None:
+            diff = self.generator.generate(sequence_number)
+            with self.__lock:
+                self.diffs[sequence_number] = diff
+        return diff
+
+    def get_state(self, sequence_number: int) -> bytes:
+        """
+        :param sequence_number: The sequence number of the diff
+        :return: The state file of the diff, in the format of the osm server
+        """
+        timestamp = self.generator.get_timestamp(sequence_number).strftime('%Y-%m-%dT%H:%M:%SZ').replace(':', '\\:')
+        return f"#Synthetic state\nsequenceNumber={sequence_number}\ntimestamp={timestamp}\n".encode()
+
+    def __handle_get(self, url: str) -> tuple[int, bytes]:
+        """
+        Answers a GET request to the replication server or the node api.
+        :return: The status and the body of the response
+        """
+        parts = urlsplit(url)
+        if parts.path == f"{REPLICATION_PATH}/minute/state.txt":
+            self.__count('state')
+            return 200, self.get_state(self.latest_sequence_number)
+
+        match = re.fullmatch(rf"{REPLICATION_PATH}/minute/(\d{{3}})/(\d{{3}})/(\d{{3}})\.(state\.txt|osc\.gz)",
+                             parts.path)
+        if match is not None:
+            sequence_number = int(''.join(match.group(1, 2, 3)))
+            if not self.first_sequence_number <= sequence_number <= self.latest_sequence_number:
+                return 404, b''
+            if match.group(4) == 'state.txt':
+                self.__count('state')
+                return 200, self.get_state(sequence_number)
+            self.__count('diff')
+            return 200, self.get_diff(sequence_number)
+
+        if parts.path == f"{API_PATH}/nodes":
+            self.__count('nodes')
+            node_ids = parse_qs(parts.query).get('nodes', [''])[0].split(',')
+            nodes = b''.join(self.generator.get_node(int(node_id)) for node_id in node_ids if node_id.isdigit())
+            return 200, b'<osm version="0.6">' + nodes + b'</osm>'
+
+        match = re.fullmatch(rf"{API_PATH}/node/(\d+)", parts.path)
+        if match is not None:
+            self.__count('node')
+            return 200, b'<osm version="0.6">' + self.generator.get_node(int(match.group(1))) + b'</osm>'
+
+        return 404, b''
+
+    def __handle_post(self, url: str, content_type: str, body: bytes) -> tuple[int, bytes]:
+        """
+        Answers a POST request to the sparql endpoint or the graph store.
+        :return: The status and the body of the response
+        """
+        path = urlsplit(url).path
+        if path == GRAPH_STORE_PATH:
+            if not content_type.startswith('text/turtle'):
+                return 415, b''
+
+            # Every line that is not a prefix is a triple, like in the output of osm2rdf
+            self.__count('graph_store')
+            with self.__lock:
+                self.number_of_graph_store_bytes += len(body)
+                self.number_of_graph_store_triples += sum(1 for line in body.split(b'\n')
+                                                          if line.endswith(b' .') and not line.startswith(b'@prefix'))
+                if self.record_graph_store_documents:
+                    self.graph_store_documents.append(body)
+            return 204, b''
+
+        if path != SPARQL_PATH:
+            return 404, b''
+
+        self.__count('sparql')
+        with self.__lock:
+            self.number_of_sparql_bytes += len(body)
+        return 200, SPARQL_UPDATE_RESPONSE
+
+    def __count(self, request_type: str) -> None:
+        with self.__lock:
+            self.number_of_requests[request_type] += 1
+
+    def __create_handler(self) -> type:
+        """
+        Creates the request handler class, which passes the requests to this server.
+        """
+        handle_get = self.__handle_get
+        handle_post = self.__handle_post
+        latency = self.latency
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def setup(self) -> None:
+                super().setup()
+                # Otherwise the headers and the body of a response are delayed by the Nagle algorithm
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            def do_GET(self) -> None:
+                self.__respond(*handle_get(self.path))
+
+            def do_POST(self) -> None:
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                self.__respond(*handle_post(self.path, self.headers.get('Content-Type', ''), body))
+
+            def __respond(self, status: int, body: bytes) -> None:
+                if latency > 0:
+                    time.sleep(latency)
+                self.send_response(status)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args) -> None:
+                pass
+
+        return Handler
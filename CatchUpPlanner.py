@@ -0,0 +1,97 @@
+import logging
+import math
+from datetime import datetime
+from typing import Optional
+
+from Constants import REPLICATION_GRANULARITIES, CATCH_UP_DAY_LAG, CATCH_UP_HOUR_LAG, CATCH_UP_MAX_SEARCH_STEPS
+from ReplicationClient import ReplicationClient
+
+
+class CatchUpPlanner:
+    replication_client: ReplicationClient
+    day_lag: float
+    hour_lag: float
+
+    def __init__(
+            self,
+            replication_client: ReplicationClient,
+            day_lag: float = CATCH_UP_DAY_LAG,
+            hour_lag: float = CATCH_UP_HOUR_LAG) -> None:
+        """
+        Plans how to catch up after a long outage with the 'day' and 'hour' replication streams, whose diffs contain
+        the changes of many minute diffs at once. The position in each stream is found with the timestamps of its
+        state files. A coarse diff may contain changes that were already applied, because its interval begins before
+        the applied timestamp. Applying them again is safe, because every element ends up in its latest version.
+
+        :param replication_client: The client for the state files of the replication streams
+        :param day_lag: The lag in seconds behind the latest minute diff from which day diffs are applied
+        :param hour_lag: The lag in seconds behind the latest minute diff from which hour diffs are applied
+        """
+        self.replication_client = replication_client
+        self.day_lag = day_lag
+        self.hour_lag = hour_lag
+
+    def plan(self, timestamp: datetime) -> list[tuple[str, int, int]]:
+        """
+        Plans the coarse diffs that are applied after the passed timestamp, first day diffs while the lag is at least
+        day_lag, then hour diffs while it is at least hour_lag. The remaining changes are left to the minute diffs.
+        :param timestamp: The timestamp up to which all changes are applied
+        :return: The granularity and the first and last sequence number of each range of diffs to apply, in order
+        """
+        _, latest_timestamp = self.replication_client.fetch_latest_state()
+        steps: list[tuple[str, int, int]] = []
+        for granularity, lag in (('day', self.day_lag), ('hour', self.hour_lag)):
+            if (latest_timestamp - timestamp).total_seconds() < lag:
+                continue
+
+            latest_sequence_number, latest_stream_timestamp = self.replication_client.fetch_latest_state(granularity)
+            if latest_stream_timestamp <= timestamp:
+                continue
+
+            # The first diff to apply is the one whose interval contains the timestamp
+            first_sequence_number = self.find_sequence_number(granularity, timestamp) + 1
+            steps.append((granularity, first_sequence_number, latest_sequence_number))
+            timestamp = latest_stream_timestamp
+            logging.info(f"Catching up with {latest_sequence_number - first_sequence_number + 1} {granularity} diffs "
+                         f"up to {latest_stream_timestamp}")
+
+        return steps
+
+    def find_sequence_number(self, granularity: str, timestamp: datetime) -> int:
+        """
+        Finds the last diff of a replication stream whose state timestamp is not after the passed timestamp. The
+        sequence number is estimated from the latest state and the interval of the stream, and then corrected with
+        the timestamps of the state files around it.
+        :param granularity: The replication stream, 'minute', 'hour' or 'day'
+        :param timestamp: The timestamp to search for
+        :return: The sequence number of the diff
+        """
+        latest_sequence_number, latest_timestamp = self.replication_client.fetch_latest_state(granularity)
+        if timestamp >= latest_timestamp:
+            return latest_sequence_number
+
+        interval = REPLICATION_GRANULARITIES[granularity]
+        sequence_number = latest_sequence_number - math.ceil((latest_timestamp - timestamp).total_seconds() / interval)
+        for _ in range(CATCH_UP_MAX_SEARCH_STEPS):
+            if sequence_number < 1:
+                break
+
+            sequence_timestamp = self.__fetch_timestamp(granularity, sequence_number)
+            if sequence_timestamp is None:
+                sequence_number -= 1
+            elif sequence_timestamp > timestamp:
+                sequence_number -= max(1, int((sequence_timestamp - timestamp).total_seconds() // interval))
+            else:
+                next_timestamp = self.__fetch_timestamp(granularity, sequence_number + 1)
+                if next_timestamp is None or next_timestamp > timestamp:
+                    return sequence_number
+                sequence_number += 1 + int((timestamp - next_timestamp).total_seconds() // interval)
+
+        raise CatchUpPlannerException(f"Could not find the {granularity} diff for the timestamp {timestamp}")
+
+    def __fetch_timestamp(self, granularity: str, sequence_number: int) -> Optional[datetime]:
+        return self.replication_client.fetch_timestamp_for_sequence_number(sequence_number, granularity)
+
+
+class CatchUpPlannerException(Exception):
+    pass
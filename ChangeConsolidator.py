@@ -0,0 +1,83 @@
+from typing import Iterable, Optional
+
+from ChangeRecord import ChangeRecord
+from Constants import OSM_ELEMENT_TYPES
+
+
+class ChangeConsolidator:
+    changes: dict[tuple[str, str], tuple[str, ChangeRecord]]
+    number_of_changes: int
+
+    def __init__(self) -> None:
+        """
+        Merges the changes of a range of diffs into the net change for each element, so that an element that is
+        changed several times within the range is only processed once. The changes are keyed by the type and id of
+        the element, and the net change always holds the latest version of the element:
+
+        - create followed by modify becomes create
+        - create followed by delete cancels out
+        - modify followed by delete becomes delete
+        - delete followed by create or modify becomes modify
+        """
+        self.changes = {}
+        self.number_of_changes = 0
+
+    def add_changes(self, changes: Iterable[tuple[str, ChangeRecord]]) -> None:
+        """
+        Adds the changes of a diff. The diffs have to be added in the order of their sequence numbers.
+        :param changes: The changes of the diff as tuples of action and element
+        """
+        for action, element in changes:
+            self.add_change(action, element)
+
+    def add_change(self, action: str, element: ChangeRecord) -> None:
+        """
+        Merges a change into the net change of its element.
+        :param action: The action of the change, 'create', 'modify' or 'delete'
+        :param element: The element of the change
+        """
+        self.number_of_changes += 1
+        key = (element.type, element.id)
+
+        # The net change keeps the position at which the element was first changed, only its action and version are
+        # updated
+        previous_action: Optional[str] = None
+        if key in self.changes:
+            previous_action = self.changes[key][0]
+
+        net_action = self.__merge_actions(previous_action, action)
+        if net_action is None:
+            del self.changes[key]
+        else:
+            element.action = net_action
+            self.changes[key] = (net_action, element)
+
+    @staticmethod
+    def __merge_actions(previous_action: Optional[str], action: str) -> Optional[str]:
+        """
+        Returns the net action of two consecutive actions on the same element.
+        :param previous_action: The net action so far, or None if the element was not changed so far
+        :param action: The action that follows
+        :return: The net action, or None if the actions cancel each other out
+        """
+        if previous_action is None:
+            return action
+
+        if action == 'delete':
+            return None if previous_action == 'create' else 'delete'
+
+        return 'create' if previous_action == 'create' else 'modify'
+
+    def get_changes(self) -> list[tuple[str, ChangeRecord]]:
+        """
+        :return: The net changes as tuples of action and element, grouped by type with the nodes first, then the
+        ways and relations, so that the nodes of a way are processed before it like in a diff. Within each type they
+        are in the order in which the elements were first changed.
+        """
+        return sorted(self.changes.values(), key=lambda change: OSM_ELEMENT_TYPES.index(change[1].type))
+
+    def get_number_of_eliminated_changes(self) -> int:
+        """
+        :return: The number of changes that do not have to be processed because of the consolidation
+        """
+        return self.number_of_changes - len(self.changes)
@@ -0,0 +1,162 @@
+import re
+from typing import Iterable, Optional
+from xml.etree import ElementTree
+
+# The attributes of an element in the order in which they are written, besides the id
+ATTRIBUTES = ('version', 'timestamp', 'changeset', 'uid', 'user', 'lat', 'lon')
+
+XML_ESCAPES = str.maketrans({'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', '\n': '&#10;', '\r': '&#13;',
+                             '\t': '&#09;'})
+XML_SPECIAL_CHARACTERS = re.compile('[&<>"\n\r\t]')
+
+
+class ChangeRecord:
+    __slots__ = ('action', 'type', 'id', 'version', 'timestamp', 'changeset', 'uid', 'user', 'lat', 'lon', 'tags',
+                 'node_refs', 'members')
+
+    action: str
+    type: str
+    id: str
+    version: Optional[str]
+    timestamp: Optional[str]
+    changeset: Optional[str]
+    uid: Optional[str]
+    user: Optional[str]
+    lat: Optional[str]
+    lon: Optional[str]
+    tags: list[tuple[str, str]]
+    node_refs: list[str]
+    members: list[tuple[str, str, str]]
+
+    def __init__(
+            self,
+            action: str,
+            type: str,
+            id: str,
+            version: Optional[str] = None,
+            timestamp: Optional[str] = None,
+            changeset: Optional[str] = None,
+            uid: Optional[str] = None,
+            user: Optional[str] = None,
+            lat: Optional[str] = None,
+            lon: Optional[str] = None,
+            tags: Optional[list[tuple[str, str]]] = None,
+            node_refs: Optional[list[str]] = None,
+            members: Optional[list[tuple[str, str, str]]] = None) -> None:
+        """
+        Compact representation of a changed osm element, which holds large or consolidated diffs with much less
+        memory than a tree of xml elements. The values are kept as the strings of the diff, and the element is
+        written back to osm xml with to_xml() without building a tree.
+
+        :param action: The action of the change, 'create', 'modify' or 'delete'
+        :param type: The type of the element, 'node', 'way' or 'relation'
+        :param id: The id of the element
+        :param version: The version of the element
+        :param timestamp: The timestamp of the version
+        :param changeset: The id of the changeset of the version
+        :param uid: The id of the user who created the version
+        :param user: The name of the user who created the version
+        :param lat: The latitude of a node
+        :param lon: The longitude of a node
+        :param tags: The tags of the element as tuples of key and value
+        :param node_refs: The ids of the nodes of a way
+        :param members: The members of a relation as tuples of type, id and role
+        """
+        self.action = action
+        self.type = type
+        self.id = id
+        self.version = version
+        self.timestamp = timestamp
+        self.changeset = changeset
+        self.uid = uid
+        self.user = user
+        self.lat = lat
+        self.lon = lon
+        self.tags = tags if tags is not None else []
+        self.node_refs = node_refs if node_refs is not None else []
+        self.members = members if members is not None else []
+
+    @classmethod
+    def from_element(cls, action: str, element: ElementTree.Element) -> 'ChangeRecord':
+        """
+        Creates the record of an element of an osmChange document.
+        :param action: The action of the change
+        :param element: The 'node', 'way' or 'relation' element
+        :return: The record of the change
+        """
+        attributes = element.attrib
+        record = cls(action, element.tag, attributes['id'], *(attributes.get(name) for name in ATTRIBUTES))
+        for child in element:
+            if child.tag == 'tag':
+                record.tags.append((child.attrib['k'], child.attrib['v']))
+            elif child.tag == 'nd':
+                record.node_refs.append(child.attrib['ref'])
+            elif child.tag == 'member':
+                record.members.append((child.attrib['type'], child.attrib['ref'], child.attrib.get('role', '')))
+        return record
+
+    @classmethod
+    def from_xml(cls, action: str, data: bytes) -> 'ChangeRecord':
+        """
+        Creates the record of an element from its osm xml, as written by to_xml().
+        """
+        return cls.from_element(action, ElementTree.fromstring(data))
+
+    def to_xml(self, extra_tags: Iterable[tuple[str, str]] = ()) -> bytes:
+        """
+        Writes the element as osm xml, for example as input for osm2rdf.
+        :param extra_tags: Tags that are written in addition to the tags of the element, like the temporary tag
+        :return: The xml of the element, without the action around it
+        """
+        parts = [f'<{self.type} id="{self.id}"']
+        for name in ATTRIBUTES:
+            value = getattr(self, name)
+            if value is not None:
+                parts.append(f' {name}="{escape(value)}"')
+
+        children: list[str] = []
+        for ref in self.node_refs:
+            children.append(f'<nd ref="{ref}"/>')
+        for member_type, ref, role in self.members:
+            children.append(f'<member type="{member_type}" ref="{ref}" role="{escape(role)}"/>')
+        for key, value in self.tags:
+            children.append(f'<tag k="{escape(key)}" v="{escape(value)}"/>')
+        for key, value in extra_tags:
+            children.append(f'<tag k="{escape(key)}" v="{escape(value)}"/>')
+
+        if len(children) == 0:
+            parts.append('/>')
+        else:
+            parts.append('>')
+            parts.extend(children)
+            parts.append(f'</{self.type}>')
+        return ''.join(parts).encode()
+
+    @staticmethod
+    def to_osm_change(records: Iterable['ChangeRecord']) -> bytes:
+        """
+        Writes the records as an osmChange document. Consecutive records with the same action share one action
+        element, so that the order of the records is kept.
+        """
+        parts = [b'<osmChange version="0.6" generator="osm-live-updates">']
+        action: Optional[str] = None
+        for record in records:
+            if record.action != action:
+                if action is not None:
+                    parts.append(f'</{action}>'.encode())
+                action = record.action
+                parts.append(f'<{action}>'.encode())
+            parts.append(record.to_xml())
+        if action is not None:
+            parts.append(f'</{action}>'.encode())
+        parts.append(b'</osmChange>')
+        return b''.join(parts)
+
+
+def escape(value: str) -> str:
+    """
+    Escapes a value for an xml attribute.
+    """
+    if XML_SPECIAL_CHARACTERS.search(value) is None:
+        return value
+    return value.translate(XML_ESCAPES)
@@ -0,0 +1,82 @@
+import os
+import re
+from datetime import datetime
+from typing import Optional
+
+
+class Checkpoint:
+    file_path: str
+    sequence_number: Optional[int]
+    timestamp: Optional[datetime]
+    granularity: str
+
+    def __init__(self, file_path: str) -> None:
+        """
+        Persists the sequence number and timestamp of the last diff that was completely applied, so that the updates
+        can be resumed from there after a restart. The file uses the same format as the state files on the osm server.
+        While catching up with the 'hour' or 'day' stream, the granularity of the diff is stored as well, because the
+        sequence number then belongs to that stream.
+
+        :param file_path: The path to the checkpoint file
+        """
+        self.file_path = file_path
+        self.sequence_number = None
+        self.timestamp = None
+        self.granularity = 'minute'
+
+    def load(self) -> Optional[int]:
+        """
+        Reads the checkpoint file, if it exists.
+        :return: The sequence number of the last applied diff, or None if there is no checkpoint yet
+        """
+        if not os.path.exists(self.file_path):
+            return None
+
+        with open(self.file_path) as file:
+            content = file.read()
+
+        sequence_number_match = re.search(r'sequenceNumber=(\d+)', content)
+        if sequence_number_match is None:
+            return None
+        self.sequence_number = int(sequence_number_match.group(1))
+
+        timestamp_match = re.search(r'timestamp=(\S+)', content)
+        if timestamp_match is not None:
+            self.timestamp = datetime.fromisoformat(timestamp_match.group(1).replace('\\:', ':').replace('Z', '+00:00'))
+
+        granularity_match = re.search(r'granularity=(\w+)', content)
+        self.granularity = granularity_match.group(1) if granularity_match is not None else 'minute'
+
+        return self.sequence_number
+
+    def save(self, sequence_number: int, timestamp: Optional[datetime], granularity: str = 'minute') -> None:
+        """
+        Atomically replaces the checkpoint file, so that it never contains a partially written checkpoint.
+        :param sequence_number: The sequence number of the last applied diff
+        :param timestamp: The timestamp of the last applied diff
+        :param granularity: The replication stream of the last applied diff
+        """
+        self.sequence_number = sequence_number
+        self.timestamp = timestamp
+        self.granularity = granularity
+
+        content = f"sequenceNumber={sequence_number}\n"
+        if timestamp is not None:
+            formatted_timestamp = timestamp.strftime('%Y-%m-%dT%H:%M:%SZ').replace(':', '\\:')
+            content += f"timestamp={formatted_timestamp}\n"
+        if granularity != 'minute':
+            content += f"granularity={granularity}\n"
+
+        temporary_file_path = f"{self.file_path}.tmp"
+        with open(temporary_file_path, 'w') as file:
+            file.write(content)
+            file.flush()
+            os.fsync(file.fileno())
+
+        os.replace(temporary_file_path, self.file_path)
+
+        directory = os.open(os.path.dirname(os.path.abspath(self.file_path)), os.O_RDONLY)
+        try:
+            os.fsync(directory)
+        finally:
+            os.close(directory)
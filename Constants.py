@@ -1,15 +1,73 @@
 OSM_REPLICATION_BASE_URL = "https://planet.openstreetmap.org/replication"
-OSM_NODE_URL = "https://www.openstreetmap.org/api/0.6/node"
+OSM_API_URL = "https://www.openstreetmap.org/api/0.6"
+OSM_NODE_URL = f"{OSM_API_URL}/node"
 CHANGE_FILE_EXTENSION = "osc.gz"
 STATE_FILE_EXTENSION = "state.txt"
 TEMPORARY_TAG = "TEMPORARY"
+OSM_ELEMENT_PREFIXES = ("osmnode:", "osmway:", "osmrel:")
+OSM_ELEMENT_TYPES = ("node", "way", "relation")
+
+# Follow mode, all values in seconds
+REPLICATION_INTERVAL = 60
+PUBLICATION_DELAY = 5
+MIN_POLL_INTERVAL = 2
+MAX_POLL_INTERVAL = 60
+
+# Replication streams with the interval of their diffs, and the lag behind the latest minute diff from which the
+# coarser streams are used to catch up, all in seconds
+REPLICATION_GRANULARITIES = {'minute': 60, 'hour': 60 * 60, 'day': 24 * 60 * 60}
+CATCH_UP_DAY_LAG = 2 * 24 * 60 * 60
+CATCH_UP_HOUR_LAG = 3 * 60 * 60
+CATCH_UP_MAX_SEARCH_STEPS = 50
+
+# Pipeline, the number of parsed changes and of sparql update requests that are queued between the stages
+PIPELINE_PARSE_QUEUE_SIZE = 10_000
+PIPELINE_MAX_PENDING_REQUESTS = 4
+
+# HttpClient
+HTTP_MAX_CONNECTIONS_PER_HOST = 8
+HTTP_MAX_CONCURRENT_REQUESTS = 16
+HTTP_MAX_RETRIES = 5
+HTTP_BACKOFF_BASE = 0.5
+HTTP_TIMEOUT = 30
+HTTP_MAX_REDIRECTS = 5
+HTTP_LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# The methods whose requests are retried after any temporary failure, because repeating them is safe
+HTTP_IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE')
+
+# ReplicationCache
+REPLICATION_CACHE_MAX_SIZE = 10 * 1024 ** 3
+
+# ReplicationPrefetcher
+PREFETCH_WORKERS = 4
+
+# NodeResolver
+NODE_CACHE_SIZE = 100_000
+NODE_FETCH_CHUNK_SIZE = 500
+
+# FlatNodeStore, the number of node ids by which the file grows
+FLAT_NODE_STORE_GROWTH = 2 ** 20
+
+# Metrics
+METRICS_PREFIX = "olu"
+METRICS_LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 60)
+METRICS_MAX_DIFF_SUMMARIES = 100
+
+# Statistics
+STATISTICS_PERCENTILES = (50, 90, 99)
+STATISTICS_HISTOGRAM_BINS = 20
 
 # Osm2RdfConnector
 OSM_2_RDF_INPUT_FILE_NAME = "tmp.osm"
-OSM_2_RDF_OUTPUT_FILE_NAME = "tmp.osm.ttl.bz2"
+# The minimum number of elements that a shard of a parallel conversion gets
+OSM_2_RDF_MIN_SHARD_SIZE = 50
 
 # SparqlConnector
 SPARQL_OUTPUT_FILE_NAME = "sparql_output.txt"
+SPARQL_MAX_BATCH_BYTES = 1_000_000
+SPARQL_FILE_BUFFER_SIZE = 4 * 1024 ** 2
+SPARQL_DELETE_CHUNK_SIZE = 500
+SPARQL_GRAPH_STORE_CONTENT_TYPE = "text/turtle; charset=utf-8"
 PREFIXES = """
 PREFIX ohmnode: <https://www.openhistoricalmap.org/node/> 
 PREFIX osmrel: <https://www.openstreetmap.org/relation/> 
@@ -0,0 +1,116 @@
+import sqlite3
+import zlib
+from typing import Iterable, Optional
+
+from ChangeRecord import ChangeRecord
+
+
+class DependencyIndex:
+    database_path: str
+
+    def __init__(self, database_path: str) -> None:
+        """
+        Persistent reverse index from nodes to the ways that reference them and from nodes and ways to the relations
+        that have them as members. Together with the index, the latest version of each way is stored, so that a way
+        whose nodes were moved can be converted again without fetching it. The index is built from the ways and
+        relations of the processed diffs and committed with commit() once a diff has been applied.
+
+        :param database_path: The path of the sqlite database, which is created if it does not exist
+        """
+        self.database_path = database_path
+        self.__connection = sqlite3.connect(database_path)
+        self.__connection.execute("PRAGMA journal_mode=WAL")
+        self.__connection.execute("PRAGMA synchronous=NORMAL")
+        self.__connection.executescript("""
+            CREATE TABLE IF NOT EXISTS way_nodes (node_id INTEGER NOT NULL, way_id INTEGER NOT NULL);
+            CREATE INDEX IF NOT EXISTS way_nodes_node_id ON way_nodes (node_id);
+            CREATE INDEX IF NOT EXISTS way_nodes_way_id ON way_nodes (way_id);
+            CREATE TABLE IF NOT EXISTS ways (way_id INTEGER PRIMARY KEY, data BLOB NOT NULL);
+            CREATE TABLE IF NOT EXISTS relation_members (member TEXT NOT NULL, relation_id INTEGER NOT NULL);
+            CREATE INDEX IF NOT EXISTS relation_members_member ON relation_members (member);
+            CREATE INDEX IF NOT EXISTS relation_members_relation_id ON relation_members (relation_id);
+        """)
+
+    def add_way(self, way: ChangeRecord) -> None:
+        """
+        Adds a created or modified way to the index, replacing its previous version.
+        :param way: The record of the way
+        """
+        way_id = int(way.id)
+        self.remove_way(way_id)
+        node_ids = {int(node_id) for node_id in way.node_refs}
+        self.__connection.executemany("INSERT INTO way_nodes (node_id, way_id) VALUES (?, ?)",
+                                      ((node_id, way_id) for node_id in node_ids))
+        self.__connection.execute("INSERT INTO ways (way_id, data) VALUES (?, ?)",
+                                  (way_id, zlib.compress(way.to_xml())))
+
+    def remove_way(self, way_id: int) -> None:
+        self.__connection.execute("DELETE FROM way_nodes WHERE way_id = ?", (way_id,))
+        self.__connection.execute("DELETE FROM ways WHERE way_id = ?", (way_id,))
+
+    def add_relation(self, relation: ChangeRecord) -> None:
+        """
+        Adds a created or modified relation to the index, replacing its previous version.
+        :param relation: The record of the relation
+        """
+        relation_id = int(relation.id)
+        self.remove_relation(relation_id)
+        members = {f"{member_type}:{ref}" for member_type, ref, _ in relation.members}
+        self.__connection.executemany("INSERT INTO relation_members (member, relation_id) VALUES (?, ?)",
+                                      ((member, relation_id) for member in members))
+
+    def remove_relation(self, relation_id: int) -> None:
+        self.__connection.execute("DELETE FROM relation_members WHERE relation_id = ?", (relation_id,))
+
+    def get_ways_for_nodes(self, node_ids: Iterable[str]) -> set[str]:
+        """
+        :param node_ids: The ids of the nodes
+        :return: The ids of all ways that reference at least one of the nodes
+        """
+        return self.__select_ids("SELECT DISTINCT way_id FROM way_nodes WHERE node_id IN ({})",
+                                 [int(node_id) for node_id in node_ids])
+
+    def get_relations_for_members(self, member_type: str, member_ids: Iterable[str]) -> set[str]:
+        """
+        :param member_type: The type of the members, 'node', 'way' or 'relation'
+        :param member_ids: The ids of the members
+        :return: The ids of all relations that have at least one of the elements as member
+        """
+        return self.__select_ids("SELECT DISTINCT relation_id FROM relation_members WHERE member IN ({})",
+                                 [f"{member_type}:{member_id}" for member_id in member_ids])
+
+    def get_way(self, way_id: str) -> Optional[ChangeRecord]:
+        """
+        :param way_id: The id of the way
+        :return: The latest version of the way as a record with the action 'modify', or None if the way is not in the
+        index
+        """
+        row = self.__connection.execute("SELECT data FROM ways WHERE way_id = ?", (int(way_id),)).fetchone()
+        if row is None:
+            return None
+
+        return ChangeRecord.from_xml('modify', zlib.decompress(row[0]))
+
+    def __select_ids(self, query: str, parameters: list) -> set[str]:
+        """
+        Runs the query with the parameters in chunks, because sqlite limits the number of parameters of a query.
+        """
+        ids: set[str] = set()
+        for i in range(0, len(parameters), 500):
+            chunk = parameters[i:i + 500]
+            rows = self.__connection.execute(query.format(','.join('?' * len(chunk))), chunk)
+            ids.update(str(row[0]) for row in rows)
+        return ids
+
+    def commit(self) -> None:
+        self.__connection.commit()
+
+    def rollback(self) -> None:
+        """
+        Drops the changes since the last commit, after a diff could not be applied completely.
+        """
+        self.__connection.rollback()
+
+    def close(self) -> None:
+        self.__connection.commit()
+        self.__connection.close()
@@ -0,0 +1,68 @@
+import sqlite3
+import zlib
+from typing import Optional
+
+
+class ElementStateStore:
+    database_path: str
+    number_of_reads: int
+    number_of_writes: int
+
+    def __init__(self, database_path: str) -> None:
+        """
+        Stores the triples that were last inserted for each element, so that a modified element only has to be
+        updated with the triples that actually changed. The triples are kept in a sqlite database, zlib compressed
+        and keyed by the subject of the element. Changes are committed with commit() once a diff has been applied,
+        together with the checkpoint.
+
+        :param database_path: The path of the sqlite database, which is created if it does not exist
+        """
+        self.database_path = database_path
+        self.number_of_reads = 0
+        self.number_of_writes = 0
+        self.__connection = sqlite3.connect(database_path)
+        self.__connection.execute("PRAGMA journal_mode=WAL")
+        self.__connection.execute("PRAGMA synchronous=NORMAL")
+        self.__connection.execute("CREATE TABLE IF NOT EXISTS triples (subject TEXT PRIMARY KEY, data BLOB NOT NULL)")
+
+    def get(self, subject: str) -> Optional[list[str]]:
+        """
+        :param subject: The subject of the element, for example 'osmway:7738035'
+        :return: The triples that were last inserted for the element, one per line, or None if they are not known
+        """
+        self.number_of_reads += 1
+        row = self.__connection.execute("SELECT data FROM triples WHERE subject = ?", (subject,)).fetchone()
+        if row is None:
+            return None
+
+        return zlib.decompress(row[0]).decode().split('\n')
+
+    def put(self, subject: str, triples: list[str]) -> None:
+        """
+        Replaces the stored triples of an element.
+        :param subject: The subject of the element
+        :param triples: The triples that were inserted for the element, one per line
+        """
+        self.number_of_writes += 1
+        data = zlib.compress('\n'.join(triples).encode())
+        self.__connection.execute("INSERT OR REPLACE INTO triples (subject, data) VALUES (?, ?)", (subject, data))
+
+    def delete(self, subject: str) -> None:
+        """
+        Removes the stored triples of a deleted element.
+        """
+        self.number_of_writes += 1
+        self.__connection.execute("DELETE FROM triples WHERE subject = ?", (subject,))
+
+    def commit(self) -> None:
+        self.__connection.commit()
+
+    def rollback(self) -> None:
+        """
+        Drops the changes since the last commit, after a diff could not be applied completely.
+        """
+        self.__connection.rollback()
+
+    def close(self) -> None:
+        self.__connection.commit()
+        self.__connection.close()
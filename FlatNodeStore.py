@@ -0,0 +1,193 @@
+import bz2
+import gzip
+import logging
+import mmap
+import os
+from typing import Optional
+from xml.etree import ElementTree
+
+from Constants import FLAT_NODE_STORE_GROWTH
+
+try:
+    import osmium
+except ImportError:
+    osmium = None
+
+# Coordinates are stored as unsigned 32-bit integers with an offset, so that 0 never is a valid location and the
+# zeros of a new or sparse part of the file mark nodes without a location
+COORDINATE_OFFSET = 2 ** 31
+COORDINATE_PRECISION = 10 ** 7
+
+
+class FlatNodeStore:
+    file_path: str
+    capacity: int
+
+    def __init__(self, file_path: str) -> None:
+        """
+        Flat file with the locations of nodes, similar to the flat nodes file of osm2pgsql. The file is a memory mapped
+        array with a fixed-width entry of latitude and longitude for each node id, so a location is looked up in
+        constant time. The file grows as needed and is sparse where there are no nodes. It is seeded once from an osm
+        extract with seed() and kept up to date with the nodes of each applied diff.
+
+        :param file_path: The path of the file, which is created if it does not exist
+        """
+        self.file_path = file_path
+        self.__file = open(file_path, 'a+b')
+        self.capacity = os.path.getsize(file_path) // 8
+        self.__mmap: Optional[mmap.mmap] = None
+        self.__coordinates: Optional[memoryview] = None
+        if self.capacity == 0:
+            self.__resize(FLAT_NODE_STORE_GROWTH)
+        else:
+            self.__map()
+
+    def get(self, node_id: int) -> Optional[tuple[str, str]]:
+        """
+        :param node_id: The id of the node
+        :return: The latitude and longitude of the node, or None if its location is not known
+        """
+        if node_id >= self.capacity:
+            return None
+
+        lat = self.__coordinates[2 * node_id]
+        if lat == 0:
+            return None
+
+        lon = self.__coordinates[2 * node_id + 1]
+        return (f"{(lat - COORDINATE_OFFSET) / COORDINATE_PRECISION:.7f}",
+                f"{(lon - COORDINATE_OFFSET) / COORDINATE_PRECISION:.7f}")
+
+    def get_node(self, node_id: str) -> Optional[bytes]:
+        """
+        :param node_id: The id of the node
+        :return: A node element with the location of the node, or None if its location is not known
+        """
+        location = self.get(int(node_id))
+        if location is None:
+            return None
+
+        return f'<node id="{node_id}" lat="{location[0]}" lon="{location[1]}"/>'.encode()
+
+    def set(self, node_id: int, lat: str, lon: str) -> None:
+        """
+        Sets the location of a node.
+        :param node_id: The id of the node
+        :param lat: The latitude of the node in degrees
+        :param lon: The longitude of the node in degrees
+        """
+        if node_id >= self.capacity:
+            self.__resize(max(node_id + 1, self.capacity * 2))
+
+        self.__coordinates[2 * node_id] = round(float(lat) * COORDINATE_PRECISION) + COORDINATE_OFFSET
+        self.__coordinates[2 * node_id + 1] = round(float(lon) * COORDINATE_PRECISION) + COORDINATE_OFFSET
+
+    def delete(self, node_id: int) -> None:
+        """
+        Removes the location of a deleted node.
+        """
+        if node_id < self.capacity:
+            self.__coordinates[2 * node_id] = 0
+            self.__coordinates[2 * node_id + 1] = 0
+
+    def seed(self, extract_path: str) -> int:
+        """
+        Adds the locations of all nodes of an osm extract. Extracts in the xml format ('.osm', optionally compressed
+        as '.osm.gz' or '.osm.bz2') are read incrementally, extracts in the pbf format ('.osm.pbf') require the osmium
+        package.
+        :param extract_path: The path of the extract
+        :return: The number of nodes that were added
+        """
+        if extract_path.endswith('.pbf'):
+            number_of_nodes = self.__seed_from_pbf(extract_path)
+        else:
+            number_of_nodes = self.__seed_from_xml(extract_path)
+
+        self.flush()
+        logging.info(f"Added the locations of {number_of_nodes} nodes from {extract_path}")
+        return number_of_nodes
+
+    def __seed_from_xml(self, extract_path: str) -> int:
+        if extract_path.endswith('.gz'):
+            source = gzip.open(extract_path, 'rb')
+        elif extract_path.endswith('.bz2'):
+            source = bz2.open(extract_path, 'rb')
+        else:
+            source = open(extract_path, 'rb')
+
+        number_of_nodes = 0
+        depth = 0
+        root: Optional[ElementTree.Element] = None
+        with source:
+            for event, element in ElementTree.iterparse(source, events=('start', 'end')):
+                if event == 'start':
+                    depth += 1
+                    if depth == 1:
+                        root = element
+                    continue
+
+                # The elements of the extract are removed from the root once they are read, so that the memory does
+                # not grow with the size of the extract
+                if depth == 2:
+                    if element.tag == 'node' and 'lat' in element.attrib and 'lon' in element.attrib:
+                        self.set(int(element.attrib['id']), element.attrib['lat'], element.attrib['lon'])
+                        number_of_nodes += 1
+                    root.remove(element)
+                depth -= 1
+
+        return number_of_nodes
+
+    def __seed_from_pbf(self, extract_path: str) -> int:
+        if osmium is None:
+            raise FlatNodeStoreException("The osmium package is required to read extracts in the pbf format")
+
+        store = self
+
+        class NodeHandler(osmium.SimpleHandler):
+            number_of_nodes = 0
+
+            def node(self, node) -> None:
+                if node.location.valid():
+                    store.set(node.id, str(node.location.lat), str(node.location.lon))
+                    self.number_of_nodes += 1
+
+        handler = NodeHandler()
+        handler.apply_file(extract_path, locations=False)
+        return handler.number_of_nodes
+
+    def flush(self) -> None:
+        """
+        Writes the changed locations to disk.
+        """
+        self.__mmap.flush()
+
+    def close(self) -> None:
+        self.flush()
+        self.__unmap()
+        self.__file.close()
+
+    def __resize(self, capacity: int) -> None:
+        """
+        Grows the file to hold the passed number of nodes, rounded up to a multiple of FLAT_NODE_STORE_GROWTH.
+        """
+        capacity = -(-capacity // FLAT_NODE_STORE_GROWTH) * FLAT_NODE_STORE_GROWTH
+        self.__unmap()
+        self.__file.truncate(capacity * 8)
+        self.capacity = capacity
+        self.__map()
+
+    def __map(self) -> None:
+        self.__mmap = mmap.mmap(self.__file.fileno(), self.capacity * 8)
+        self.__coordinates = memoryview(self.__mmap).cast('I')
+
+    def __unmap(self) -> None:
+        if self.__coordinates is not None:
+            self.__coordinates.release()
+            self.__coordinates = None
+        if self.__mmap is not None:
+            self.__mmap.close()
+            self.__mmap = None
+
+
+class FlatNodeStoreException(Exception):
+    pass
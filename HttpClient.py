@@ -0,0 +1,255 @@
+import logging
+import random
+import select
+import threading
+import time
+from bisect import bisect_left
+from http.client import HTTPConnection, HTTPSConnection, HTTPException
+from queue import LifoQueue, Empty, Full
+from typing import Optional
+from urllib.parse import urlsplit, urljoin
+
+from Constants import HTTP_MAX_CONNECTIONS_PER_HOST, HTTP_MAX_CONCURRENT_REQUESTS, HTTP_MAX_RETRIES, \
+    HTTP_BACKOFF_BASE, HTTP_TIMEOUT, HTTP_MAX_REDIRECTS, HTTP_LATENCY_BUCKETS, HTTP_IDEMPOTENT_METHODS
+
+
+class HttpClient:
+    max_connections_per_host: int
+    max_retries: int
+    backoff_base: float
+    timeout: float
+    pools: dict[tuple[str, str], LifoQueue]
+    latency_histograms: dict[str, list[int]]
+
+    def __init__(
+            self,
+            max_connections_per_host: int = HTTP_MAX_CONNECTIONS_PER_HOST,
+            max_concurrent_requests: int = HTTP_MAX_CONCURRENT_REQUESTS,
+            max_retries: int = HTTP_MAX_RETRIES,
+            backoff_base: float = HTTP_BACKOFF_BASE,
+            timeout: float = HTTP_TIMEOUT) -> None:
+        """
+        HTTP client that is shared by all requests to the osm server. It keeps persistent connections to each host
+        and reuses them, limits the number of requests that run at the same time and retries requests that failed
+        because of a timeout, rate limiting (429) or a server error (5xx) with exponential backoff and jitter. A
+        request that is not idempotent, like a POST, is only retried if it was certainly not processed, because the
+        connection could not be established or the server answered with 429.
+
+        :param max_connections_per_host: The maximum number of idle connections that are kept open for each host
+        :param max_concurrent_requests: The maximum number of requests that run at the same time
+        :param max_retries: The maximum number of times a failed request is retried
+        :param backoff_base: The time to wait before the first retry in seconds, which doubles with each retry
+        :param timeout: The timeout for connecting and reading in seconds
+        """
+        self.max_connections_per_host = max_connections_per_host
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.timeout = timeout
+        self.pools = {}
+        self.latency_histograms = {}
+        self.__semaphore = threading.BoundedSemaphore(max_concurrent_requests)
+        self.__lock = threading.Lock()
+
+    def get(self, url: str) -> bytes:
+        """
+        Sends a GET request to the passed url.
+        :param url: The url to request
+        :return: The body of the response
+        """
+        return self.request('GET', url)
+
+    def request(
+            self,
+            method: str,
+            url: str,
+            body: Optional[bytes] = None,
+            headers: Optional[dict] = None,
+            idempotent: Optional[bool] = None) -> bytes:
+        """
+        Sends a request to the passed url, following redirects and retrying it if it failed temporarily.
+        :param method: The HTTP method
+        :param url: The url to request
+        :param body: The body of the request
+        :param headers: Additional headers of the request
+        :param idempotent: Whether sending the request more than once has the same effect as sending it once, which
+        allows to retry it after any temporary failure. Defaults to True for GET, HEAD, OPTIONS, PUT and DELETE.
+        :return: The body of the response
+        :raises HttpNotFoundException: If the resource does not exist (404)
+        :raises HttpGoneException: If the resource is not available anymore (410)
+        :raises HttpException: If the request failed for any other reason, or still failed after all retries
+        """
+        if idempotent is None:
+            idempotent = method in HTTP_IDEMPOTENT_METHODS
+
+        number_of_redirects = 0
+        attempt = 0
+        while True:
+            retry_after: Optional[float] = None
+            try:
+                status, location, retry_after_header, data = self.__send(method, url, body, headers or {})
+            except HttpConnectionException as e:
+                reason = str(e)
+            except (HTTPException, OSError) as e:
+                reason = f"{type(e).__name__}: {e}"
+                if not idempotent:
+                    raise HttpException(f"{method} request to URL \"{url}\" failed with {reason}, it is not retried "
+                                        f"because it may have been processed") from e
+            else:
+                if 200 <= status < 300:
+                    return data
+                elif status in (301, 302, 303, 307, 308) and location is not None:
+                    number_of_redirects += 1
+                    if number_of_redirects > HTTP_MAX_REDIRECTS:
+                        raise HttpException(f"Too many redirects for URL \"{url}\"")
+                    url = urljoin(url, location)
+                    continue
+                elif status == 404:
+                    raise HttpNotFoundException(f"Resource at URL \"{url}\" does not exist (404)")
+                elif status == 410:
+                    raise HttpGoneException(f"Resource at URL \"{url}\" is not available anymore (410)")
+                elif status != 429 and (status < 500 or not idempotent):
+                    raise HttpException(f"Request to URL \"{url}\" failed with error code {status}")
+
+                reason = f"error code {status}"
+                if retry_after_header is not None and retry_after_header.isdigit():
+                    retry_after = float(retry_after_header)
+
+            if attempt >= self.max_retries:
+                raise HttpException(f"Request to URL \"{url}\" failed after {attempt + 1} attempts, last with {reason}")
+
+            # Exponential backoff with full jitter, unless the server told us how long to wait
+            wait_time = retry_after if retry_after is not None else random.uniform(0, self.backoff_base * 2 ** attempt)
+            logging.warning(f"Request to URL \"{url}\" failed with {reason}, retrying in {wait_time:.2f} seconds")
+            time.sleep(wait_time)
+            attempt += 1
+
+    def __send(
+            self,
+            method: str,
+            url: str,
+            body: Optional[bytes],
+            headers: dict) -> tuple[int, Optional[str], Optional[str], bytes]:
+        """
+        Sends a single request over a pooled connection to the host of the url.
+        :return: The status, the 'Location' and 'Retry-After' headers and the body of the response
+        """
+        parts = urlsplit(url)
+        path = parts.path or '/'
+        if parts.query:
+            path += f"?{parts.query}"
+
+        with self.__semaphore:
+            connection = self.__get_connection(parts.scheme, parts.netloc)
+            if connection.sock is None:
+                # A failed connect is reported separately, because the request was certainly not sent then
+                try:
+                    connection.connect()
+                except OSError as e:
+                    connection.close()
+                    raise HttpConnectionException(f"Connection to {parts.netloc} failed with "
+                                                  f"{type(e).__name__}: {e}") from e
+
+            start_time = time.perf_counter()
+            try:
+                connection.request(method, path, body=body, headers=headers)
+                response = connection.getresponse()
+                data = response.read()
+            except (HTTPException, OSError):
+                connection.close()
+                raise
+
+            self.__record_latency(parts.netloc, time.perf_counter() - start_time)
+            if response.will_close:
+                connection.close()
+            else:
+                self.__release_connection(parts.scheme, parts.netloc, connection)
+
+        return response.status, response.getheader('Location'), response.getheader('Retry-After'), data
+
+    def __get_connection(self, scheme: str, host: str) -> HTTPConnection:
+        """
+        Returns an idle connection to the host from the pool, or a new one that is not connected yet if there is
+        none. Idle connections that the server has closed in the meantime are dropped, so that a request that is not
+        retried is not sent over them.
+        """
+        with self.__lock:
+            pool = self.pools.setdefault((scheme, host), LifoQueue(maxsize=self.max_connections_per_host))
+
+        while True:
+            try:
+                connection = pool.get_nowait()
+            except Empty:
+                break
+            if not self.__is_closed_by_server(connection):
+                return connection
+            connection.close()
+
+        if scheme == 'https':
+            return HTTPSConnection(host, timeout=self.timeout)
+        return HTTPConnection(host, timeout=self.timeout)
+
+    @staticmethod
+    def __is_closed_by_server(connection: HTTPConnection) -> bool:
+        """
+        :return: True if an idle connection can be read from, which means that the server closed it
+        """
+        if connection.sock is None:
+            return True
+        try:
+            readable, _, _ = select.select([connection.sock], [], [], 0)
+        except (OSError, ValueError):
+            return True
+        return len(readable) > 0
+
+    def __release_connection(self, scheme: str, host: str, connection: HTTPConnection) -> None:
+        """
+        Returns a connection to the pool, or closes it if the pool is full.
+        """
+        try:
+            self.pools[(scheme, host)].put_nowait(connection)
+        except Full:
+            connection.close()
+
+    def __record_latency(self, host: str, latency: float) -> None:
+        """
+        Adds the latency of a request to the latency histogram of the host.
+        """
+        with self.__lock:
+            histogram = self.latency_histograms.setdefault(host, [0] * (len(HTTP_LATENCY_BUCKETS) + 1))
+            histogram[bisect_left(HTTP_LATENCY_BUCKETS, latency)] += 1
+
+    def get_latency_histograms(self) -> dict[str, dict[str, int]]:
+        """
+        :return: The number of requests to each host, grouped by the upper bound of their latency in seconds
+        """
+        labels = [str(bucket) for bucket in HTTP_LATENCY_BUCKETS] + ['+Inf']
+        with self.__lock:
+            return {host: dict(zip(labels, histogram)) for host, histogram in self.latency_histograms.items()}
+
+    def close(self) -> None:
+        """
+        Closes all idle connections.
+        """
+        with self.__lock:
+            for pool in self.pools.values():
+                while True:
+                    try:
+                        pool.get_nowait().close()
+                    except Empty:
+                        break
+
+
+class HttpException(Exception):
+    pass
+
+
+class HttpConnectionException(HttpException):
+    pass
+
+
+class HttpNotFoundException(HttpException):
+    pass
+
+
+class HttpGoneException(HttpException):
+    pass
@@ -0,0 +1,297 @@
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import signal
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterator, Optional
+
+from Constants import METRICS_PREFIX, METRICS_LATENCY_BUCKETS, METRICS_MAX_DIFF_SUMMARIES
+
+
+class Timer:
+    count: int
+    total: float
+    max: float
+    buckets: list[int]
+
+    def __init__(self) -> None:
+        """
+        Accumulates the durations of a timed operation, with a histogram over METRICS_LATENCY_BUCKETS.
+        """
+        self.count = 0
+        self.total = 0
+        self.max = 0
+        self.buckets = [0] * (len(METRICS_LATENCY_BUCKETS) + 1)
+
+    def add(self, duration: float) -> None:
+        self.count += 1
+        self.total += duration
+        self.max = max(self.max, duration)
+        self.buckets[bisect_left(METRICS_LATENCY_BUCKETS, duration)] += 1
+
+
+class Metrics:
+    timers: dict[str, Timer]
+    counters: dict[str, int]
+    gauges: dict[str, float]
+    diff_summaries: deque
+    file_path: Optional[str]
+
+    def __init__(self, file_path: Optional[str] = None) -> None:
+        """
+        Registry of the timers, counters and gauges of the pipeline. The metrics can be exported in the Prometheus
+        text format or as JSON, to a file after each diff and over HTTP with serve(). Names are dotted, like
+        'sparql.flush', and are converted to 'olu_sparql_flush' for Prometheus.
+
+        :param file_path: The file to which the metrics are written by export(). Files ending with '.json' are
+        written as JSON, all others in the Prometheus text format.
+        """
+        self.timers = {}
+        self.counters = {}
+        self.gauges = {}
+        self.diff_summaries = deque(maxlen=METRICS_MAX_DIFF_SUMMARIES)
+        self.file_path = file_path
+        self.__lock = threading.Lock()
+        self.__diff_start: Optional[tuple[float, dict[str, float], dict[str, int]]] = None
+        self.__server: Optional[ThreadingHTTPServer] = None
+
+    @contextmanager
+    def time(self, name: str) -> Iterator[None]:
+        """
+        Measures the duration of the enclosed block and adds it to the timer with the passed name.
+        """
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_duration(name, time.perf_counter() - start_time)
+
+    def add_duration(self, name: str, duration: float) -> None:
+        with self.__lock:
+            timer = self.timers.get(name)
+            if timer is None:
+                timer = self.timers[name] = Timer()
+            timer.add(duration)
+
+    def increment(self, name: str, value: int = 1) -> None:
+        with self.__lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def set_gauge(self, name: str, value: float) -> None:
+        with self.__lock:
+            self.gauges[name] = value
+
+    def start_diff(self) -> None:
+        """
+        Marks the start of a diff, so that finish_diff() can summarize the metrics of that diff.
+        """
+        with self.__lock:
+            self.__diff_start = (time.perf_counter(), self.__get_timer_totals(), dict(self.counters))
+
+    def finish_diff(self, sequence_number: int) -> dict:
+        """
+        Summarizes the time spent in each timer and the change of each counter since start_diff() was called.
+        :param sequence_number: The sequence number of the diff, or of the last diff of a consolidation window
+        :return: The summary of the diff
+        """
+        with self.__lock:
+            start_time, timer_totals, counters = self.__diff_start or (time.perf_counter(), {}, {})
+            summary = {
+                'sequence_number': sequence_number,
+                'seconds': time.perf_counter() - start_time,
+                'timers': {name: total - timer_totals.get(name, 0)
+                           for name, total in self.__get_timer_totals().items()
+                           if total != timer_totals.get(name, 0)},
+                'counters': {name: value - counters.get(name, 0) for name, value in self.counters.items()
+                             if value != counters.get(name, 0)},
+            }
+            self.diff_summaries.append(summary)
+            self.__diff_start = None
+
+        return summary
+
+    @staticmethod
+    def format_diff_summary(summary: dict) -> str:
+        """
+        Formats a summary of finish_diff() as a single line for the log.
+        """
+        timers = ', '.join(f"{name} {seconds:.3f}s" for name, seconds in summary['timers'].items())
+        counters = ', '.join(f"{name} {value}" for name, value in summary['counters'].items())
+        return f"Diff {summary['sequence_number']} took {summary['seconds']:.3f}s ({timers}) [{counters}]"
+
+    def __get_timer_totals(self) -> dict[str, float]:
+        return {name: timer.total for name, timer in self.timers.items()}
+
+    def to_json(self) -> dict:
+        """
+        :return: All metrics and the summaries of the most recent diffs
+        """
+        with self.__lock:
+            return {
+                'timers': {name: {'count': timer.count, 'total': timer.total, 'max': timer.max,
+                                  'buckets': dict(zip(self.__get_bucket_labels(), timer.buckets))}
+                           for name, timer in self.timers.items()},
+                'counters': dict(self.counters),
+                'gauges': dict(self.gauges),
+                'diffs': list(self.diff_summaries),
+            }
+
+    def to_prometheus(self) -> str:
+        """
+        :return: All metrics in the Prometheus text format, the timers as histograms in seconds
+        """
+        lines: list[str] = []
+        with self.__lock:
+            for name, timer in sorted(self.timers.items()):
+                metric = f"{self.__get_prometheus_name(name)}_seconds"
+                lines.append(f"# TYPE {metric} histogram")
+                cumulative_count = 0
+                for label, count in zip(self.__get_bucket_labels(), timer.buckets):
+                    cumulative_count += count
+                    lines.append(f'{metric}_bucket{{le="{label}"}} {cumulative_count}')
+                lines.append(f"{metric}_sum {timer.total}")
+                lines.append(f"{metric}_count {timer.count}")
+
+            for name, value in sorted(self.counters.items()):
+                metric = f"{self.__get_prometheus_name(name)}_total"
+                lines.append(f"# TYPE {metric} counter")
+                lines.append(f"{metric} {value}")
+
+            for name, value in sorted(self.gauges.items()):
+                metric = self.__get_prometheus_name(name)
+                lines.append(f"# TYPE {metric} gauge")
+                lines.append(f"{metric} {value}")
+
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def __get_prometheus_name(name: str) -> str:
+        return f"{METRICS_PREFIX}_{name.replace('.', '_').replace('-', '_')}"
+
+    @staticmethod
+    def __get_bucket_labels() -> list[str]:
+        return [str(bucket) for bucket in METRICS_LATENCY_BUCKETS] + ['+Inf']
+
+    def export(self) -> None:
+        """
+        Atomically replaces the metrics file with the current metrics, if a file is set.
+        """
+        if self.file_path is None:
+            return
+
+        if self.file_path.endswith('.json'):
+            content = json.dumps(self.to_json(), indent=2)
+        else:
+            content = self.to_prometheus()
+
+        temporary_file_path = f"{self.file_path}.tmp"
+        with open(temporary_file_path, 'w') as file:
+            file.write(content)
+        os.replace(temporary_file_path, self.file_path)
+
+    def serve(self, port: int, host: str = '127.0.0.1') -> None:
+        """
+        Serves the metrics over HTTP in a background thread, in the Prometheus text format at '/metrics' and as JSON
+        at '/metrics.json'.
+        :param port: The port to listen on, 0 for a free port
+        :param host: The address to listen on
+        """
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                if self.path == '/metrics':
+                    body, content_type = metrics.to_prometheus().encode(), 'text/plain; version=0.0.4'
+                elif self.path == '/metrics.json':
+                    body, content_type = json.dumps(metrics.to_json()).encode(), 'application/json'
+                else:
+                    self.send_error(404)
+                    return
+
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args) -> None:
+                pass
+
+        self.__server = ThreadingHTTPServer((host, port), Handler)
+        self.__server.daemon_threads = True
+        threading.Thread(target=self.__server.serve_forever, daemon=True).start()
+        logging.info(f"Serving metrics at http://{host}:{self.__server.server_address[1]}/metrics")
+
+    def get_port(self) -> Optional[int]:
+        """
+        :return: The port on which the metrics are served, or None if they are not served
+        """
+        return self.__server.server_address[1] if self.__server is not None else None
+
+    def close(self) -> None:
+        """
+        Stops serving the metrics.
+        """
+        if self.__server is not None:
+            self.__server.shutdown()
+            self.__server.server_close()
+            self.__server = None
+
+
+class Profiler:
+    output_path: str
+    profile: Optional[cProfile.Profile]
+
+    def __init__(self, output_path: str) -> None:
+        """
+        Profiles the main thread with cProfile while it is switched on. It can be switched on and off at runtime, for
+        example with a signal to the running process after install_signal_handler() was called:
+            kill -USR1 <pid>
+
+        :param output_path: The file to which the statistics are written when profiling is switched off, which can be
+        read with pstats or snakeviz.
+        """
+        self.output_path = output_path
+        self.profile = None
+
+    def start(self) -> None:
+        if self.profile is not None:
+            return
+
+        self.profile = cProfile.Profile()
+        self.profile.enable()
+        logging.info("Profiling started")
+
+    def stop(self) -> None:
+        """
+        Switches profiling off, writes the statistics to the output file and logs the most expensive functions.
+        """
+        if self.profile is None:
+            return
+
+        self.profile.disable()
+        self.profile.dump_stats(self.output_path)
+        output = io.StringIO()
+        pstats.Stats(self.profile, stream=output).sort_stats('cumulative').print_stats(20)
+        self.profile = None
+        logging.info(f"Profiling stopped, statistics were written to {self.output_path}\n{output.getvalue()}")
+
+    def toggle(self) -> None:
+        if self.profile is None:
+            self.start()
+        else:
+            self.stop()
+
+    def install_signal_handler(self, signal_number: int = signal.SIGUSR1) -> None:
+        """
+        Toggles profiling whenever the process receives the passed signal.
+        """
+        signal.signal(signal_number, lambda received_signal, frame: self.toggle())
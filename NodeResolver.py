@@ -0,0 +1,192 @@
+import logging
+from collections import OrderedDict
+from typing import Optional
+from xml.etree import ElementTree
+
+from ChangeRecord import ChangeRecord
+from Constants import OSM_API_URL, NODE_CACHE_SIZE, NODE_FETCH_CHUNK_SIZE
+from FlatNodeStore import FlatNodeStore
+from HttpClient import HttpClient, HttpNotFoundException, HttpGoneException
+
+
+class NodeResolver:
+    http_client: HttpClient
+    api_url: str
+    cache_size: int
+    chunk_size: int
+    node_store: Optional[FlatNodeStore]
+    diff_nodes: dict[str, bytes]
+    cache: OrderedDict[str, bytes]
+    diff_hits: int
+    cache_hits: int
+    store_hits: int
+    misses: int
+    number_of_requests: int
+
+    def __init__(
+            self,
+            http_client: HttpClient,
+            api_url: str = OSM_API_URL,
+            cache_size: int = NODE_CACHE_SIZE,
+            chunk_size: int = NODE_FETCH_CHUNK_SIZE,
+            node_store: Optional[FlatNodeStore] = None) -> None:
+        """
+        Resolves node references to node elements in tiers. Nodes that are part of the diff currently processed are
+        served from the diff, recently seen nodes from an in-memory LRU cache, nodes with a known location from the
+        flat node store, if one is used, and all remaining nodes are fetched in chunks from the multi-fetch endpoint
+        of the osm api.
+
+        :param http_client: The client used to fetch the nodes from the osm api
+        :param api_url: The url of the osm api, for example 'https://www.openstreetmap.org/api/0.6'
+        :param cache_size: The maximum number of nodes held in the LRU cache
+        :param chunk_size: The maximum number of nodes that are fetched with one request
+        :param node_store: The locations of all nodes, which is updated with the nodes of the diffs
+        """
+        self.http_client = http_client
+        self.api_url = api_url
+        self.cache_size = cache_size
+        self.chunk_size = chunk_size
+        self.node_store = node_store
+        self.diff_nodes = {}
+        self.cache = OrderedDict()
+        self.diff_hits = 0
+        self.cache_hits = 0
+        self.store_hits = 0
+        self.misses = 0
+        self.number_of_requests = 0
+
+    def clear_diff(self) -> None:
+        """
+        Removes the nodes of the previous diff, before the next diff is processed.
+        """
+        self.diff_nodes = {}
+
+    def add_diff_node(self, node: ChangeRecord) -> None:
+        """
+        Adds a node that is created or modified by the diff currently processed. References to it are always resolved
+        from the diff.
+        :param node: The record of the node
+        """
+        node_text = node.to_xml()
+        self.diff_nodes[node.id] = node_text
+        self.__add_to_cache(node.id, node_text)
+        if self.node_store is not None and node.lat is not None and node.lon is not None:
+            self.node_store.set(int(node.id), node.lat, node.lon)
+
+    def add_deleted_diff_node(self, node_id: str) -> None:
+        """
+        Adds a node that is deleted by the diff currently processed. References to it are resolved to nothing.
+        :param node_id: The id of the deleted node
+        """
+        self.diff_nodes[node_id] = b''
+        self.cache.pop(node_id, None)
+        if self.node_store is not None:
+            self.node_store.delete(int(node_id))
+
+    def update_node(self, node: ChangeRecord) -> None:
+        """
+        Updates the location of a node that is changed by the diff but not processed, for example because it is
+        outside the region of a region filter. Its previous version is removed from the cache, so that references to
+        it are resolved from the node store or fetched again.
+        :param node: The record of the node
+        """
+        self.cache.pop(node.id, None)
+        if self.node_store is not None and node.lat is not None and node.lon is not None:
+            self.node_store.set(int(node.id), node.lat, node.lon)
+
+    def remove_node(self, node_id: str) -> None:
+        """
+        Removes a node that is deleted by the diff but not processed from the cache and the node store.
+        :param node_id: The id of the deleted node
+        """
+        self.cache.pop(node_id, None)
+        if self.node_store is not None:
+            self.node_store.delete(int(node_id))
+
+    def get_known_node(self, node_id: str) -> Optional[bytes]:
+        """
+        Returns a node from the diff, the cache or the node store, without fetching it.
+        :param node_id: The id of the node
+        :return: The text of the node element, or None if the node is not known
+        """
+        if node_id in self.diff_nodes:
+            return self.diff_nodes[node_id]
+        if node_id in self.cache:
+            return self.cache[node_id]
+        if self.node_store is not None:
+            return self.node_store.get_node(node_id)
+        return None
+
+    def resolve(self, node_ids: list[str]) -> bytes:
+        """
+        Resolves the passed node ids to the text of the node elements.
+        :param node_ids: The ids of the nodes to resolve, without duplicates
+        :return: A bytes object containing the node elements in the order of the passed ids
+        """
+        nodes: dict[str, bytes] = {}
+        missing_node_ids: list[str] = []
+
+        for node_id in node_ids:
+            if node_id in self.diff_nodes:
+                self.diff_hits += 1
+                nodes[node_id] = self.diff_nodes[node_id]
+            elif node_id in self.cache:
+                self.cache_hits += 1
+                self.cache.move_to_end(node_id)
+                nodes[node_id] = self.cache[node_id]
+            else:
+                node_text = self.node_store.get_node(node_id) if self.node_store is not None else None
+                if node_text is not None:
+                    self.store_hits += 1
+                    nodes[node_id] = node_text
+                else:
+                    self.misses += 1
+                    missing_node_ids.append(node_id)
+
+        for i in range(0, len(missing_node_ids), self.chunk_size):
+            nodes.update(self.__fetch_nodes(missing_node_ids[i:i + self.chunk_size]))
+
+        return b''.join(nodes.get(node_id, b'') for node_id in node_ids)
+
+    def __fetch_nodes(self, node_ids: list[str]) -> dict[str, bytes]:
+        """
+        Fetches the passed nodes with a single request to the multi-fetch endpoint. Because the endpoint fails if one
+        of the nodes is not available, the nodes are split in halves that are fetched on their own if the request
+        fails, until the unavailable nodes are singled out.
+        :param node_ids: The ids of the nodes to fetch
+        :return: The fetched nodes, keyed by their id
+        """
+        nodes: dict[str, bytes] = {}
+
+        self.number_of_requests += 1
+        try:
+            response = self.http_client.get(f"{self.api_url}/nodes?nodes={','.join(node_ids)}")
+        except (HttpNotFoundException, HttpGoneException):
+            if len(node_ids) > 1:
+                middle = len(node_ids) // 2
+                nodes.update(self.__fetch_nodes(node_ids[:middle]))
+                nodes.update(self.__fetch_nodes(node_ids[middle:]))
+                return nodes
+            response = None
+
+        if response is not None:
+            for child in ElementTree.fromstring(response):
+                if child.tag == "node" and child.attrib.get('visible') != 'false':
+                    node_text = ElementTree.tostring(child).rstrip()
+                    nodes[child.attrib['id']] = node_text
+                    self.__add_to_cache(child.attrib['id'], node_text)
+
+        for node_id in node_ids:
+            if node_id not in nodes:
+                logging.warning(f"Node with id {node_id} could not be fetched")
+
+        return nodes
+
+    def __add_to_cache(self, node_id: str, node_text: bytes) -> None:
+        """
+        Adds a node to the LRU cache and evicts the least recently used node if the cache is full.
+        """
+        self.cache[node_id] = node_text
+        self.cache.move_to_end(node_id)
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
@@ -0,0 +1,285 @@
+import logging
+import os
+from subprocess import Popen, PIPE, DEVNULL, run
+from shlex import split as shlex_split
+from typing import Iterator, Optional
+from xml.etree import ElementTree
+import json
+
+from Constants import OSM_2_RDF_INPUT_FILE_NAME
+
+
+class Osm2RdfBackend:
+    """
+    Base class for the backends that run the actual osm2rdf conversion. A backend receives a complete osmChange
+    document and streams the generated RDF Turtle back line by line, uncompressed.
+    """
+
+    def convert(self, document: str) -> Iterator[str]:
+        """
+        Converts the passed osm document to RDF Turtle.
+        :param document: The osm data to convert, packed in an 'osmChange' element
+        :return: An iterator over the lines of the generated RDF Turtle
+        """
+        raise NotImplementedError
+
+    def create_worker(self, index: int) -> 'Osm2RdfBackend':
+        """
+        Creates another backend of the same kind, that can run conversions at the same time as this one.
+        :param index: The index of the worker, starting at 1
+        :return: The backend of the worker
+        """
+        raise NotImplementedError
+
+    def close(self) -> None:
+        """
+        Releases all resources that are held by the backend.
+        """
+        pass
+
+
+class ProcessBackend(Osm2RdfBackend):
+    working_path: str
+
+    def __init__(self, working_path: str) -> None:
+        """
+        Base class for backends that write the input to the 'input' folder in the working path and read the
+        generated triples from the stdout of an osm2rdf process.
+
+        :param working_path: The path to the folder containing the 'input' and 'scratch' folders.
+        """
+        self.working_path = working_path
+
+    def get_command(self) -> list[str]:
+        """
+        :return: The command that runs osm2rdf on the input file and writes uncompressed Turtle to stdout
+        """
+        raise NotImplementedError
+
+    def get_worker_path(self, index: int) -> str:
+        """
+        Creates the working path of a worker, with its own 'input' and 'scratch' folders, below the working path.
+        :param index: The index of the worker
+        :return: The working path of the worker
+        """
+        worker_path = f"{self.working_path}/workers/{index}"
+        os.makedirs(f"{worker_path}/input", exist_ok=True)
+        os.makedirs(f"{worker_path}/scratch", exist_ok=True)
+        return worker_path
+
+    def convert(self, document: str) -> Iterator[str]:
+        logging.debug("Writing osm data to input file")
+        with open(self.working_path + f"/input/{OSM_2_RDF_INPUT_FILE_NAME}", 'w') as file:
+            file.write(document)
+
+        logging.debug("Start Conversion")
+        p = Popen(self.get_command(), cwd=self.working_path, stdout=PIPE, stderr=DEVNULL, text=True)
+        try:
+            for line in p.stdout:
+                yield line.rstrip('\n')
+        finally:
+            p.stdout.close()
+            result = p.wait()
+
+        if result != 0:
+            raise Osm2RdfException('Failed to convert to RDF')
+
+
+class DockerBackend(ProcessBackend):
+    image_name: str
+
+    def __init__(self, osm2rdf_path: str, image_name: str) -> None:
+        """
+        Runs every conversion in a new docker container, that is removed afterward.
+
+        :param osm2rdf_path: The path to the folder where osm2rdf is located.
+        :param image_name: The name of the docker image for osm2rdf
+        """
+        super().__init__(osm2rdf_path)
+        self.image_name = image_name
+
+    def create_worker(self, index: int) -> 'DockerBackend':
+        return DockerBackend(self.get_worker_path(index), self.image_name)
+
+    def get_command(self) -> list[str]:
+        return shlex_split(f'docker run --rm '
+                           f'-v {self.working_path}/input/:/input/ '
+                           f'-v {self.working_path}/scratch/:/scratch/ '
+                           f'{self.image_name} '
+                           f'/input/{OSM_2_RDF_INPUT_FILE_NAME} '
+                           f'--output-no-compress '
+                           f'-t /scratch/')
+
+
+class PersistentDockerBackend(ProcessBackend):
+    image_name: str
+    binary: Optional[str]
+    container_id: Optional[str]
+
+    def __init__(self, osm2rdf_path: str, image_name: str, binary: Optional[str] = None) -> None:
+        """
+        Keeps a single docker container running and executes every conversion inside of it with 'docker exec', which
+        avoids the cold start of a new container for each conversion.
+
+        :param osm2rdf_path: The path to the folder where osm2rdf is located.
+        :param image_name: The name of the docker image for osm2rdf
+        :param binary: The path of the osm2rdf binary inside the container. Defaults to the entrypoint of the image.
+        """
+        super().__init__(osm2rdf_path)
+        self.image_name = image_name
+        self.binary = binary
+        self.container_id = None
+
+    def __start_container(self) -> None:
+        """
+        Starts the container that is used for all conversions and keeps it alive by running 'sleep' in it.
+        """
+        if self.binary is None:
+            inspect = run(['docker', 'image', 'inspect', '--format', '{{json .Config.Entrypoint}}', self.image_name],
+                          capture_output=True, text=True, check=True)
+            entrypoint = json.loads(inspect.stdout)
+            if not entrypoint:
+                raise Osm2RdfException(f"The image {self.image_name} has no entrypoint, so the path of the osm2rdf "
+                                       f"binary inside the container has to be passed")
+            self.binary = entrypoint[0]
+
+        logging.debug(f"Starting persistent container for image {self.image_name}")
+        args = shlex_split(f'docker run -d --rm '
+                           f'--entrypoint sleep '
+                           f'-v {self.working_path}/input/:/input/ '
+                           f'-v {self.working_path}/scratch/:/scratch/ '
+                           f'{self.image_name} '
+                           f'infinity')
+        result = run(args, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise Osm2RdfException(f'Failed to start container for image {self.image_name}')
+
+        self.container_id = result.stdout.strip()
+
+    def create_worker(self, index: int) -> 'PersistentDockerBackend':
+        return PersistentDockerBackend(self.get_worker_path(index), self.image_name, self.binary)
+
+    def get_command(self) -> list[str]:
+        return shlex_split(f'docker exec {self.container_id} '
+                           f'{self.binary} '
+                           f'/input/{OSM_2_RDF_INPUT_FILE_NAME} '
+                           f'--output-no-compress '
+                           f'-t /scratch/')
+
+    def convert(self, document: str) -> Iterator[str]:
+        if self.container_id is None:
+            self.__start_container()
+
+        return super().convert(document)
+
+    def close(self) -> None:
+        if self.container_id is None:
+            return
+
+        logging.debug(f"Stopping persistent container {self.container_id}")
+        run(['docker', 'rm', '-f', self.container_id], stdout=DEVNULL, stderr=DEVNULL)
+        self.container_id = None
+
+
+class LocalBinaryBackend(ProcessBackend):
+    binary: str
+
+    def __init__(self, binary: str, working_path: str) -> None:
+        """
+        Runs a locally installed osm2rdf binary directly, without docker.
+
+        :param binary: The path to the osm2rdf binary
+        :param working_path: The path to the folder containing the 'input' and 'scratch' folders.
+        """
+        super().__init__(working_path)
+        self.binary = binary
+
+    def create_worker(self, index: int) -> 'LocalBinaryBackend':
+        return LocalBinaryBackend(self.binary, self.get_worker_path(index))
+
+    def get_command(self) -> list[str]:
+        return [self.binary,
+                f'{self.working_path}/input/{OSM_2_RDF_INPUT_FILE_NAME}',
+                '--output-no-compress',
+                '-t', f'{self.working_path}/scratch/']
+
+
+class FakeOsm2RdfBackend(Osm2RdfBackend):
+    number_of_conversions: int
+
+    def __init__(self) -> None:
+        """
+        Stand-in for osm2rdf that generates a simplified version of its output in Python, so that the conversion can
+        be used without docker or an osm2rdf binary. Like osm2rdf, it ignores elements without tags.
+        """
+        self.number_of_conversions = 0
+
+    def create_worker(self, index: int) -> 'FakeOsm2RdfBackend':
+        return FakeOsm2RdfBackend()
+
+    def convert(self, document: str) -> Iterator[str]:
+        self.number_of_conversions += 1
+        root = ElementTree.fromstring(document)
+        locations: dict[str, str] = {}
+        for element in root.iter('node'):
+            if 'lat' in element.attrib and 'lon' in element.attrib:
+                locations[element.attrib['id']] = f"{element.attrib['lon']} {element.attrib['lat']}"
+
+        yield '@prefix osmnode: <https://www.openstreetmap.org/node/> .'
+        yield '@prefix osmway: <https://www.openstreetmap.org/way/> .'
+        yield '@prefix osmrel: <https://www.openstreetmap.org/relation/> .'
+
+        blank_node_counter = 0
+        for element in root.iter():
+            if element.tag not in ('node', 'way', 'relation') or element.find('tag') is None:
+                continue
+
+            identifier = element.attrib['id']
+            name = 'rel' if element.tag == 'relation' else element.tag
+            subject = f"osm{name}:{identifier}"
+            yield f"{subject} rdf:type osm:{element.tag} ."
+
+            for tag in element.iter('tag'):
+                yield f"{subject} osmkey:{tag.attrib['k']} {self.__literal(tag.attrib['v'])} ."
+
+            geometry: Optional[str] = None
+            if element.tag == 'node' and identifier in locations:
+                geometry = f"POINT({locations[identifier]})"
+            elif element.tag == 'way':
+                points: list[str] = []
+                for position, nd in enumerate(element.iter('nd')):
+                    blank_node = f"_:{blank_node_counter}"
+                    blank_node_counter += 1
+                    yield f"{subject} osmway:node {blank_node} ."
+                    yield f"{blank_node} osmway:node osmnode:{nd.attrib['ref']} ."
+                    yield f'{blank_node} osm2rdfmember:pos "{position}"^^xsd:integer .'
+                    if nd.attrib['ref'] in locations:
+                        points.append(locations[nd.attrib['ref']])
+                if len(points) > 1:
+                    geometry = f"LINESTRING({','.join(points)})"
+            elif element.tag == 'relation':
+                for position, member in enumerate(element.iter('member')):
+                    blank_node = f"_:{blank_node_counter}"
+                    blank_node_counter += 1
+                    member_name = 'rel' if member.attrib['type'] == 'relation' else member.attrib['type']
+                    yield f"{subject} osmrel:member {blank_node} ."
+                    yield f"{blank_node} osm2rdfmember:id osm{member_name}:{member.attrib['ref']} ."
+                    yield f"{blank_node} osm2rdfmember:role {self.__literal(member.attrib.get('role', ''))} ."
+                    yield f'{blank_node} osm2rdfmember:pos "{position}"^^xsd:integer .'
+
+            if geometry is not None:
+                geometry_subject = f"osm2rdfgeom:osm_{name}_{identifier}"
+                yield f"{subject} geo:hasGeometry {geometry_subject} ."
+                yield f'{geometry_subject} geo:asWKT "{geometry}"^^geo:wktLiteral .'
+
+    @staticmethod
+    def __literal(value: str) -> str:
+        """
+        Formats the passed value as a Turtle string literal.
+        """
+        escaped = value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n').replace('\r', '\\r')
+        return f'"{escaped}"'
+
+
+class Osm2RdfException(Exception):
+    pass
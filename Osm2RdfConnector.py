@@ -1,86 +1,152 @@
 import logging
-from subprocess import Popen
-from Constants import OSM_2_RDF_INPUT_FILE_NAME, OSM_2_RDF_OUTPUT_FILE_NAME
-from shlex import split as shlex_split
-from bz2 import open as bz2_open
-from subprocess import DEVNULL, STDOUT
+from concurrent.futures import ThreadPoolExecutor
+from typing import Collection, Optional
+
+from Constants import OSM_ELEMENT_PREFIXES, TEMPORARY_TAG
+from Metrics import Metrics
+from Osm2RdfBackend import Osm2RdfBackend, DockerBackend
 
 
 class Osm2RdfConnector:
     osm2rdf_path: str
     image_name: str
+    backend: Osm2RdfBackend
+    backends: list[Osm2RdfBackend]
+    metrics: Metrics
 
-    def __init__(self, osm2rdf_path: str, image_name: str) -> None:
+    def __init__(
+            self,
+            osm2rdf_path: str,
+            image_name: str,
+            backend: Optional[Osm2RdfBackend] = None,
+            metrics: Optional[Metrics] = None,
+            workers: int = 1) -> None:
         """
         Connection layer for the osm2rdf tool, that is used to convert osm data to RDF Turtle.
         (see https://github.com/ad-freiburg/osm2rdf)
 
         :param osm2rdf_path: The path to the folder where osm2rdf is located.
         :param image_name: The name of the docker image for osm2rdf
+        :param backend: The backend that runs the conversion. Defaults to a new docker container for each conversion.
+        :param metrics: The registry for the timers and counters of the conversions
+        :param workers: The number of conversions that convert_shards() runs at the same time. Every worker gets a
+        backend of its own, with separate 'input' and 'scratch' folders in 'workers/<index>' below the osm2rdf path.
         """
 
         self.osm2rdf_path = osm2rdf_path
         self.image_name = image_name
+        self.backend = backend if backend is not None else DockerBackend(osm2rdf_path, image_name)
+        self.backends = [self.backend] + [self.backend.create_worker(index) for index in range(1, workers)]
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.__executor = ThreadPoolExecutor(workers, 'osm2rdf') if workers > 1 else None
 
-    def __write_input_to_file(self, data: bytes) -> None:
+    def convert(self, osm_data: bytes) -> str:
         """
-        Packs the passed data in a xml element and writes it to the input file in the osm2rdf tool's 'input' folder
-        :param data: Data to be written to the input file.
+        Converts the passed osm data to RDF Turtle and returns the generated tuples.
+        :param osm_data: The osm data to convert
+        :return: The generated tuples in RDF Turtle format
         """
-        logging.debug("Writing osm data to input file")
-        with open(self.osm2rdf_path + f"/input/{OSM_2_RDF_INPUT_FILE_NAME}", 'w') as file:
-            content = f'<osmChange version="0.6" generator="osmdbt-create-diff/0.6">\n{data.decode()}\n</osmChange>'
-            file.write(content)
-            file.close()
+        return '\n'.join(self.convert_lines(osm_data))
 
-    def __read_output_from_file(self) -> str:
+    def convert_lines(self, osm_data: bytes, temporary_subjects: Collection[str] = ()) -> list[str]:
         """
-        Reads the content of the osm2rdf tools 'output' folder and returns it as a string.
-        :return: The content of the 'output' folder.
+        Converts the passed osm data to RDF Turtle and filters the output of the backend in a single pass while it is
+        streamed, without building the whole output as one string. The headers that begin with '@prefix', empty
+        lines and the triples of the temporary tag are dropped.
+        :param osm_data: The osm data to convert
+        :param temporary_subjects: The subjects of the elements to which the temporary tag was added
+        :return: The generated triples in RDF Turtle format, one triple per line
         """
-        logging.debug("Reading rdf data from output file")
-        with bz2_open(self.osm2rdf_path + f"/output/{OSM_2_RDF_OUTPUT_FILE_NAME}") as file:
-            return file.read().decode()
+        return self.__convert_lines(self.backend, osm_data, temporary_subjects)
 
-    def convert(self, osm_data: bytes) -> str:
+    def convert_shards(self, shards: list[bytes], temporary_subjects: Collection[str] = ()) -> list[list[str]]:
         """
-        Converts the passed osm data to RDF Turtle and returns the generated tuples.
-        :param osm_data: The osm data to convert
-        :return: The generated tuples in RDF Turtle format
+        Converts the passed shards of osm data at the same time, each shard on the backend of another worker. Every
+        shard has to contain the nodes that its ways reference, because the shards are converted independently.
+        :param shards: The osm data of each shard
+        :param temporary_subjects: The subjects of the elements to which the temporary tag was added
+        :return: The triples of each shard, in the order of the shards
         """
-        self.__write_input_to_file(osm_data)
-        self.__run()
+        if self.__executor is None or len(shards) <= 1:
+            return [self.convert_lines(shard, temporary_subjects) for shard in shards]
+
+        if len(shards) > len(self.backends):
+            raise Osm2RdfConnectorException(f"Got {len(shards)} shards for {len(self.backends)} workers")
 
-        output = self.__remove_headers(self.__read_output_from_file())
-        if output == "":
+        futures = [self.__executor.submit(self.__convert_lines, backend, shard, temporary_subjects)
+                   for backend, shard in zip(self.backends, shards)]
+        return [future.result() for future in futures]
+
+    def __convert_lines(
+            self,
+            backend: Osm2RdfBackend,
+            osm_data: bytes,
+            temporary_subjects: Collection[str]) -> list[str]:
+        document = f'<osmChange version="0.6" generator="osmdbt-create-diff/0.6">\n{osm_data.decode()}\n</osmChange>'
+        lines: list[str] = []
+        with self.metrics.time('osm2rdf.convert'):
+            for line in backend.convert(document):
+                if line == '' or line[0] == '@' or line.isspace():
+                    continue
+                if (len(temporary_subjects) > 0 and TEMPORARY_TAG in line
+                        and line.split(' ', 1)[0] in temporary_subjects):
+                    continue
+                lines.append(line)
+
+        self.metrics.increment('osm2rdf.conversions')
+        self.metrics.increment('osm2rdf.input_bytes', len(osm_data))
+        if len(lines) == 0:
             logging.warning(f"No output generated for input: {osm_data}")
 
-        return output
+        return lines
 
-    @staticmethod
-    def __remove_headers(string: str) -> str:
+    def close(self) -> None:
         """
-        Removes all lines from the given string that begin with an '@', matching the headers that begin with
-        '@prefix'
+        Shuts down the backends of the connector.
         """
-        lines = string.split('\n')
-        filtered_lines = [line for line in lines if not line.startswith('@')]
-        return '\n'.join(filtered_lines)
+        if self.__executor is not None:
+            self.__executor.shutdown()
+        for backend in self.backends:
+            backend.close()
 
-    def __run(self) -> None:
+    @staticmethod
+    def split_by_subject(lines: list[str], subjects: list[str]) -> dict[str, list[str]]:
         """
-        Runs the docker command to execute the osm2rdf tool.
+        Splits the output of a conversion into the triples that belong to each of the passed subjects. Besides the
+        triples of the subject itself, the triples of all auxiliary subjects it links to (for example blank nodes or
+        geometries) are assigned to it. Triples of other osm elements, like the node references of a way, are dropped.
+        :param lines: The converted triples in RDF Turtle format, one triple per line
+        :param subjects: The subjects to collect the triples for, for example 'osmway:7738035'
+        :return: A dictionary that maps every passed subject to the lines of its triples
         """
-        logging.debug("Start Conversion")
-        args = shlex_split(f'docker run --rm '
-                           f'-v {self.osm2rdf_path}/input/:/input/ '
-                           f'-v {self.osm2rdf_path}/output/:/output/ '
-                           f'-v {self.osm2rdf_path}/scratch/:/scratch/ '
-                           f'{self.image_name} '
-                           f'/input/{OSM_2_RDF_INPUT_FILE_NAME} '
-                           f'-o /output/{OSM_2_RDF_OUTPUT_FILE_NAME} '
-                           f'-t /scratch/')
-        p = Popen(args, cwd=self.osm2rdf_path, stdout=DEVNULL, stderr=STDOUT)
-        result = p.wait()
-        if result != 0:
-            raise Exception(f'Failed to convert to RDF')
\ No newline at end of file
+        lines_per_subject: dict[str, list[str]] = {}
+        for line in lines:
+            subject = line.split(' ', 1)[0]
+            lines_per_subject.setdefault(subject, []).append(line)
+
+        triples_per_subject: dict[str, list[str]] = {}
+        for subject in subjects:
+            subject_lines: list[str] = []
+            visited_subjects: set[str] = {subject}
+            subjects_to_visit: list[str] = [subject]
+            while subjects_to_visit:
+                for line in lines_per_subject.get(subjects_to_visit.pop(), []):
+                    subject_lines.append(line)
+
+                    # Follow the object of the triple if it is an auxiliary subject of the element
+                    parts = line.rstrip().removesuffix('.').rstrip().split(' ', 2)
+                    if len(parts) < 3:
+                        continue
+                    obj = parts[2]
+                    if (obj not in visited_subjects and obj in lines_per_subject
+                            and not obj.startswith(OSM_ELEMENT_PREFIXES)):
+                        visited_subjects.add(obj)
+                        subjects_to_visit.append(obj)
+
+            triples_per_subject[subject] = subject_lines
+
+        return triples_per_subject
+
+
+class Osm2RdfConnectorException(Exception):
+    pass
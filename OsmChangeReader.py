@@ -0,0 +1,48 @@
+import gzip
+from typing import BinaryIO, Iterator, Optional
+from xml.etree import ElementTree
+
+from ChangeRecord import ChangeRecord
+
+
+class OsmChangeReader:
+    stream: BinaryIO
+    compressed: bool
+
+    def __init__(self, stream: BinaryIO, compressed: bool = True) -> None:
+        """
+        Reads the changes of an osmChange document incrementally, without building the tree of the whole document.
+        Each change is yielded as a tuple of its action ('create', 'modify' or 'delete') and a compact ChangeRecord of
+        its element. The element itself is detached from the document right away, so that only the element that is
+        currently read is held as a tree in memory.
+
+        :param stream: The stream to read the osmChange document from
+        :param compressed: True if the stream is gzip compressed, like the diffs on the osm server
+        """
+        self.stream = stream
+        self.compressed = compressed
+
+    def __iter__(self) -> Iterator[tuple[str, ChangeRecord]]:
+        source = gzip.GzipFile(fileobj=self.stream) if self.compressed else self.stream
+
+        depth = 0
+        root: Optional[ElementTree.Element] = None
+        action: Optional[ElementTree.Element] = None
+        for event, element in ElementTree.iterparse(source, events=('start', 'end')):
+            if event == 'start':
+                depth += 1
+                if depth == 1:
+                    root = element
+                elif depth == 2:
+                    action = element
+                continue
+
+            # The element is complete with all its children once its end is read
+            if depth == 3:
+                record = ChangeRecord.from_element(action.tag, element)
+                action.remove(element)
+                yield action.tag, record
+            elif depth == 2:
+                root.remove(action)
+
+            depth -= 1
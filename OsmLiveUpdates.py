@@ -1,213 +1,868 @@
 import logging
-from urllib.error import HTTPError
-from urllib.request import urlopen
-import gzip
 import io
-import re
 from xml.etree import ElementTree
 import time
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, Iterator, Optional
 
 from Osm2RdfConnector import Osm2RdfConnector
-from SparqlConnector import SparqlConnector, OutputFormat
-from Constants import OSM_REPLICATION_BASE_URL, STATE_FILE_EXTENSION, CHANGE_FILE_EXTENSION, TEMPORARY_TAG, OSM_NODE_URL
+from Osm2RdfBackend import Osm2RdfBackend
+from NodeResolver import NodeResolver
+from HttpClient import HttpClient, HttpException
+from ReplicationCache import ReplicationCache
+from ReplicationClient import ReplicationClient
+from ReplicationPrefetcher import ReplicationPrefetcher
+from CatchUpPlanner import CatchUpPlanner
+from OsmChangeReader import OsmChangeReader
+from ChangeRecord import ChangeRecord
+from Pipeline import BackgroundIterator
+from ChangeConsolidator import ChangeConsolidator
+from Checkpoint import Checkpoint
+from ElementStateStore import ElementStateStore
+from DependencyIndex import DependencyIndex
+from FlatNodeStore import FlatNodeStore, COORDINATE_PRECISION
+from RegionFilter import RegionFilter
+from Metrics import Metrics, Profiler
+from SparqlConnector import SparqlConnector, OutputFormat, SparqlException
+from SparqlFileSink import SparqlFileSink
+from Constants import TEMPORARY_TAG, OSM_API_URL, OSM_REPLICATION_BASE_URL, SPARQL_MAX_BATCH_BYTES, \
+    SPARQL_DELETE_CHUNK_SIZE, NODE_CACHE_SIZE, REPLICATION_INTERVAL, PUBLICATION_DELAY, MIN_POLL_INTERVAL, \
+    MAX_POLL_INTERVAL, OSM_2_RDF_MIN_SHARD_SIZE, PIPELINE_PARSE_QUEUE_SIZE, PIPELINE_MAX_PENDING_REQUESTS, \
+    OSM_ELEMENT_TYPES
 
 
 class OsmLiveUpdates:
     osm2rdfConnector: Osm2RdfConnector
     sparqlConnector: SparqlConnector
+    httpClient: HttpClient
+    replicationClient: ReplicationClient
+    nodeResolver: NodeResolver
+    metrics: Metrics
+    elementStateStore: Optional[ElementStateStore]
+    dependencyIndex: Optional[DependencyIndex]
+    regionFilter: Optional[RegionFilter]
+    batch_conversion: bool
+    pipeline: bool
+    applied_timestamp: Optional[datetime]
+    sequence_lag: int
+    timestamp_lag: float
 
     def __init__(
             self,
             osm2rdf_path: str,
             osm2rdf_image_name: str,
             sparql_endpoint: str,
-            output_format: OutputFormat = OutputFormat.SPARQL_ENDPOINT):
-        self.osm2rdfConnector = Osm2RdfConnector(osm2rdf_path, osm2rdf_image_name)
-        self.sparqlConnector = SparqlConnector(sparql_endpoint, output_format)
-
-    def fetch_change(self, from_sequence_number: int):
+            output_format: OutputFormat = OutputFormat.SPARQL_ENDPOINT,
+            batch_conversion: bool = False,
+            osm2rdf_backend: Optional[Osm2RdfBackend] = None,
+            sparql_max_batch_operations: int = 1,
+            sparql_max_batch_bytes: int = SPARQL_MAX_BATCH_BYTES,
+            osm_api_url: str = OSM_API_URL,
+            node_cache_size: int = NODE_CACHE_SIZE,
+            http_client: Optional[HttpClient] = None,
+            replication_cache: Optional[ReplicationCache] = None,
+            replication_base_url: str = OSM_REPLICATION_BASE_URL,
+            metrics: Optional[Metrics] = None,
+            sparql_file_sink: Optional[SparqlFileSink] = None,
+            sparql_delete_chunk_size: int = SPARQL_DELETE_CHUNK_SIZE,
+            element_state_store: Optional[ElementStateStore] = None,
+            dependency_index: Optional[DependencyIndex] = None,
+            node_store: Optional[FlatNodeStore] = None,
+            osm2rdf_workers: int = 1,
+            pipeline: bool = False,
+            region_filter: Optional[RegionFilter] = None,
+            graph_store_url: Optional[str] = None):
+        """
+        :param osm2rdf_path: The path to the folder where osm2rdf is located.
+        :param osm2rdf_image_name: The name of the docker image for osm2rdf
+        :param sparql_endpoint: The Url of the sparql endpoint
+        :param output_format: The output format of the sparql endpoint.
+        :param batch_conversion: If True, all elements of a diff that are created or modified are converted with a
+        single run of osm2rdf instead of one run per element.
+        :param osm2rdf_backend: The backend that runs osm2rdf, defaults to a new docker container for each conversion.
+        :param sparql_max_batch_operations: The maximum number of operations sent in one sparql update request.
+        :param sparql_max_batch_bytes: The maximum size of one sparql update request in bytes.
+        :param osm_api_url: The url of the osm api, that is used to fetch the node references of ways.
+        :param node_cache_size: The maximum number of nodes that are cached in memory.
+        :param http_client: The client for all requests to the osm server, defaults to a new client.
+        :param replication_cache: Local cache for the diff and state files of the replication server.
+        :param replication_base_url: The url of the replication server, from which the diffs are fetched.
+        :param metrics: The registry for the timers and counters of all stages, which is exported after each diff.
+        :param sparql_file_sink: The output file for OutputFormat.FILE, for example with compression or rotation.
+        :param sparql_delete_chunk_size: The maximum number of subjects that are deleted with one sparql operation.
+        :param element_state_store: Store for the triples that were inserted for each element. If set, a modified
+        element is only updated with the triples that were removed or added, instead of replacing all its triples.
+        :param dependency_index: Index of the ways that reference each node. If set, the ways whose nodes were moved
+        or deleted are converted again at the end of each diff, so that their geometry stays up to date.
+        :param node_store: Flat file with the locations of all nodes, from which the node references of ways are
+        resolved without requests to the osm api.
+        :param osm2rdf_workers: The number of osm2rdf conversions that run at the same time. With batch conversion,
+        the elements of a diff are split into this many shards, which are converted in parallel.
+        :param pipeline: If True, the stages overlap: the changes of a diff are parsed ahead in a background thread,
+        while the main thread resolves the node references and converts the elements, and the sparql updates are
+        sent by another background thread. The stages are connected by bounded queues, keep the order of the
+        changes, and all updates of a diff are sent before the checkpoint advances.
+        :param region_filter: If set, only the changes in its region are processed, and all other changes are skipped
+        before their node references are resolved and they are converted. It should use the same node store.
+        :param graph_store_url: The graph store protocol endpoint to which the inserted triples are posted as turtle
+        with OutputFormat.GRAPH_STORE, while the deletes are still sent to the sparql endpoint.
+        """
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.osm2rdfConnector = Osm2RdfConnector(
+            osm2rdf_path, osm2rdf_image_name, osm2rdf_backend, self.metrics, osm2rdf_workers)
+        self.httpClient = http_client if http_client is not None else HttpClient()
+        self.sparqlConnector = SparqlConnector(
+            sparql_endpoint, output_format, sparql_max_batch_operations, sparql_max_batch_bytes, self.metrics,
+            sparql_file_sink, sparql_delete_chunk_size, PIPELINE_MAX_PENDING_REQUESTS if pipeline else 0,
+            graph_store_url, self.httpClient)
+        self.replicationClient = ReplicationClient(
+            self.httpClient, replication_cache, replication_base_url, self.metrics)
+        self.nodeResolver = NodeResolver(self.httpClient, osm_api_url, node_cache_size, node_store=node_store)
+        self.elementStateStore = element_state_store
+        self.dependencyIndex = dependency_index
+        self.regionFilter = region_filter
+        self.batch_conversion = batch_conversion
+        self.pipeline = pipeline
+        self.applied_timestamp = None
+        self.sequence_lag = 0
+        self.timestamp_lag = 0
+
+    def fetch_change(
+            self,
+            from_sequence_number: int,
+            prefetch_depth: int = 0,
+            consolidation_window: int = 1,
+            checkpoint_file: Optional[str] = None,
+            catch_up: bool = False) -> int:
+        """
+        Fetches and processes all diffs after the passed sequence number up to the latest one, in order.
+        :param from_sequence_number: The sequence number of the last diff that was already processed
+        :param prefetch_depth: The number of diffs that are downloaded ahead in the background, while the current
+        diff is processed.
+        :param consolidation_window: The number of consecutive diffs whose changes are merged into their net changes
+        before they are processed. With the default of 1, every diff is processed on its own.
+        :param checkpoint_file: Path to a file in which the sequence number of the last applied diff is stored.
+        :param catch_up: If True and the lag is large, the diffs of the 'day' and 'hour' streams are applied first,
+        before switching back to the minute diffs near the latest one.
+        :return: The sequence number of the last applied diff
+        """
         logging.info(f"Starting fetch from sequence number {str(from_sequence_number)}")
+        checkpoint = Checkpoint(checkpoint_file) if checkpoint_file is not None else None
+        if catch_up:
+            from_sequence_number = self.__catch_up(
+                from_sequence_number, None, 'minute', prefetch_depth, consolidation_window, checkpoint)
 
-        latest_sequence_number: int = self.fetch_latest_sequence_number()
+        latest_sequence_number, latest_timestamp = self.fetch_latest_state()
         logging.info(f""
                      f"Latest sequence number is {str(latest_sequence_number)} so there are "
                      f"{str(latest_sequence_number - from_sequence_number)} diffs to fetch"
                      )
 
-        sequence_number: int = from_sequence_number + 1
-        while sequence_number <= latest_sequence_number:
-            counter = 0
-            start_time = time.time()
-            if self.__state_exists_for_sequence_number(sequence_number):
-                data: bytes = self.fetch_diff_for_sequence_number(sequence_number)
-                root: ElementTree = ElementTree.fromstring(data)
-
-                child: ElementTree.Element
-                for child in root:
-                    if child.tag == 'delete':
-                        for element in child:
-                            self.__handle_delete(element)
-                            counter += 1
-                    elif child.tag == 'create':
-                        for element in child:
-                            self.__handle_insert(element)
-                            counter += 1
-                    elif child.tag == 'modify':
-                        for element in child:
-                            self.__handle_modify(element)
-                            counter += 1
+        return self.__process_diffs(
+            from_sequence_number + 1, latest_sequence_number, prefetch_depth, consolidation_window, checkpoint)
+
+    def follow(
+            self,
+            checkpoint_file: str,
+            from_sequence_number: Optional[int] = None,
+            prefetch_depth: int = 0,
+            consolidation_window: int = 1,
+            catch_up: bool = False) -> None:
+        """
+        Keeps the data up to date by continuously processing new diffs as soon as they are published. After each
+        applied diff the checkpoint file is updated, and on start the updates are resumed from it. The server is
+        polled shortly after the next diff is expected to be published, and less often while it is late.
+        :param checkpoint_file: Path to the file in which the sequence number of the last applied diff is stored
+        :param from_sequence_number: The sequence number of the last diff that was already processed, which is only
+        used if there is no checkpoint yet. Defaults to the latest sequence number.
+        :param prefetch_depth: The number of diffs that are downloaded ahead in the background, while the current
+        diff is processed.
+        :param consolidation_window: The maximum number of consecutive diffs whose changes are merged into their net
+        changes before they are processed.
+        :param catch_up: If True and the lag is large, the diffs of the 'day' and 'hour' streams are applied first,
+        before switching back to the minute diffs near the latest one. A catch-up that was interrupted is always
+        resumed.
+
+        If a request still fails after its retries, or the sparql endpoint rejects an update, the error is logged and
+        the diffs are applied again from the checkpoint after a backoff, which grows while the errors persist.
+        """
+        checkpoint = Checkpoint(checkpoint_file)
+        applied_sequence_number = checkpoint.load()
+        if applied_sequence_number is None:
+            applied_sequence_number = from_sequence_number
+            if applied_sequence_number is None:
+                applied_sequence_number = self.fetch_latest_sequence_number()
+        else:
+            self.applied_timestamp = checkpoint.timestamp
+
+        needs_catch_up = catch_up or checkpoint.granularity != 'minute'
+        logging.info(f"Following changes from sequence number {applied_sequence_number}")
+        poll_backoff = MIN_POLL_INTERVAL
+        error_backoff = MIN_POLL_INTERVAL
+        while True:
+            try:
+                if needs_catch_up:
+                    applied_sequence_number = self.__catch_up(
+                        applied_sequence_number, self.applied_timestamp, checkpoint.granularity, prefetch_depth,
+                        consolidation_window, checkpoint)
+                    needs_catch_up = False
+
+                latest_sequence_number, latest_timestamp = self.fetch_latest_state()
+                if latest_sequence_number > applied_sequence_number:
+                    applied_sequence_number = self.__process_diffs(
+                        applied_sequence_number + 1, latest_sequence_number, prefetch_depth, consolidation_window,
+                        checkpoint)
+                    poll_backoff = MIN_POLL_INTERVAL
+                    wait_time = 0
+                else:
+                    # The next diff is late, so the server is polled less often until it is published
+                    wait_time = poll_backoff
+                    poll_backoff = min(poll_backoff * 2, MAX_POLL_INTERVAL)
+            except (HttpException, SparqlException) as error:
+                self.metrics.increment('follow.errors')
+                self.__discard_changes()
+                if checkpoint.load() is not None:
+                    applied_sequence_number = checkpoint.sequence_number
+                    self.applied_timestamp = checkpoint.timestamp
+                    needs_catch_up = needs_catch_up or checkpoint.granularity != 'minute'
+                logging.error(f"Applying the diffs failed, continuing after diff {applied_sequence_number} of the "
+                              f"checkpoint in {error_backoff} seconds: {error}")
+                time.sleep(error_backoff)
+                error_backoff = min(error_backoff * 2, MAX_POLL_INTERVAL)
+                continue
+
+            error_backoff = MIN_POLL_INTERVAL
+
+            self.sequence_lag = latest_sequence_number - applied_sequence_number
+            if self.applied_timestamp is not None:
+                self.timestamp_lag = (latest_timestamp - self.applied_timestamp).total_seconds()
+            logging.info(f"Applied diff {applied_sequence_number}, lagging {self.sequence_lag} diffs and "
+                         f"{self.timestamp_lag:.0f} seconds behind the latest diff")
+            self.metrics.set_gauge('lag.sequence_numbers', self.sequence_lag)
+            self.metrics.set_gauge('lag.seconds', self.timestamp_lag)
+            self.metrics.export()
+
+            # Wait until shortly after the next diff is expected to be published
+            next_publication = latest_timestamp + timedelta(seconds=REPLICATION_INTERVAL + PUBLICATION_DELAY)
+            wait_time = max(wait_time, (next_publication - datetime.now(timezone.utc)).total_seconds())
+            time.sleep(max(wait_time, MIN_POLL_INTERVAL))
+
+    def __process_diffs(
+            self,
+            from_sequence_number: int,
+            to_sequence_number: int,
+            prefetch_depth: int,
+            consolidation_window: int,
+            checkpoint: Optional[Checkpoint],
+            granularity: str = 'minute') -> int:
+        """
+        Fetches and processes the diffs in the passed range, including both ends, in order. Stops before the first
+        diff that does not exist.
+        :param from_sequence_number: The sequence number of the first diff to process
+        :param to_sequence_number: The sequence number of the last diff to process
+        :param prefetch_depth: The number of diffs that are downloaded ahead in the background
+        :param consolidation_window: The number of consecutive diffs whose changes are merged before processing
+        :param checkpoint: The checkpoint that is updated after a diff was completely applied, if any
+        :param granularity: The replication stream of the diffs, 'minute', 'hour' or 'day'
+        :return: The sequence number of the last applied diff
+        """
+        applied_sequence_number = from_sequence_number - 1
+        diff_timestamp = self.applied_timestamp
+        consolidator = ChangeConsolidator()
+        number_of_consolidated_diffs = 0
+        first_consolidated_sequence_number = from_sequence_number
+        prefetcher = ReplicationPrefetcher(
+            lambda sequence_number: self.replicationClient.fetch_diff_if_state_exists(sequence_number, granularity),
+            prefetch_depth)
+
+        # The summary of a diff starts when the previous one ends, so that it includes fetching the diff
+        self.metrics.start_diff()
+        for sequence_number, diff in prefetcher.diffs(from_sequence_number, to_sequence_number):
+            applied = False
+            # The diffs up to this one are applied, or the ones before it if it is missing
+            last_sequence_number = sequence_number
+            if diff is not None:
+                diff_timestamp = diff[1]
+
+            if diff is None:
+                # The diffs after a missing diff are not applied, so that its changes are not skipped and the
+                # checkpoint never advances past it. It is retried by the next call.
+                logging.error(f"State for Sequence number {str(sequence_number)} does not exist, stopping before it")
+                last_sequence_number = sequence_number - 1
+            elif consolidation_window <= 1:
+                counter = self.__apply_changes(self.__read_changes(diff[0]), sequence_number)
+                logging.info(f"{counter} changes where processed for diff {sequence_number}")
+                applied = True
             else:
-                logging.error(f"State for Sequence number {str(sequence_number)} does not exist")
+                if number_of_consolidated_diffs == 0:
+                    first_consolidated_sequence_number = sequence_number
+                consolidator.add_changes(self.__read_changes(diff[0]))
+                number_of_consolidated_diffs += 1
+
+            if number_of_consolidated_diffs > 0 and (number_of_consolidated_diffs == consolidation_window
+                                                     or sequence_number == to_sequence_number or diff is None):
+                counter = self.__apply_changes(consolidator.get_changes(), first_consolidated_sequence_number)
+                logging.info(f"{counter} changes where processed for {number_of_consolidated_diffs} diffs up to "
+                             f"{last_sequence_number}, {consolidator.get_number_of_eliminated_changes()} changes "
+                             f"were eliminated by consolidation")
+                consolidator = ChangeConsolidator()
+                number_of_consolidated_diffs = 0
+                applied = True
+
+            if applied:
+                applied_sequence_number = last_sequence_number
+                self.applied_timestamp = diff_timestamp
+                if checkpoint is not None:
+                    checkpoint.save(applied_sequence_number, self.applied_timestamp, granularity)
+
+                self.metrics.set_gauge('node_resolver.diff_hits', self.nodeResolver.diff_hits)
+                self.metrics.set_gauge('node_resolver.cache_hits', self.nodeResolver.cache_hits)
+                self.metrics.set_gauge('node_resolver.store_hits', self.nodeResolver.store_hits)
+                self.metrics.set_gauge('node_resolver.misses', self.nodeResolver.misses)
+                self.metrics.set_gauge('node_resolver.requests', self.nodeResolver.number_of_requests)
+                if granularity == 'minute':
+                    self.metrics.set_gauge('applied_sequence_number', applied_sequence_number)
+                else:
+                    self.metrics.increment(f"catch_up.{granularity}_diffs")
+                logging.info(Metrics.format_diff_summary(self.metrics.finish_diff(last_sequence_number)))
+                self.metrics.export()
+                self.metrics.start_diff()
+
+            if diff is None:
+                break
+
+        logging.info(f"Waited {prefetcher.stall_time:.3f} seconds for diffs to be fetched, on average "
+                     f"{prefetcher.get_mean_queue_depth():.2f} diffs were already fetched ahead")
+        logging.debug(f"Latency histograms of the requests per host: {self.httpClient.get_latency_histograms()}")
+        return applied_sequence_number
+
+    def __read_changes(self, diff: bytes) -> Iterable[tuple[str, ChangeRecord]]:
+        """
+        :param diff: The compressed diff
+        :return: The changes of the diff, which are parsed ahead in a background thread if the pipeline is used
+        """
+        changes = OsmChangeReader(io.BytesIO(diff))
+        if self.pipeline:
+            return BackgroundIterator(changes, PIPELINE_PARSE_QUEUE_SIZE, 'parse')
+        return changes
 
-            print("--- %s seconds ---" % (time.time() - start_time))
-            logging.info(f"{counter} changes where processed for diff {sequence_number}")
-            break
-            # sequence_number += 1
+    def __catch_up(
+            self,
+            applied_sequence_number: int,
+            applied_timestamp: Optional[datetime],
+            granularity: str,
+            prefetch_depth: int,
+            consolidation_window: int,
+            checkpoint: Optional[Checkpoint]) -> int:
+        """
+        Applies the diffs of the 'day' and 'hour' streams after the last applied diff while the lag is large, see
+        CatchUpPlanner, and finds the minute diff from which the updates continue afterward.
+        :param applied_sequence_number: The sequence number of the last applied diff
+        :param applied_timestamp: The timestamp of the last applied diff, which is fetched if it is not known
+        :param granularity: The replication stream of the last applied diff
+        :param prefetch_depth: The number of diffs that are downloaded ahead in the background
+        :param consolidation_window: The number of consecutive diffs whose changes are merged before processing
+        :param checkpoint: The checkpoint that is updated after each applied diff, if any
+        :return: The sequence number of the last minute diff whose changes are all applied
+        """
+        if applied_timestamp is None:
+            applied_timestamp = self.replicationClient.fetch_timestamp_for_sequence_number(
+                applied_sequence_number, granularity)
+            if applied_timestamp is None:
+                if granularity == 'minute':
+                    logging.warning(f"State for sequence number {applied_sequence_number} does not exist, catching "
+                                    f"up with the minute diffs")
+                    return applied_sequence_number
+                raise OsmLiveUpdatesException(f"State for {granularity} diff {applied_sequence_number} does not exist")
+        self.applied_timestamp = applied_timestamp
+
+        planner = CatchUpPlanner(self.replicationClient)
+        steps = planner.plan(applied_timestamp)
+        if len(steps) == 0 and granularity == 'minute':
+            return applied_sequence_number
+
+        for step_granularity, from_sequence_number, to_sequence_number in steps:
+            applied_sequence_number = self.__process_diffs(
+                from_sequence_number, to_sequence_number, prefetch_depth, consolidation_window, checkpoint,
+                step_granularity)
+            if applied_sequence_number < to_sequence_number:
+                # A diff is missing, so the minute diffs continue after the last applied one
+                break
+
+        # The minute diff after the found one may contain changes that were already applied, which is safe. From here
+        # on the checkpoint refers to the found minute diff, so it gets its timestamp instead of the coarse one.
+        applied_sequence_number = planner.find_sequence_number('minute', self.applied_timestamp)
+        minute_timestamp = self.replicationClient.fetch_timestamp_for_sequence_number(applied_sequence_number)
+        if minute_timestamp is not None:
+            self.applied_timestamp = minute_timestamp
+        if checkpoint is not None:
+            checkpoint.save(applied_sequence_number, self.applied_timestamp)
+        logging.info(f"Caught up to {self.applied_timestamp}, continuing after minute diff {applied_sequence_number}")
+        return applied_sequence_number
+
+    def __discard_changes(self) -> None:
+        """
+        Drops the updates of diffs that could not be applied completely, so that they can be applied again from the
+        checkpoint. The node store is not rolled back, like after a crash, because its locations are only compared
+        with the diffs to decide which ways are converted again.
+        """
+        self.sparqlConnector.discard()
+        if self.elementStateStore is not None:
+            self.elementStateStore.rollback()
+        if self.dependencyIndex is not None:
+            self.dependencyIndex.rollback()
 
-    @staticmethod
-    def __open_url(url) -> bytes:
-        """
-        Tries to open an url and return the response as a byte object. Returns an empty byte object if the an exception
-        occurred while trying to open the url.
-        :param url: The url to open.
-        :return: The response as a byte object.
-        """
-        try:
-            with urlopen(url) as response:
-                return response.read()
-        except HTTPError as e:
-            if e.code == 410:
-                logging.error(f"HTTPError while opening URL \"{e.url}\" because the resource is not available "
-                              f"anymore (410)")
-            else:
-                logging.error(f"HTTPError while opening URL \"{e.url}\" with error code {e.code}")
-            return b''
+    def __apply_changes(self, changes: Iterable[tuple[str, ChangeRecord]], sequence_number: int) -> int:
+        """
+        Processes the passed changes and sends the remaining sparql operations to the endpoint afterward, or syncs
+        them to the output file.
+        :param changes: The changes as tuples of action and element
+        :param sequence_number: The sequence number of the first diff of the changes
+        :return: The number of processed changes
+        """
+        self.sparqlConnector.start_diff(sequence_number)
+        if self.regionFilter is not None:
+            changes = self.__filter_changes(changes)
 
-    def __fetch_node_references_for_way(self, element: ElementTree) -> bytes:
+        if self.batch_conversion:
+            counter = self.__process_diff_in_batch(changes)
+        else:
+            counter = self.__process_diff(changes)
+
+        self.sparqlConnector.end_diff()
+        if self.elementStateStore is not None:
+            self.elementStateStore.commit()
+        if self.dependencyIndex is not None:
+            self.dependencyIndex.commit()
+        if self.nodeResolver.node_store is not None:
+            self.nodeResolver.node_store.flush()
+        return counter
+
+    def __filter_changes(self, changes: Iterable[tuple[str, ChangeRecord]]) -> Iterator[tuple[str, ChangeRecord]]:
+        """
+        Skips the changes outside the region of the region filter. The locations of skipped nodes are still written
+        to the node store, so that it stays complete for the nodes that move into the region later, and their
+        previous versions are removed from the node cache.
+        :param changes: The changes as tuples of action and element
+        :return: The changes in the region, nodes first, then ways and relations
+        """
+        # The region filter decides on a way by the nodes it has seen so far, so all nodes are passed to it first. The
+        # changes are not grouped by type in every diff, and neither are the net changes of consolidated diffs.
+        changes = sorted(changes, key=lambda change: OSM_ELEMENT_TYPES.index(change[1].type))
+        for action, element in changes:
+            if self.regionFilter.keep(action, element):
+                yield action, element
+                continue
+
+            self.metrics.increment(f"region_filter.skipped_{element.type}s")
+            if element.type == 'node':
+                if action == 'delete':
+                    self.nodeResolver.remove_node(element.id)
+                else:
+                    self.nodeResolver.update_node(element)
+
+    def close(self) -> None:
+        """
+        Shuts down the osm2rdf backend, for example a persistent docker container, closes the output file and all open
+        connections.
+        """
+        self.osm2rdfConnector.close()
+        self.sparqlConnector.close()
+        if self.elementStateStore is not None:
+            self.elementStateStore.close()
+        if self.dependencyIndex is not None:
+            self.dependencyIndex.close()
+        if self.nodeResolver.node_store is not None:
+            self.nodeResolver.node_store.close()
+        self.httpClient.close()
+        self.metrics.close()
+
+    def __fetch_node_references_for_way(self, element: ChangeRecord, visited_nodes: Optional[set[str]] = None) -> bytes:
         """
         Fetches the node references for a way. The nodes defining the geometry of a way are  indicated only by reference
         using their unique identifier. Therefore, the node references have to be fetched so that osm2rdf can calculate
         the correct geometry for each way.
         :param element: The 'way' element, to fetch the node references for
+        :param visited_nodes: The ids of nodes that are already present and are not fetched again. The ids of the
+        fetched nodes are added to the set.
         :return: A bytes object containing the node references for a way
         """
-        nodes: bytes = b''
-        visited_nodes: set[str] = set()
-
-        for child in element:
-            if child.tag == "nd":
-                node_id = child.attrib["ref"]
+        if visited_nodes is None:
+            visited_nodes = set()
 
-                # Do not get the node reference for an already visited node. This is helpful because a way can contain a
-                # node reference multiple times (for example if the way is a circle.)
-                if node_id not in visited_nodes:
-                    visited_nodes.add(node_id)
+        node_ids: list[str] = []
+        for node_id in element.node_refs:
+            # Do not get the node reference for an already visited node. This is helpful because a way can contain a
+            # node reference multiple times (for example if the way is a circle.)
+            if node_id not in visited_nodes:
+                visited_nodes.add(node_id)
+                node_ids.append(node_id)
 
-                    # Fetch the node element
-                    url = f"{OSM_NODE_URL}/{node_id}"
-                    response = self.__open_url(url)
+        with self.metrics.time('node_references.fetch'):
+            return self.nodeResolver.resolve(node_ids)
 
-                    # Get the node text from the returned xml element
-                    if response != b'':
-                        element: ElementTree = ElementTree.fromstring(response.decode())
-                        nodes += self.__get_node_text_from_xml_element(element)
+    def __add_change_to_node_resolver(self, action: str, element: ChangeRecord) -> None:
+        """
+        Passes a node of the diff to the node resolver, so that node references to it are resolved from the diff.
+        :param action: The action of the change, 'create', 'modify' or 'delete'
+        :param element: The element of the change
+        """
+        if element.type != 'node':
+            return
 
-        return nodes
+        if action == 'delete':
+            self.nodeResolver.add_deleted_diff_node(element.id)
+        else:
+            self.nodeResolver.add_diff_node(element)
 
-    @staticmethod
-    def __get_node_text_from_xml_element(element: ElementTree) -> bytes:
+    def __add_change_to_dependency_index(
+            self,
+            action: str,
+            element: ChangeRecord,
+            dirty_way_ids: set[str],
+            changed_way_ids: set[str]) -> None:
         """
-        Extracts the node element from an XML element.
-        :param element: An XML element containing a node element
-        :return: A bytes object containing the nodes elements text
+        Updates the dependency index with a change of the diff and collects the ways that have to be converted again,
+        because one of their nodes was moved or deleted. Has to be called before the node is added to the node
+        resolver, which still holds the previous version of the node then.
+        :param action: The action of the change, 'create', 'modify' or 'delete'
+        :param element: The element of the change
+        :param dirty_way_ids: The ids of the ways whose geometry is outdated, to which the dependent ways are added
+        :param changed_way_ids: The ids of the ways that are changed by the diff itself, to which the way is added
         """
-        for child in element:
-            if child.tag == "node":
-                return ElementTree.tostring(child)
+        if self.dependencyIndex is None:
+            return
+
+        element_id = element.id
+        if element.type == 'node':
+            if action == 'delete' or (action == 'modify' and self.__has_node_moved(element)):
+                way_ids = self.dependencyIndex.get_ways_for_nodes([element_id])
+                dirty_way_ids.update(way_ids)
+                self.metrics.increment('dependencies.dirty_relations', len(
+                    self.dependencyIndex.get_relations_for_members('node', [element_id])
+                    | self.dependencyIndex.get_relations_for_members('way', way_ids)))
+        elif element.type == 'way':
+            changed_way_ids.add(element_id)
+            if action == 'delete':
+                self.dependencyIndex.remove_way(int(element_id))
+            else:
+                self.dependencyIndex.add_way(element)
+        elif element.type == 'relation':
+            if action == 'delete':
+                self.dependencyIndex.remove_relation(int(element_id))
+            else:
+                self.dependencyIndex.add_relation(element)
 
-        logging.warning(f"No node could be found in xml element {ElementTree.tostring(element)}")
-        return b''
+    def __has_node_moved(self, node: ChangeRecord) -> bool:
+        """
+        :param node: The modified node
+        :return: False if the previous location of the node is known and equal to its new location, True otherwise
+        """
+        previous_node = self.nodeResolver.get_known_node(node.id)
+        if not previous_node:
+            return True
+
+        # The locations are compared as fixed-point numbers, because a location from the flat node store is formatted
+        # differently than in the diff, for example '52.5000000' instead of '52.5'
+        previous_attributes = ElementTree.fromstring(previous_node).attrib
+        locations = ((previous_attributes.get('lat'), node.lat), (previous_attributes.get('lon'), node.lon))
+        if any(previous is None or current is None for previous, current in locations):
+            return True
+        return any(round(float(previous) * COORDINATE_PRECISION) != round(float(current) * COORDINATE_PRECISION)
+                   for previous, current in locations)
+
+    def __refresh_ways(self, way_ids: set[str]) -> None:
+        """
+        Converts the passed ways again in one run of osm2rdf, with the node locations that are known locally or
+        from the current diff, and replaces their triples.
+        :param way_ids: The ids of the ways, which are not changed by the current diff themselves
+        """
+        elements: dict[str, ChangeRecord] = {}
+        for way_id in sorted(way_ids, key=int):
+            way = self.dependencyIndex.get_way(way_id)
+            if way is not None:
+                elements[self.__get_subject(way)] = way
+
+        if len(elements) == 0:
+            return
+
+        self.metrics.increment('dependencies.refreshed_ways', len(elements))
+        if self.elementStateStore is None:
+            for way in elements.values():
+                self.__handle_delete(way)
+            self.__handle_insert_batch(elements, set())
+        else:
+            self.__handle_insert_batch(elements, set(elements))
 
-    def __handle_delete(self, element: ElementTree.Element) -> None:
+    def __handle_delete(self, element: ChangeRecord) -> None:
         """
         Handles element that is marked as to delete.
         :param element: Element to delete.
         """
-        identifier = element.attrib['id']
-        element_name = self.__get_element_name(element)
-
         # Delete all triplets containing the subject
-        subject = f"osm{element_name}:{identifier}"
+        subject = self.__get_subject(element)
         self.sparqlConnector.delete_subject(subject)
 
         # Delete the triplet that contains the osm2rdf geo object
         formatted_subject = self.__formate_subject_for_osm2rdfgeom(subject)
         self.sparqlConnector.delete_subject(formatted_subject)
 
-        logging.info(f"Processed delete for {element.tag} with id {element.attrib['id']}")
+        if self.elementStateStore is not None:
+            self.elementStateStore.delete(subject)
 
-    def __handle_insert(self, element: ElementTree.Element):
+        logging.debug(f"Processed delete for {element.type} with id {element.id}")
+
+    def __handle_insert(self, element: ChangeRecord):
         """
         Handles element that is marked to be inserted.
         :param element: Element to insert.
         """
-        # Add a tag temporary tag to the element, otherwise osm2rdf will ignore the element.
-        element_needs_temporary_tag: bool
-        try:
-            element_needs_temporary_tag = len(element.getchildren()) == 0
-        except AttributeError:
-            element_needs_temporary_tag = True
+        rdf_triples = self.__convert_element(element)
 
-        if element_needs_temporary_tag:
-            self.__add_temporary_tag(element)
+        # Insert the triplets to the database
+        if len(rdf_triples) > 0:
+            self.sparqlConnector.insert_triples(rdf_triples)
+        self.__store_triples(self.__get_subject(element), rdf_triples)
+        logging.debug(f"Processed insert for {element.type} with id {element.id}")
 
+    def __convert_element(self, element: ChangeRecord) -> list[str]:
+        """
+        Converts a single element, together with the node references if it is a way, with its own run of osm2rdf.
+        :param element: Element to convert
+        :return: The triples of the element, one per line, without the triples of the referenced nodes
+        """
         element_string: bytes = b''
         # Fetch node references for ways
-        if element.tag == "way":
+        if element.type == "way":
             node_refs = self.__fetch_node_references_for_way(element)
             element_string = node_refs
 
-        # Convert the osm data to the rdf format
-        element_string += ElementTree.tostring(element).rstrip()
-        rdf_triples = self.osm2rdfConnector.convert(element_string)
+        # Convert the osm data to the rdf format. The output also contains the triples of tagged nodes that the way
+        # references, which belong to these nodes and are split off like in a batch conversion.
+        element_string += self.__get_osm_data_for_element(element)
+        subject = self.__get_subject(element)
+        temporary_subjects = [subject] if self.__needs_temporary_tag(element) else []
+        lines = self.osm2rdfConnector.convert_lines(element_string, temporary_subjects)
+        return Osm2RdfConnector.split_by_subject(lines, [subject])[subject]
 
-        if element_needs_temporary_tag:
-            rdf_triples = self.__remove_triplets_for_temporary_tag(rdf_triples)
+    def __update_triples(self, element: ChangeRecord, new_lines: list[str]) -> None:
+        """
+        Updates a modified element with the difference between its stored triples and its new triples. The element
+        is replaced completely if its previous triples are not known, or if it has blank nodes, whose labels are
+        assigned anew by each run of osm2rdf and can't be compared.
+        :param element: The modified element
+        :param new_lines: The new triples of the element, one per line
+        """
+        subject = self.__get_subject(element)
+        old_lines = self.elementStateStore.get(subject)
+        if old_lines is None or self.__has_blank_nodes(old_lines) or self.__has_blank_nodes(new_lines):
+            self.metrics.increment('element_state.replaced')
+            self.__handle_delete(element)
+            if len(new_lines) > 0:
+                self.sparqlConnector.insert_triples(new_lines)
+            self.__store_triples(subject, new_lines)
+            return
+
+        new_line_set = set(new_lines)
+        old_line_set = set(old_lines)
+        removed_lines = [line for line in old_lines if line not in new_line_set]
+        added_lines = [line for line in new_lines if line not in old_line_set]
+        if len(removed_lines) > 0:
+            self.sparqlConnector.delete_triples(removed_lines)
+        if len(added_lines) > 0:
+            self.sparqlConnector.insert_triples(added_lines)
+
+        self.metrics.increment('element_state.updated')
+        self.metrics.increment('element_state.unchanged_triples', len(new_lines) - len(added_lines))
+        self.elementStateStore.put(subject, new_lines)
+
+    def __store_triples(self, subject: str, lines: list[str]) -> None:
+        """
+        Stores the triples that were inserted for an element, if an element state store is used.
+        """
+        if self.elementStateStore is not None:
+            self.elementStateStore.put(subject, lines)
 
-        # Insert the triplets to the database
-        self.sparqlConnector.insert_triples(rdf_triples)
-        logging.info(f"Processed insert for {element.tag} with id {element.attrib['id']}")
+    @staticmethod
+    def __has_blank_nodes(lines: list[str]) -> bool:
+        return any(line.startswith('_:') or ' _:' in line for line in lines)
+
+    def __process_diff(self, changes: Iterable[tuple[str, ChangeRecord]]) -> int:
+        """
+        Processes all changes of a diff one after another, converting each element with its own run of osm2rdf.
+        :param changes: The changes of the diff as tuples of action and element
+        :return: The number of processed changes
+        """
+        counter = 0
+        inserted_subjects: set[str] = set()
+        dirty_way_ids: set[str] = set()
+        changed_way_ids: set[str] = set()
+        self.nodeResolver.clear_diff()
+
+        for action, element in changes:
+            self.metrics.increment(f"changes.{action}")
+            self.__add_change_to_dependency_index(action, element, dirty_way_ids, changed_way_ids)
+            self.__add_change_to_node_resolver(action, element)
+
+            # The deletes are sent before all pending inserts, so an element that was already inserted in this diff
+            # has to be sent before it is deleted again
+            subject = self.__get_subject(element)
+            if action != 'create' and subject in inserted_subjects:
+                self.sparqlConnector.flush()
+                inserted_subjects.clear()
+            if action != 'delete':
+                inserted_subjects.add(subject)
+
+            if action == 'delete':
+                self.__handle_delete(element)
+            elif action == 'create':
+                self.__handle_insert(element)
+            elif action == 'modify':
+                self.__handle_modify(element)
+            counter += 1
+
+        self.__refresh_ways(dirty_way_ids - changed_way_ids)
+        return counter
+
+    def __process_diff_in_batch(self, changes: Iterable[tuple[str, ChangeRecord]]) -> int:
+        """
+        Processes all changes of a diff with a single osm2rdf conversion. Deletes are collected right away, while the
+        elements to create or modify are collected and converted together after the whole diff has been read. If an
+        element occurs more than once in the diff, only its last version is inserted.
+        :param changes: The changes of the diff as tuples of action and element
+        :return: The number of processed changes
+        """
+        counter = 0
+        elements_to_insert: dict[str, ChangeRecord] = {}
+        modified_subjects: set[str] = set()
+        dirty_way_ids: set[str] = set()
+        changed_way_ids: set[str] = set()
+        self.nodeResolver.clear_diff()
+
+        for action, element in changes:
+            counter += 1
+            self.metrics.increment(f"changes.{action}")
+            self.__add_change_to_dependency_index(action, element, dirty_way_ids, changed_way_ids)
+            self.__add_change_to_node_resolver(action, element)
+            subject = self.__get_subject(element)
+            elements_to_insert.pop(subject, None)
+            modified_subjects.discard(subject)
+
+            if action == 'delete':
+                self.__handle_delete(element)
+            elif action == 'create':
+                elements_to_insert[subject] = element
+            elif action == 'modify':
+                if self.elementStateStore is None:
+                    self.__handle_delete(element)
+                else:
+                    modified_subjects.add(subject)
+                elements_to_insert[subject] = element
+
+        self.__handle_insert_batch(elements_to_insert, modified_subjects)
+        self.__refresh_ways(dirty_way_ids - changed_way_ids)
+        return counter
+
+    def __handle_insert_batch(self, elements: dict[str, ChangeRecord], modified_subjects: set[str]) -> None:
+        """
+        Converts all passed elements, together with the node references of the ways, in one run of osm2rdf. The
+        resulting triples are split by subject and inserted for each element separately.
+        :param elements: The elements to insert, keyed by their subject
+        :param modified_subjects: The subjects of the elements that are updated with the difference to their stored
+        triples, instead of being inserted
+        """
+        if len(elements) == 0:
+            return
+
+        temporary_subjects = {subject for subject, element in elements.items() if self.__needs_temporary_tag(element)}
+
+        # Split the elements into consecutive shards, one per worker, so that the shards can be converted at the same
+        # time and their triples are still in the order of the diff
+        subjects = list(elements)
+        number_of_shards = max(1, min(len(self.osm2rdfConnector.backends), len(subjects) // OSM_2_RDF_MIN_SHARD_SIZE))
+        shard_size = -(-len(subjects) // number_of_shards)
+        shards = [subjects[i:i + shard_size] for i in range(0, len(subjects), shard_size)]
+
+        # Convert the osm data to the rdf format and assign the triples to the elements again. The triples are split
+        # per shard, because the labels of blank nodes are only unique within one run of osm2rdf.
+        rdf_triples = self.osm2rdfConnector.convert_shards(
+            [self.__get_osm_data_for_conversion([elements[subject] for subject in shard]) for shard in shards],
+            temporary_subjects)
+        triples_per_subject: dict[str, list[str]] = {}
+        for shard, shard_triples in zip(shards, rdf_triples):
+            triples_per_subject.update(Osm2RdfConnector.split_by_subject(shard_triples, shard))
+
+        for subject, element in elements.items():
+            triples = triples_per_subject[subject]
+            if subject in modified_subjects:
+                self.__update_triples(element, triples)
+                logging.debug(f"Processed modify for {element.type} with id {element.id}")
+                continue
+
+            if len(triples) == 0:
+                logging.warning(f"No triples generated for {element.type} with id {element.id}")
+                continue
+
+            self.sparqlConnector.insert_triples(triples)
+            self.__store_triples(subject, triples)
+            logging.debug(f"Processed insert for {element.type} with id {element.id}")
+
+    def __get_osm_data_for_conversion(self, elements: list[ChangeRecord]) -> bytes:
+        """
+        Joins the passed elements, together with the node references of the ways, to the input of one run of osm2rdf.
+        :param elements: The elements to convert
+        :return: The osm data of the elements
+        """
+        # osm2rdf needs the nodes before the ways and relations that reference them
+        nodes: list[bytes] = []
+        ways: list[bytes] = []
+        relations: list[bytes] = []
+        visited_nodes: set[str] = {element.id for element in elements if element.type == 'node'}
+        for element in elements:
+            if element.type == 'node':
+                nodes.append(self.__get_osm_data_for_element(element))
+            elif element.type == 'way':
+                nodes.insert(0, self.__fetch_node_references_for_way(element, visited_nodes))
+                ways.append(self.__get_osm_data_for_element(element))
+            else:
+                relations.append(self.__get_osm_data_for_element(element))
 
-    def __handle_modify(self, element: ElementTree.Element):
+        return b''.join(nodes + ways + relations)
+
+    def __handle_modify(self, element: ChangeRecord):
         """
         Handles all element that is marked to be modified, which means deleting the old triplets and inserting the
-        new ones.
+        new ones. With an element state store, only the triplets that changed are deleted and inserted.
         :param element: Element to be modified.
         """
-        logging.info(f"Process modify for {element.tag} with id {element.attrib['id']}")
-        self.__handle_delete(element)
-        self.__handle_insert(element)
+        logging.debug(f"Process modify for {element.type} with id {element.id}")
+        if self.elementStateStore is None:
+            self.__handle_delete(element)
+            self.__handle_insert(element)
+            return
+
+        self.__update_triples(element, self.__convert_element(element))
 
     @staticmethod
-    def __add_temporary_tag(element: ElementTree.Element) -> None:
+    def __needs_temporary_tag(element: ChangeRecord) -> bool:
         """
-        Adds a sub-element with tag 'tag' and key 'k' and value 'v' 'TEMPORARY' to the passed element. This is needed
-        because osm2rdf doesn't convert elements without a tag. The resulting sub-element looks like this:
-              <tag k="TEMPORARY" v="TEMPORARY"/>
-        :param element: The element to which the sub-element is to be added
+        :param element: The element to be converted
+        :return: True if the element has no tags, otherwise osm2rdf will ignore the element
         """
-        child = ElementTree.SubElement(element, "tag")
-        child.set("k", TEMPORARY_TAG)
-        child.set("v", TEMPORARY_TAG)
+        return len(element.tags) == 0
 
-    @staticmethod
-    def __remove_triplets_for_temporary_tag(triplets: str) -> str:
+    def __get_osm_data_for_element(self, element: ChangeRecord) -> bytes:
         """
-        Removes the triplets that were created for the temporary tag.
-        :param triplets: The triplets to be cleared from temporary one
-        :return: The triplets without the triplet for the temporary one
+        Writes an element as input for osm2rdf. A temporary tag is added to an element without tags, because osm2rdf
+        doesn't convert elements without a tag. The added tag looks like this, and its triples are removed from the
+        output of osm2rdf again:
+              <tag k="TEMPORARY" v="TEMPORARY"/>
+        :param element: The element to be converted
+        :return: The osm xml of the element
         """
-        return re.sub(f".*{TEMPORARY_TAG}.*\n?","", triplets)
+        if self.__needs_temporary_tag(element):
+            return element.to_xml(((TEMPORARY_TAG, TEMPORARY_TAG),))
+        return element.to_xml()
 
     def fetch_diff_for_sequence_number(self, sequence_number: int) -> bytes:
         """
@@ -215,70 +870,29 @@ class OsmLiveUpdates:
         :param sequence_number: The sequence number of the diff to fetch
         :return: The decompressed diff
         """
-        logging.debug(f"Fetching data for sequence number {str(sequence_number)}")
-        sequence_number_formatted = self.__format_sequence_number_for_url(sequence_number)
-        url = f"{OSM_REPLICATION_BASE_URL}/minute/{sequence_number_formatted}.{CHANGE_FILE_EXTENSION}"
-        response: bytes = self.__open_url(url)
-        with gzip.GzipFile(fileobj=io.BytesIO(response)) as decompressed:
-            return decompressed.read()
+        return self.replicationClient.fetch_diff_for_sequence_number(sequence_number)
 
-    def __state_exists_for_sequence_number(self, sequence_number: int) -> bool:
+    def fetch_compressed_diff_for_sequence_number(self, sequence_number: int) -> bytes:
         """
-        Checks if there exists a state file for the given sequence number on the osm server. This is needed because
-        incomplete diffs may be present that do not have a state file.
-        :param sequence_number: Sequence number of the diff
-        :return: True if the state file exists, False otherwise
-        """
-        logging.debug(f"Check if state exists for sequence number: {str(sequence_number)}")
-        sequence_number_formatted = self.__format_sequence_number_for_url(sequence_number)
-        url = f"{OSM_REPLICATION_BASE_URL}/minute/{sequence_number_formatted}.{STATE_FILE_EXTENSION}"
-
-        response: bytes = self.__open_url(url)
-        if response == b'':
-            return False
-
-        sequence_number_fetched = self.__get_sequence_number_from_state_file(response.decode())
-        return sequence_number_fetched == sequence_number
-
-    @staticmethod
-    def __get_sequence_number_from_state_file(file: str) -> int:
-        """
-        Extracts the sequence number from the given state file. The state file contains the date of upload, the sequence
-        number and the timestamp of the diff.
-        :param file: State file
-        :return: The sequence number of the diff
+        Fetches the gzip compressed diff file for the given sequence number from the osm server.
+        :param sequence_number: The sequence number of the diff to fetch
+        :return: The compressed diff
         """
-        pattern = r'sequenceNumber=(\d+)'
-        match = re.search(pattern, file)
-        return int(match.group(1))
+        return self.replicationClient.fetch_compressed_diff_for_sequence_number(sequence_number)
 
     def fetch_latest_sequence_number(self) -> int:
         """
         Fetches the sequence number of the latest diff from the osm server.
         :return: The sequence number of the latest diff
         """
-        url = f"{OSM_REPLICATION_BASE_URL}/minute/state.txt"
-        response: bytes = self.__open_url(url)
-        return self.__get_sequence_number_from_state_file(response.decode())
+        return self.replicationClient.fetch_latest_state()[0]
 
-    @staticmethod
-    def __format_sequence_number_for_url(sequence_number: int) -> str:
+    def fetch_latest_state(self) -> tuple[int, datetime]:
         """
-        Formats the sequence number in a way that it matches the format of the osm server. For example, the state file
-        for the sequence number 6177383 can be fetched with the following url:
-        https://planet.openstreetmap.org/replication/minute/006/177/383.state.txt
-        So the formatted sequence number would look like this:
-        006/177/383
-
-        :param sequence_number: The sequence number
-        :return: The formatted sequence number
+        Fetches the state of the latest diff from the osm server.
+        :return: The sequence number and the timestamp of the latest diff
         """
-        sequence_number: str = str(sequence_number)
-
-        while len(sequence_number) < 9:
-            sequence_number = "0" + sequence_number
-
-        return "{}/{}/{}".format(sequence_number[:3], sequence_number[3:6], sequence_number[6:9])
+        return self.replicationClient.fetch_latest_state()
 
     @staticmethod
     def __formate_subject_for_osm2rdfgeom(subject: str) -> str:
@@ -304,29 +918,43 @@ class OsmLiveUpdates:
 
         return formatted_subject
 
+    def __get_subject(self, element: ChangeRecord) -> str:
+        """
+        Returns the subject under which osm2rdf stores the element, for example 'osmway:7738035'.
+        :param element:
+        :return:
+        """
+        return f"osm{self.__get_element_name(element)}:{element.id}"
+
     @staticmethod
-    def __get_element_name(element: ElementTree.Element) -> str:
+    def __get_element_name(element: ChangeRecord) -> str:
         """
-        Returns the name of the element, which is its tag for nodes and ways and 'rel' for relations.
+        Returns the name of the element, which is its type for nodes and ways and 'rel' for relations.
         :param element:
         :return:
         """
         element_name: str
-        if element.tag == 'relation':
+        if element.type == 'relation':
             element_name = 'rel'
         else:
-            element_name = element.tag
+            element_name = element.type
 
         return element_name
 
 
+class OsmLiveUpdatesException(Exception):
+    pass
+
+
 def main() -> None:
     logging.getLogger().setLevel(logging.INFO)
     sparql_endpoint = ""
     osm2rdf_path = ""
     osm2rdf_image_name = ""
     output_format = OutputFormat.FILE
-    olu = OsmLiveUpdates(osm2rdf_path, osm2rdf_image_name, sparql_endpoint, output_format)
+    metrics = Metrics("metrics.prom")
+    Profiler("osm_live_updates.prof").install_signal_handler()
+    olu = OsmLiveUpdates(osm2rdf_path, osm2rdf_image_name, sparql_endpoint, output_format, metrics=metrics)
     olu.fetch_change(6181929)
 
 
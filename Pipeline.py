@@ -0,0 +1,129 @@
+import queue
+import threading
+from typing import Callable, Generic, Iterable, Iterator, Optional, TypeVar
+
+T = TypeVar('T')
+
+# Marks the end of the items in a queue
+END = object()
+
+
+class BackgroundIterator(Generic[T]):
+    name: str
+    max_queue_size: int
+
+    def __init__(self, iterable: Iterable[T], max_queue_size: int, name: str = 'pipeline') -> None:
+        """
+        Produces the items of an iterable in a background thread, so that the next items are already produced while
+        the current one is consumed. The items are handed out in their original order through a bounded queue, and
+        the producer waits while the queue is full. An exception of the producer is raised in the consumer.
+
+        :param iterable: The iterable whose items are produced, for example an OsmChangeReader
+        :param max_queue_size: The maximum number of items that are produced ahead
+        :param name: The name of the thread
+        """
+        self.name = name
+        self.max_queue_size = max_queue_size
+        self.__iterable = iterable
+        self.__queue: queue.Queue = queue.Queue(max_queue_size)
+        self.__stopped = threading.Event()
+        self.__error: Optional[BaseException] = None
+
+    def __iter__(self) -> Iterator[T]:
+        thread = threading.Thread(target=self.__produce, name=self.name, daemon=True)
+        thread.start()
+        try:
+            while True:
+                item = self.__queue.get()
+                if item is END:
+                    break
+                yield item
+        finally:
+            # Unblocks the producer if the consumer stops early
+            self.__stopped.set()
+            while thread.is_alive():
+                try:
+                    self.__queue.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            thread.join()
+
+        if self.__error is not None:
+            raise self.__error
+
+    def __produce(self) -> None:
+        try:
+            for item in self.__iterable:
+                if self.__stopped.is_set():
+                    return
+                self.__queue.put(item)
+        except BaseException as error:
+            self.__error = error
+        finally:
+            if not self.__stopped.is_set():
+                self.__queue.put(END)
+
+
+class BackgroundStage(Generic[T]):
+    name: str
+    max_queue_size: int
+
+    def __init__(self, function: Callable[[T], None], max_queue_size: int, name: str = 'pipeline') -> None:
+        """
+        Consumes items in a background thread, one after another in the order in which they were submitted. The
+        items wait in a bounded queue, and submit() blocks while the queue is full, which slows down the stages
+        before. join() is the barrier that waits until all submitted items were consumed. An exception of the
+        function is raised by every following call of submit(), join() or close(), and the remaining items are
+        dropped.
+
+        :param function: The function that consumes an item
+        :param max_queue_size: The maximum number of items that wait to be consumed
+        :param name: The name of the thread
+        """
+        self.name = name
+        self.max_queue_size = max_queue_size
+        self.__function = function
+        self.__queue: queue.Queue = queue.Queue(max_queue_size)
+        self.__error: Optional[BaseException] = None
+        self.__thread = threading.Thread(target=self.__consume, name=name, daemon=True)
+        self.__thread.start()
+
+    def submit(self, item: T) -> None:
+        """
+        Adds an item to the queue, and waits while the queue is full.
+        """
+        self.__raise_error()
+        self.__queue.put(item)
+
+    def join(self) -> None:
+        """
+        Waits until all submitted items were consumed.
+        """
+        self.__queue.join()
+        self.__raise_error()
+
+    def close(self) -> None:
+        """
+        Consumes the remaining items and stops the thread.
+        """
+        if self.__thread.is_alive():
+            self.__queue.put(END)
+            self.__thread.join()
+        self.__raise_error()
+
+    def __consume(self) -> None:
+        while True:
+            item = self.__queue.get()
+            try:
+                if item is END:
+                    return
+                if self.__error is None:
+                    self.__function(item)
+            except BaseException as error:
+                self.__error = error
+            finally:
+                self.__queue.task_done()
+
+    def __raise_error(self) -> None:
+        if self.__error is not None:
+            raise self.__error
@@ -0,0 +1,233 @@
+from typing import Optional
+
+from ChangeRecord import ChangeRecord
+from FlatNodeStore import FlatNodeStore
+
+
+class RegionFilter:
+    rings: list[list[tuple[float, float]]]
+    holes: list[list[tuple[float, float]]]
+    bounds: tuple[float, float, float, float]
+    node_store: Optional[FlatNodeStore]
+    node_ids: set[str]
+    way_ids: set[str]
+    relation_ids: set[str]
+    number_of_kept_changes: dict[str, int]
+    number_of_skipped_changes: dict[str, int]
+
+    def __init__(
+            self,
+            bbox: Optional[tuple[float, float, float, float]] = None,
+            polygon: Optional[list[list[tuple[float, float]]]] = None,
+            holes: Optional[list[list[tuple[float, float]]]] = None,
+            node_store: Optional[FlatNodeStore] = None) -> None:
+        """
+        Keeps only the changes of a region, so that the changes elsewhere are neither converted nor uploaded. Nodes
+        are kept if their location is in the region. Ways are kept if they reference a node in the region, and
+        relations if they have a kept node, way or relation as member. The ids of the kept elements are tracked,
+        together with the nodes of the kept ways, so that later changes of an element that left the region, or of
+        a node of a kept way outside the region, are kept as well.
+
+        The nodes of a way are often not part of the diff. Their locations are looked up in the node store, if one is
+        used, and otherwise only the nodes that were kept so far are known. Deletes do not contain the location,
+        nodes or members of an element, so a deleted node is only skipped if its location in the node store is
+        outside the region, and deleted ways and relations are always kept.
+
+        :param bbox: The bounding box of the region as minimum longitude, minimum latitude, maximum longitude and
+        maximum latitude
+        :param polygon: The outer rings of the region, instead of a bounding box, each as a list of longitude and
+        latitude
+        :param holes: The inner rings of the polygon, which are not part of the region
+        :param node_store: The locations of all nodes, from which the nodes of ways are located
+        """
+        if polygon is not None:
+            self.rings = polygon
+        elif bbox is not None:
+            min_lon, min_lat, max_lon, max_lat = bbox
+            self.rings = [[(min_lon, min_lat), (max_lon, min_lat), (max_lon, max_lat), (min_lon, max_lat)]]
+        else:
+            raise RegionFilterException("A region filter needs either a bounding box or a polygon")
+
+        if len(self.rings) == 0 or any(len(ring) < 3 for ring in self.rings):
+            raise RegionFilterException("Each ring of a polygon needs at least three points")
+
+        self.holes = holes if holes is not None else []
+        self.bounds = self.__get_bounds(self.rings)
+        self.node_store = node_store
+        self.node_ids = set()
+        self.way_ids = set()
+        self.relation_ids = set()
+        self.number_of_kept_changes = {'node': 0, 'way': 0, 'relation': 0}
+        self.number_of_skipped_changes = {'node': 0, 'way': 0, 'relation': 0}
+
+    @classmethod
+    def from_poly_file(cls, file_path: str, node_store: Optional[FlatNodeStore] = None) -> 'RegionFilter':
+        """
+        Reads the region from a file in the polygon filter format of osmosis, in which the extracts of Geofabrik are
+        defined. Rings whose name starts with '!' are holes.
+        :param file_path: The path of the '.poly' file
+        :param node_store: The locations of all nodes, from which the nodes of ways are located
+        :return: The filter for the region
+        """
+        rings: list[list[tuple[float, float]]] = []
+        holes: list[list[tuple[float, float]]] = []
+        with open(file_path) as file:
+            lines = [line.strip() for line in file if line.strip() != '']
+
+        # The first line is the name of the region, followed by the rings, which each end with 'END'
+        ring: Optional[list[tuple[float, float]]] = None
+        for line in lines[1:]:
+            if ring is None:
+                if line == 'END':
+                    break
+                ring = []
+                (holes if line.startswith('!') else rings).append(ring)
+            elif line == 'END':
+                ring = None
+            else:
+                lon, lat = line.split()[:2]
+                ring.append((float(lon), float(lat)))
+
+        if len(rings) == 0:
+            raise RegionFilterException(f"The file {file_path} does not contain a polygon")
+
+        return cls(polygon=rings, holes=holes, node_store=node_store)
+
+    def keep(self, action: str, element: ChangeRecord) -> bool:
+        """
+        Decides whether a change is in the region, and tracks the kept elements. The changes of a diff have to be
+        passed ordered by type, nodes first, then ways and relations, so that the nodes of a diff are known before the
+        ways that reference them, and the ways before the relations. Within each type they stay in the order of the
+        diff.
+        :param action: The action of the change, 'create', 'modify' or 'delete'
+        :param element: The element of the change
+        :return: True if the change is kept
+        """
+        if element.type == 'node':
+            kept = self.__keep_node(action, element)
+        elif element.type == 'way':
+            kept = self.__keep_way(action, element)
+        else:
+            kept = self.__keep_relation(action, element)
+
+        if kept:
+            self.number_of_kept_changes[element.type] += 1
+        else:
+            self.number_of_skipped_changes[element.type] += 1
+        return kept
+
+    def __keep_node(self, action: str, node: ChangeRecord) -> bool:
+        if node.id in self.node_ids:
+            if action == 'delete':
+                self.node_ids.discard(node.id)
+            return True
+
+        # The node store still holds the previous location of the node, so a node that moved out of the region or
+        # was deleted in it is kept as well
+        previous_location = self.__get_stored_location(node.id)
+        if action == 'delete':
+            return previous_location is None or self.__is_in_region(previous_location)
+
+        if node.lat is None or node.lon is None or not self.__is_in_region((node.lat, node.lon)):
+            return previous_location is not None and self.__is_in_region(previous_location)
+
+        self.node_ids.add(node.id)
+        return True
+
+    def __keep_way(self, action: str, way: ChangeRecord) -> bool:
+        if action == 'delete':
+            self.way_ids.discard(way.id)
+            return True
+
+        if way.id not in self.way_ids and not any(self.__is_node_in_region(node_id) for node_id in way.node_refs):
+            return False
+
+        # The nodes of the way are tracked, so that their moves outside the region still update its geometry
+        self.way_ids.add(way.id)
+        self.node_ids.update(way.node_refs)
+        return True
+
+    def __keep_relation(self, action: str, relation: ChangeRecord) -> bool:
+        if action == 'delete':
+            self.relation_ids.discard(relation.id)
+            return True
+
+        if relation.id not in self.relation_ids and not any(
+                self.__is_member_in_region(member_type, ref) for member_type, ref, _ in relation.members):
+            return False
+
+        self.relation_ids.add(relation.id)
+        return True
+
+    def __is_node_in_region(self, node_id: str) -> bool:
+        if node_id in self.node_ids:
+            return True
+
+        location = self.__get_stored_location(node_id)
+        return location is not None and self.__is_in_region(location)
+
+    def __is_member_in_region(self, member_type: str, ref: str) -> bool:
+        if member_type == 'node':
+            return self.__is_node_in_region(ref)
+        if member_type == 'way':
+            return ref in self.way_ids
+        return ref in self.relation_ids
+
+    def __is_in_region(self, location: tuple[str, str]) -> bool:
+        return self.contains(float(location[1]), float(location[0]))
+
+    def __get_stored_location(self, node_id: str) -> Optional[tuple[str, str]]:
+        if self.node_store is None:
+            return None
+        return self.node_store.get(int(node_id))
+
+    def contains(self, lon: float, lat: float) -> bool:
+        """
+        :param lon: The longitude of the point
+        :param lat: The latitude of the point
+        :return: True if the point is in the region
+        """
+        min_lon, min_lat, max_lon, max_lat = self.bounds
+        if lon < min_lon or lon > max_lon or lat < min_lat or lat > max_lat:
+            return False
+
+        return (any(self.__is_in_ring(lon, lat, ring) for ring in self.rings)
+                and not any(self.__is_in_ring(lon, lat, hole) for hole in self.holes))
+
+    @staticmethod
+    def __is_in_ring(lon: float, lat: float, ring: list[tuple[float, float]]) -> bool:
+        """
+        Tests with a ray to the east whether the point is in the ring, by counting how often the ray crosses its edges.
+        Points on the boundary of an axis-aligned ring, like a bounding box, are inside.
+        """
+        inside = False
+        previous_lon, previous_lat = ring[-1]
+        for current_lon, current_lat in ring:
+            if (current_lat > lat) != (previous_lat > lat):
+                crossing_lon = current_lon + (lat - current_lat) * (previous_lon - current_lon) / (
+                        previous_lat - current_lat)
+                if lon < crossing_lon:
+                    inside = not inside
+            previous_lon, previous_lat = current_lon, current_lat
+
+        if not inside:
+            # The ray test leaves out parts of the boundary, which belong to the region
+            inside = any(RegionFilter.__is_on_edge(lon, lat, ring[i - 1], ring[i]) for i in range(len(ring)))
+        return inside
+
+    @staticmethod
+    def __is_on_edge(lon: float, lat: float, start: tuple[float, float], end: tuple[float, float]) -> bool:
+        if not (min(start[0], end[0]) <= lon <= max(start[0], end[0])
+                and min(start[1], end[1]) <= lat <= max(start[1], end[1])):
+            return False
+        return (end[0] - start[0]) * (lat - start[1]) == (end[1] - start[1]) * (lon - start[0])
+
+    @staticmethod
+    def __get_bounds(rings: list[list[tuple[float, float]]]) -> tuple[float, float, float, float]:
+        points = [point for ring in rings for point in ring]
+        return (min(lon for lon, _ in points), min(lat for _, lat in points),
+                max(lon for lon, _ in points), max(lat for _, lat in points))
+
+
+class RegionFilterException(Exception):
+    pass
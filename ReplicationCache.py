@@ -0,0 +1,131 @@
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Optional
+
+from Constants import REPLICATION_CACHE_MAX_SIZE
+from HttpClient import HttpNotFoundException
+
+
+class ReplicationCache:
+    cache_path: str
+    max_size: int
+    offline: bool
+    files: OrderedDict[str, int]
+    size: int
+    hits: int
+    misses: int
+
+    def __init__(self, cache_path: str, max_size: int = REPLICATION_CACHE_MAX_SIZE, offline: bool = False) -> None:
+        """
+        Local copy of the files on the replication server, in the same directory layout, for example
+        'minute/006/177/383.osc.gz'. Diff and state files of a sequence number never change once they are published,
+        so they are served from the cache without network access. When the size of the cache exceeds the maximum
+        size, the least recently used files are removed.
+
+        :param cache_path: The directory of the cache
+        :param max_size: The maximum size of all cached files in bytes
+        :param offline: If True, the network is never used and files that are not cached are treated as missing, so
+        that the updates can be replayed from a prepopulated cache.
+        """
+        self.cache_path = cache_path
+        self.max_size = max_size
+        self.offline = offline
+        self.files = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.__lock = threading.Lock()
+        self.__load_index()
+
+    def __load_index(self) -> None:
+        """
+        Collects the files that are already in the cache directory, ordered from least to most recently used.
+        """
+        files: list[tuple[float, str, int]] = []
+        for directory, _, file_names in os.walk(self.cache_path):
+            for file_name in file_names:
+                if file_name.endswith('.tmp'):
+                    continue
+                path = os.path.join(directory, file_name)
+                stat = os.stat(path)
+                files.append((stat.st_mtime, os.path.relpath(path, self.cache_path), stat.st_size))
+
+        for _, relative_path, size in sorted(files):
+            self.files[relative_path] = size
+            self.size += size
+
+    def fetch(self, relative_path: str, fetch: Callable[[], bytes], immutable: bool = True) -> bytes:
+        """
+        Returns the file from the cache, or fetches it from the server and adds it to the cache.
+        :param relative_path: The path of the file relative to the replication base url, like 'minute/state.txt'
+        :param fetch: Function that fetches the file from the server
+        :param immutable: If False, the file can change on the server, like the state of the latest diff. It is
+        always fetched from the server then, unless the cache is offline.
+        :return: The content of the file
+        :raises ReplicationCacheMissException: If the cache is offline and the file is not cached
+        """
+        if immutable or self.offline:
+            data = self.__get(os.path.normpath(relative_path))
+            if data is not None:
+                self.hits += 1
+                return data
+
+        self.misses += 1
+        if self.offline:
+            raise ReplicationCacheMissException(f"File {relative_path} is not in the replication cache")
+
+        data = fetch()
+        self.__put(os.path.normpath(relative_path), data)
+        return data
+
+    def __get(self, relative_path: str) -> Optional[bytes]:
+        """
+        Reads a file from the cache and marks it as most recently used.
+        """
+        with self.__lock:
+            if relative_path not in self.files:
+                return None
+            self.files.move_to_end(relative_path)
+
+        path = os.path.join(self.cache_path, relative_path)
+        try:
+            with open(path, 'rb') as file:
+                data = file.read()
+            os.utime(path)
+        except FileNotFoundError:
+            with self.__lock:
+                self.size -= self.files.pop(relative_path, 0)
+            return None
+
+        return data
+
+    def __put(self, relative_path: str, data: bytes) -> None:
+        """
+        Atomically writes a file to the cache and removes the least recently used files if the cache is too large.
+        """
+        path = os.path.join(self.cache_path, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporary_path, 'wb') as file:
+            file.write(data)
+        os.replace(temporary_path, path)
+
+        with self.__lock:
+            self.size -= self.files.pop(relative_path, 0)
+            self.files[relative_path] = len(data)
+            self.size += len(data)
+
+            while self.size > self.max_size and len(self.files) > 1:
+                evicted_path, evicted_size = self.files.popitem(last=False)
+                self.size -= evicted_size
+                try:
+                    os.remove(os.path.join(self.cache_path, evicted_path))
+                except FileNotFoundError:
+                    pass
+                logging.debug(f"Evicted {evicted_path} from the replication cache")
+
+
+class ReplicationCacheMissException(HttpNotFoundException):
+    pass
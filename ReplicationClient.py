@@ -0,0 +1,191 @@
+import gzip
+import io
+import logging
+import re
+from datetime import datetime, timezone
+from typing import Optional
+
+from Constants import OSM_REPLICATION_BASE_URL, STATE_FILE_EXTENSION, CHANGE_FILE_EXTENSION, REPLICATION_GRANULARITIES
+from HttpClient import HttpClient, HttpNotFoundException, HttpGoneException
+from Metrics import Metrics
+from ReplicationCache import ReplicationCache
+
+
+class ReplicationClient:
+    http_client: HttpClient
+    replication_cache: Optional[ReplicationCache]
+    base_url: str
+    metrics: Metrics
+
+    def __init__(
+            self,
+            http_client: Optional[HttpClient] = None,
+            replication_cache: Optional[ReplicationCache] = None,
+            base_url: str = OSM_REPLICATION_BASE_URL,
+            metrics: Optional[Metrics] = None) -> None:
+        """
+        Fetches the diff and state files from the replication server of osm. Every method reads the 'minute' stream
+        by default, and the 'hour' or 'day' stream if that granularity is passed.
+
+        :param http_client: The client used for the requests, defaults to a new client
+        :param replication_cache: Local cache for the diff and state files
+        :param base_url: The url of the replication server
+        :param metrics: The registry for the timers and counters of the requests
+        """
+        self.http_client = http_client if http_client is not None else HttpClient()
+        self.replication_cache = replication_cache
+        self.base_url = base_url
+        self.metrics = metrics if metrics is not None else Metrics()
+
+    def fetch_diff_if_state_exists(
+            self,
+            sequence_number: int,
+            granularity: str = 'minute') -> Optional[tuple[bytes, datetime]]:
+        """
+        Fetches the compressed diff for the given sequence number, if a state file exists for it.
+        :param sequence_number: The sequence number of the diff to fetch
+        :param granularity: The replication stream, 'minute', 'hour' or 'day'
+        :return: The compressed diff and the timestamp from its state file, or None if there is no state file for
+        the sequence number
+        """
+        timestamp = self.fetch_timestamp_for_sequence_number(sequence_number, granularity)
+        if timestamp is None:
+            return None
+
+        return self.fetch_compressed_diff_for_sequence_number(sequence_number, granularity), timestamp
+
+    def fetch_diff_for_sequence_number(self, sequence_number: int, granularity: str = 'minute') -> bytes:
+        """
+        Fetches the diff file for the given sequence number from the osm server and decompresses it.
+        :param sequence_number: The sequence number of the diff to fetch
+        :param granularity: The replication stream, 'minute', 'hour' or 'day'
+        :return: The decompressed diff
+        """
+        response: bytes = self.fetch_compressed_diff_for_sequence_number(sequence_number, granularity)
+        with gzip.GzipFile(fileobj=io.BytesIO(response)) as decompressed:
+            return decompressed.read()
+
+    def fetch_compressed_diff_for_sequence_number(self, sequence_number: int, granularity: str = 'minute') -> bytes:
+        """
+        Fetches the gzip compressed diff file for the given sequence number from the osm server. The changes can be
+        read from it incrementally with an OsmChangeReader.
+        :param sequence_number: The sequence number of the diff to fetch
+        :param granularity: The replication stream, 'minute', 'hour' or 'day'
+        :return: The compressed diff
+        """
+        logging.debug(f"Fetching data for sequence number {str(sequence_number)} of the {granularity} stream")
+        path = f"{self.get_stream_path(granularity)}/{self.format_sequence_number_for_url(sequence_number)}"
+        with self.metrics.time('replication.fetch_diff'):
+            diff = self.fetch_replication_file(f"{path}.{CHANGE_FILE_EXTENSION}")
+
+        self.metrics.increment('replication.diff_bytes', len(diff))
+        return diff
+
+    def fetch_replication_file(self, path: str, immutable: bool = True) -> bytes:
+        """
+        Fetches a file from the replication server, or from the replication cache if one is used.
+        :param path: The path of the file relative to the replication base url, for example 'minute/state.txt'
+        :param immutable: False if the file can change on the server, like the state of the latest diff
+        :return: The content of the file
+        """
+        url = f"{self.base_url}/{path}"
+        if self.replication_cache is None:
+            return self.http_client.get(url)
+
+        return self.replication_cache.fetch(path, lambda: self.http_client.get(url), immutable)
+
+    def fetch_timestamp_for_sequence_number(
+            self,
+            sequence_number: int,
+            granularity: str = 'minute') -> Optional[datetime]:
+        """
+        Checks if there exists a state file for the given sequence number on the osm server. This is needed because
+        incomplete diffs may be present that do not have a state file.
+        :param sequence_number: Sequence number of the diff
+        :param granularity: The replication stream, 'minute', 'hour' or 'day'
+        :return: The timestamp of the diff if the state file exists, None otherwise
+        """
+        logging.debug(f"Check if state exists for sequence number: {str(sequence_number)}")
+        sequence_number_formatted = self.format_sequence_number_for_url(sequence_number)
+        path = f"{self.get_stream_path(granularity)}/{sequence_number_formatted}.{STATE_FILE_EXTENSION}"
+
+        try:
+            with self.metrics.time('replication.fetch_state'):
+                response: bytes = self.fetch_replication_file(path)
+        except (HttpNotFoundException, HttpGoneException):
+            return None
+
+        sequence_number_fetched = self.get_sequence_number_from_state_file(response.decode())
+        if sequence_number_fetched != sequence_number:
+            return None
+
+        return self.get_timestamp_from_state_file(response.decode())
+
+    @staticmethod
+    def get_sequence_number_from_state_file(file: str) -> int:
+        """
+        Extracts the sequence number from the given state file. The state file contains the date of upload, the sequence
+        number and the timestamp of the diff.
+        :param file: State file
+        :return: The sequence number of the diff
+        """
+        pattern = r'sequenceNumber=(\d+)'
+        match = re.search(pattern, file)
+        return int(match.group(1))
+
+    @staticmethod
+    def get_timestamp_from_state_file(file: str) -> datetime:
+        """
+        Extracts the timestamp from the given state file, in which the colons are escaped, for example:
+        timestamp=2024-09-03T12\\:34\\:02Z
+        :param file: State file
+        :return: The timestamp of the diff
+        """
+        pattern = r'timestamp=(\S+)'
+        match = re.search(pattern, file)
+        timestamp = match.group(1).replace('\\:', ':')
+        return datetime.strptime(timestamp, '%Y-%m-%dT%H:%M:%SZ').replace(tzinfo=timezone.utc)
+
+    def fetch_latest_state(self, granularity: str = 'minute') -> tuple[int, datetime]:
+        """
+        Fetches the state of the latest diff from the osm server.
+        :param granularity: The replication stream, 'minute', 'hour' or 'day'
+        :return: The sequence number and the timestamp of the latest diff
+        """
+        response: bytes = self.fetch_replication_file(f"{self.get_stream_path(granularity)}/state.txt",
+                                                      immutable=False)
+        return (self.get_sequence_number_from_state_file(response.decode()),
+                self.get_timestamp_from_state_file(response.decode()))
+
+    @staticmethod
+    def get_stream_path(granularity: str) -> str:
+        """
+        :param granularity: The replication stream, 'minute', 'hour' or 'day'
+        :return: The path of the stream relative to the replication base url
+        """
+        if granularity not in REPLICATION_GRANULARITIES:
+            raise ReplicationClientException(f"Unknown replication granularity \"{granularity}\"")
+        return granularity
+
+    @staticmethod
+    def format_sequence_number_for_url(sequence_number: int) -> str:
+        """
+        Formats the sequence number in a way that it matches the format of the osm server. For example, the state file
+        for the sequence number 6177383 can be fetched with the following url:
+        https://planet.openstreetmap.org/replication/minute/006/177/383.state.txt
+        So the formatted sequence number would look like this:
+        006/177/383
+
+        :param sequence_number: The sequence number
+        :return: The formatted sequence number
+        """
+        sequence_number: str = str(sequence_number)
+
+        while len(sequence_number) < 9:
+            sequence_number = "0" + sequence_number
+
+        return "{}/{}/{}".format(sequence_number[:3], sequence_number[3:6], sequence_number[6:9])
+
+
+class ReplicationClientException(Exception):
+    pass
@@ -0,0 +1,92 @@
+import logging
+import time
+from datetime import datetime
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Callable, Iterator, Optional
+
+from Constants import PREFETCH_WORKERS
+
+
+class ReplicationPrefetcher:
+    fetch_diff: Callable[[int], Optional[tuple[bytes, datetime]]]
+    prefetch_depth: int
+    number_of_workers: int
+    stall_time: float
+    queue_depths: list[int]
+
+    def __init__(
+            self,
+            fetch_diff: Callable[[int], Optional[tuple[bytes, datetime]]],
+            prefetch_depth: int,
+            number_of_workers: int = PREFETCH_WORKERS) -> None:
+        """
+        Downloads the diffs for the next sequence numbers in background threads, while the diffs before them are
+        processed. The diffs are still handed out strictly in the order of their sequence numbers.
+
+        :param fetch_diff: Function that fetches and validates the diff for a sequence number. It returns the diff
+        together with its timestamp, or None if there is no valid diff for the sequence number.
+        :param prefetch_depth: The maximum number of diffs that are fetched ahead. With a depth of 0, every diff is
+        fetched when it is needed.
+        :param number_of_workers: The number of threads that fetch diffs at the same time
+        """
+        self.fetch_diff = fetch_diff
+        self.prefetch_depth = prefetch_depth
+        self.number_of_workers = number_of_workers
+        self.stall_time = 0
+        self.queue_depths = []
+
+    def diffs(
+            self,
+            from_sequence_number: int,
+            to_sequence_number: int) -> Iterator[tuple[int, Optional[tuple[bytes, datetime]]]]:
+        """
+        Yields the diffs for all sequence numbers in the passed range, including both ends.
+        :param from_sequence_number: The first sequence number
+        :param to_sequence_number: The last sequence number
+        :return: An iterator over tuples of the sequence number and the result of fetch_diff for it
+        """
+        if self.prefetch_depth <= 0:
+            for sequence_number in range(from_sequence_number, to_sequence_number + 1):
+                start_time = time.perf_counter()
+                diff = self.fetch_diff(sequence_number)
+                self.stall_time += time.perf_counter() - start_time
+                yield sequence_number, diff
+            return
+
+        futures: deque[tuple[int, Future]] = deque()
+        next_sequence_number = from_sequence_number
+        with ThreadPoolExecutor(max_workers=self.number_of_workers) as executor:
+            def fill_queue() -> None:
+                nonlocal next_sequence_number
+                while next_sequence_number <= to_sequence_number and len(futures) < self.prefetch_depth:
+                    futures.append((next_sequence_number, executor.submit(self.fetch_diff, next_sequence_number)))
+                    next_sequence_number += 1
+
+            try:
+                fill_queue()
+                while len(futures) > 0:
+                    self.queue_depths.append(sum(1 for _, future in futures if future.done()))
+                    sequence_number, future = futures.popleft()
+                    fill_queue()
+
+                    start_time = time.perf_counter()
+                    diff = future.result()
+                    stall_time = time.perf_counter() - start_time
+                    self.stall_time += stall_time
+                    logging.debug(f"Waited {stall_time:.3f} seconds for diff {sequence_number}, "
+                                  f"{self.queue_depths[-1]} diffs were ready")
+
+                    yield sequence_number, diff
+            finally:
+                for _, future in futures:
+                    future.cancel()
+
+    def get_mean_queue_depth(self) -> float:
+        """
+        :return: The mean number of diffs that were already fetched when the next diff was requested
+        """
+        if len(self.queue_depths) == 0:
+            return 0
+
+        return sum(self.queue_depths) / len(self.queue_depths)
@@ -1,32 +1,109 @@
 from SPARQLWrapper import SPARQLWrapper, XML, POST
-from Constants import PREFIXES, SPARQL_OUTPUT_FILE_NAME
+from SPARQLWrapper.SPARQLExceptions import SPARQLWrapperException
+from Constants import PREFIXES, SPARQL_MAX_BATCH_BYTES, SPARQL_DELETE_CHUNK_SIZE, SPARQL_GRAPH_STORE_CONTENT_TYPE
+from HttpClient import HttpClient, HttpException
+from Metrics import Metrics
+from Pipeline import BackgroundStage
+from SparqlFileSink import SparqlFileSink
 import urllib.error
+import base64
+import logging
+import re
+import time
 from enum import Enum
+from typing import Optional, Union
+
+
+# The prefixes of the sparql updates as prefixes of a turtle document
+TURTLE_PREFIXES = re.sub(r'PREFIX (\S+) (<[^>]*>)\s*', r'@prefix \1 \2 .\n', PREFIXES.strip()) + '\n'
+
+# A string literal or the label of a blank node in a term position, so that labels are only replaced outside literals
+TURTLE_LITERAL_OR_BLANK_NODE = re.compile(r'"(?:[^"\\\n]|\\.)*"|(?<!\S)_:(\w+)')
 
 
 class OutputFormat(Enum):
     FILE = 1
     SPARQL_ENDPOINT = 2
+    # The deletes are sent as sparql updates, the inserts as turtle documents to a graph store protocol endpoint
+    GRAPH_STORE = 3
 
 
 class SparqlConnector:
     sparql: SPARQLWrapper
     output_format: OutputFormat
+    max_batch_operations: int
+    max_batch_bytes: int
+    delete_chunk_size: int
+    pending_operations: list[str]
+    pending_triples: list[str]
+    pending_deleted_subjects: dict[str, None]
+    pending_bytes: int
+    metrics: Metrics
+    file_sink: Optional[SparqlFileSink]
+    max_pending_requests: int
+    graph_store_url: Optional[str]
+    http_client: Optional[HttpClient]
 
-    def __init__(self, url_to_sparql_endpoint: str, output_format: OutputFormat = OutputFormat.SPARQL_ENDPOINT):
+    def __init__(
+            self,
+            url_to_sparql_endpoint: str,
+            output_format: OutputFormat = OutputFormat.SPARQL_ENDPOINT,
+            max_batch_operations: int = 1,
+            max_batch_bytes: int = SPARQL_MAX_BATCH_BYTES,
+            metrics: Optional[Metrics] = None,
+            file_sink: Optional[SparqlFileSink] = None,
+            delete_chunk_size: int = SPARQL_DELETE_CHUNK_SIZE,
+            max_pending_requests: int = 0,
+            graph_store_url: Optional[str] = None,
+            http_client: Optional[HttpClient] = None):
         """
         Initializes a Sparql Connector, who creates sparql queries and sends them to SPARQL endpoint or writes them to
-        a file, depending on the output format.
+        a file, depending on the output format. The queries are collected and sent together as one update request,
+        as soon as the maximum number of operations or bytes of a batch is reached or flush() is called.
 
         :param url_to_sparql_endpoint: The Url of the sparql endpoint
         :param output_format: The output format of the sparql endpoint.
+        :param max_batch_operations: The maximum number of operations that are sent in one update request. With the
+        default of 1, every query is sent immediately.
+        :param max_batch_bytes: The maximum size of the operations that are sent in one update request, in bytes. A
+        single operation that exceeds the limit is sent on its own.
+        :param metrics: The registry for the timers and counters of the queries. The timers of delete_subject and
+        insert_triples include the time of a flush that they trigger.
+        :param file_sink: The output file for OutputFormat.FILE, defaults to an uncompressed file without rotation
+        :param delete_chunk_size: The maximum number of subjects that are deleted with one operation
+        :param max_pending_requests: If greater than 0, the update requests are sent by a background thread in their
+        original order, while the next operations are created. flush() waits while this many requests are pending,
+        and end_diff() waits until all of them were sent. With the default of 0, every request is sent by flush().
+        :param graph_store_url: The url to which the inserted triples are posted for OutputFormat.GRAPH_STORE, for
+        example 'http://localhost:3030/osm/data?default'. The triples of a batch are sent as one turtle document,
+        which the endpoint loads without parsing an update request, after the other operations of the batch.
+        :param http_client: The client for the requests to the graph store, defaults to a new client
         """
         self.output_format = output_format
+        self.max_batch_operations = max_batch_operations
+        self.max_batch_bytes = max_batch_bytes
+        self.delete_chunk_size = delete_chunk_size
+        self.pending_operations = []
+        self.pending_triples = []
+        self.pending_deleted_subjects = {}
+        self.pending_bytes = 0
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.file_sink = None
+        self.max_pending_requests = max_pending_requests
+        self.graph_store_url = graph_store_url
+        self.http_client = None
+        self.__sender: Optional[BackgroundStage[tuple[list[str], list[str], int]]] = None
+        self.__number_of_relabeled_inserts = 0
 
         if output_format == OutputFormat.FILE:
-            self.__write_to_output_file(f"{PREFIXES}", "w")
+            self.file_sink = file_sink if file_sink is not None else SparqlFileSink()
             return
 
+        if output_format == OutputFormat.GRAPH_STORE:
+            if graph_store_url is None:
+                raise SparqlException("The output format GRAPH_STORE needs the url of a graph store endpoint")
+            self.http_client = http_client if http_client is not None else HttpClient()
+
         # Set up connection to sparql endpoint
         self.sparql = SPARQLWrapper(url_to_sparql_endpoint)
         self.sparql.setReturnFormat(XML)
@@ -45,52 +122,268 @@ class SparqlConnector:
         except urllib.error.URLError:
             raise SparqlException("Could not connect to SPARQL endpoint")
 
-    @staticmethod
-    def __write_to_output_file(text: str, mode: str = "a"):
-        f = open(SPARQL_OUTPUT_FILE_NAME, mode)
-        f.write(text)
-        f.close()
+    def __start_sender(self) -> None:
+        """
+        Starts the background thread that sends the requests, if the requests are sent in the background.
+        """
+        if self.max_pending_requests > 0 and self.__sender is None:
+            self.__sender = BackgroundStage(self.__send, self.max_pending_requests, 'sparql')
 
     def delete_subject(self, subject: str) -> None:
         """
-        Creates and executes a sparql query that deletes all triplets containing the given subject
+        Deletes all triplets containing the given subject. The subjects are collected and deleted as a set, with one
+        operation per chunk of subjects. The deletes are always sent before the inserts that were added since the
+        last flush, so an element that was inserted before has to be flushed before it can be deleted.
         :param subject: The subject for which the triplets are to be deleted
         """
-        query: str = f"DELETE {{ {subject} ?p ?o }} WHERE {{ {subject} ?p ?o . }};\n"
+        with self.metrics.time('sparql.delete_subject'):
+            if subject in self.pending_deleted_subjects:
+                return
 
-        if self.output_format == OutputFormat.FILE:
-            self.__write_to_output_file(text=query)
-            return
+            # The size of the subject counts towards the batch when it is added, and the size of the rest of the
+            # delete operation with the first subject of a chunk
+            number_of_bytes = self.__get_number_of_delete_bytes(subject)
+            if self.pending_bytes > 0 and self.pending_bytes + number_of_bytes > self.max_batch_bytes:
+                self.flush()
+                number_of_bytes = self.__get_number_of_delete_bytes(subject)
 
-        self.sparql.setQuery(
-f"""
-{PREFIXES}
-{query}
-"""
-        )
-        self.sparql.queryType = "INSERT"
-        self.sparql.query()
+            self.pending_deleted_subjects[subject] = None
+            self.pending_bytes += number_of_bytes
+            if len(self.pending_deleted_subjects) >= self.delete_chunk_size:
+                self.__add_delete_query()
+                if self.__get_number_of_pending_operations() >= self.max_batch_operations:
+                    self.flush()
+
+    def __get_number_of_delete_bytes(self, subject: str) -> int:
+        """
+        :return: The number of bytes by which a subject extends the delete operation of the pending subjects
+        """
+        number_of_bytes = len(subject.encode()) + 1
+        if len(self.pending_deleted_subjects) == 0:
+            number_of_bytes += len(self.__create_delete_query([]).encode())
+        return number_of_bytes
+
+    def __add_delete_query(self) -> None:
+        """
+        Adds the operation that deletes the pending subjects at the front of the batch. It has to run before the
+        inserts of the batch, which may contain the new triples of the deleted subjects. Its size is already counted
+        in pending_bytes.
+        """
+        query = self.__create_delete_query(list(self.pending_deleted_subjects))
+        self.metrics.increment('sparql.deleted_subjects', len(self.pending_deleted_subjects))
+        self.pending_deleted_subjects = {}
+        self.pending_operations.insert(0, query)
+
+    @staticmethod
+    def __create_delete_query(subjects: list[str]) -> str:
+        """
+        Creates an operation that deletes all triples of the passed subjects.
+        """
+        return f"DELETE {{ ?s ?p ?o }} WHERE {{ VALUES ?s {{ {' '.join(subjects)} }} ?s ?p ?o . }};\n"
 
-    def insert_triples(self, triples: str) -> None:
+    def insert_triples(self, triples: Union[str, list[str]]) -> None:
         """
         Creates and executes a sparql query that inserts the passed triples.
-        :param triples: The triples to insert
+        :param triples: The triples to insert, as text or as a list with one triple per line
         """
-        triples_formatted = triples.replace("\n", " ")
-        query: str = f"INSERT DATA {{ {triples_formatted} }};\n"
+        with self.metrics.time('sparql.insert_triples'):
+            if self.output_format == OutputFormat.GRAPH_STORE:
+                self.__add_to_batch(self.__create_turtle(triples), True)
+            else:
+                self.__add_operation(self.__create_data_operation('INSERT DATA', triples))
 
-        if self.output_format == OutputFormat.FILE:
-            self.__write_to_output_file(text=query)
+    def delete_triples(self, triples: Union[str, list[str]]) -> None:
+        """
+        Creates and executes a sparql query that deletes exactly the passed triples.
+        :param triples: The triples to delete, as text or as a list with one triple per line
+        """
+        with self.metrics.time('sparql.delete_triples'):
+            self.__add_operation(self.__create_data_operation('DELETE DATA', triples))
+
+    def __create_data_operation(self, operation: str, triples: Union[str, list[str]]) -> str:
+        """
+        Creates an 'INSERT DATA' or 'DELETE DATA' operation. The lines of a list are joined directly into the
+        operation, without joining them to a text first. The labels of blank nodes are scoped to the whole update
+        request, so the blank nodes of an insert are relabeled to keep them apart from those of the other inserts.
+        """
+        if isinstance(triples, str):
+            triples_formatted = triples.replace('\n', ' ')
+        else:
+            triples_formatted = ' '.join(triples)
+        if operation == 'INSERT DATA':
+            triples_formatted = self.__relabel_blank_nodes(triples_formatted)
+        return f"{operation} {{ {triples_formatted} }};\n"
+
+    def __create_turtle(self, triples: Union[str, list[str]]) -> str:
+        """
+        Joins the triples of an insert for the turtle document of the graph store. The labels of blank nodes are only
+        unique within one insert, so they are made unique within the document.
+        """
+        text = self.__relabel_blank_nodes(triples if isinstance(triples, str) else '\n'.join(triples))
+        return text if text.endswith('\n') else text + '\n'
+
+    def __relabel_blank_nodes(self, text: str) -> str:
+        """
+        Prefixes the labels of the blank nodes of an insert with a number that is unique for each insert.
+        """
+        if '_:' not in text:
+            return text
+
+        self.__number_of_relabeled_inserts += 1
+        prefix = f"_:i{self.__number_of_relabeled_inserts}_"
+        return TURTLE_LITERAL_OR_BLANK_NODE.sub(
+            lambda match: match.group(0) if match.group(1) is None else prefix + match.group(1), text)
+
+    def __add_operation(self, query: str) -> None:
+        """
+        Adds an update operation to the current batch.
+        :param query: The update operation, terminated by a ';'
+        """
+        self.__add_to_batch(query, False)
+
+    def __add_to_batch(self, text: str, is_triples: bool) -> None:
+        """
+        Adds an update operation or the triples of an insert to the current batch. The batch is flushed before, if
+        they would exceed the maximum size of the batch, and after, if the batch reached the maximum number of
+        operations.
+        :param text: The update operation or the triples
+        :param is_triples: True if the text are triples for the graph store
+        """
+        number_of_bytes = len(text.encode())
+        if self.pending_bytes > 0 and self.pending_bytes + number_of_bytes > self.max_batch_bytes:
+            self.flush()
+
+        if is_triples:
+            self.pending_triples.append(text)
+        else:
+            self.pending_operations.append(text)
+        self.pending_bytes += number_of_bytes
+
+        if self.__get_number_of_pending_operations() >= self.max_batch_operations:
+            self.flush()
+
+    def __get_number_of_pending_operations(self) -> int:
+        return len(self.pending_operations) + len(self.pending_triples)
+
+    def flush(self) -> None:
+        """
+        Sends all collected operations in their original order as one update request to the sparql endpoint, or writes
+        them to the output file. The remaining deletes are sent first. With a graph store, the inserted triples are
+        posted after the other operations. If max_pending_requests is set, the request is only handed to the
+        background thread.
+        """
+        if len(self.pending_deleted_subjects) > 0:
+            self.__add_delete_query()
+
+        if self.__get_number_of_pending_operations() == 0:
             return
 
-        self.sparql.setQuery(
-f"""
-{PREFIXES}
-{query}
-"""
-        )
-        self.sparql.queryType = "DELETE"
-        self.sparql.query()
+        batch = (self.pending_operations, self.pending_triples, self.pending_bytes)
+        self.pending_operations = []
+        self.pending_triples = []
+        self.pending_bytes = 0
+
+        if self.max_pending_requests > 0:
+            self.__start_sender()
+            self.__sender.submit(batch)
+        else:
+            self.__send(batch)
+
+    def __send(self, batch: tuple[list[str], list[str], int]) -> None:
+        """
+        Sends one update request to the sparql endpoint, or writes it to the output file, and posts the inserted
+        triples to the graph store.
+        :param batch: The operations of the request, the triples for the graph store and their size in bytes
+        """
+        operations, triples, number_of_bytes = batch
+        number_of_operations = len(operations) + len(triples)
+        start_time = time.perf_counter()
+        if self.output_format == OutputFormat.FILE:
+            # The file sink buffers the operations itself, so they are passed on without joining them
+            for operation in operations:
+                self.file_sink.write(operation)
+        elif len(operations) > 0:
+            # The body of the request is built with a single join of the prefixes and all operations
+            self.sparql.setQuery(''.join(['\n', PREFIXES, '\n', *operations, '\n']))
+            self.sparql.queryType = "INSERT"
+            try:
+                self.sparql.query()
+            except (SPARQLWrapperException, OSError) as error:
+                raise SparqlException(f"Update request to the sparql endpoint failed: {error}") from error
+
+        if len(triples) > 0:
+            self.__post_triples(triples)
+
+        latency = time.perf_counter() - start_time
+        self.metrics.add_duration('sparql.flush', latency)
+        self.metrics.increment('sparql.requests')
+        self.metrics.increment('sparql.operations', number_of_operations)
+        self.metrics.increment('sparql.bytes', number_of_bytes)
+        logging.debug(f"Sent batch with {number_of_operations} operations and {number_of_bytes} bytes in "
+                      f"{latency:.3f} seconds")
+
+    def __post_triples(self, triples: list[str]) -> None:
+        """
+        Posts the triples as one turtle document to the graph store, which adds them to the graph.
+        """
+        body = ''.join([TURTLE_PREFIXES, *triples]).encode()
+        credentials = base64.b64encode(b"demo:demo").decode()
+        self.http_client.request('POST', self.graph_store_url, body, {
+            'Content-Type': SPARQL_GRAPH_STORE_CONTENT_TYPE,
+            'Authorization': f"Basic {credentials}",
+        })
+        self.metrics.increment('sparql.graph_store_requests')
+        self.metrics.increment('sparql.graph_store_bytes', len(body))
+
+    def start_diff(self, sequence_number: int) -> None:
+        """
+        Marks the start of a diff, or of a consolidation window of diffs, in the output file.
+        :param sequence_number: The sequence number of the first diff
+        """
+        if self.file_sink is not None:
+            self.file_sink.start_diff(sequence_number)
+
+    def end_diff(self) -> None:
+        """
+        Sends the remaining operations of a diff and makes sure that the output file contains the whole diff on disk.
+        This is the barrier after which all updates of the diff were sent, also with a background thread.
+        """
+        self.flush()
+        if self.__sender is not None:
+            self.__sender.join()
+        if self.file_sink is not None:
+            self.file_sink.end_diff()
+
+    def discard(self) -> None:
+        """
+        Drops the operations that were not sent yet, after a diff could not be applied completely. A background sender
+        is stopped together with its error, and the updates of the diff that were already written to the output file
+        are cut off when it is written next.
+        """
+        self.pending_operations = []
+        self.pending_triples = []
+        self.pending_deleted_subjects = {}
+        self.pending_bytes = 0
+        if self.__sender is not None:
+            sender = self.__sender
+            self.__sender = None
+            try:
+                sender.close()
+            except (HttpException, SparqlException) as error:
+                logging.debug(f"Discarded the error of the background sender: {error}")
+        if self.file_sink is not None:
+            self.file_sink.discard()
+
+    def close(self) -> None:
+        """
+        Sends the remaining operations and closes the output file.
+        """
+        self.flush()
+        if self.__sender is not None:
+            self.__sender.close()
+            self.__sender = None
+        if self.file_sink is not None:
+            self.file_sink.close()
 
 
 class SparqlException(Exception):
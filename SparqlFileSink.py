@@ -0,0 +1,225 @@
+import gzip
+import os
+from typing import BinaryIO, Optional
+
+from Constants import PREFIXES, SPARQL_OUTPUT_FILE_NAME, SPARQL_FILE_BUFFER_SIZE
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSION_EXTENSIONS = {'gzip': '.gz', 'zstd': '.zst'}
+# The extension of the file in which the size of the output file after its last complete diff is recorded
+COMMITTED_SIZE_EXTENSION = '.committed'
+
+
+class SparqlFileSink:
+    file_path: str
+    buffer_size: int
+    compression: Optional[str]
+    rotate_per_diff: bool
+    max_file_size: Optional[int]
+    sequence_number: Optional[int]
+    file_paths: list[str]
+
+    def __init__(
+            self,
+            file_path: str = SPARQL_OUTPUT_FILE_NAME,
+            buffer_size: int = SPARQL_FILE_BUFFER_SIZE,
+            compression: Optional[str] = None,
+            rotate_per_diff: bool = False,
+            max_file_size: Optional[int] = None) -> None:
+        """
+        Output file for the sparql updates of OutputFormat.FILE. The file stays open for the whole run and the updates
+        are collected in memory and written in large blocks, so after a crash the file can end with a part of a diff.
+        At the end of each diff the file is synced to disk, and its size is recorded in a file next to it with the
+        extension '.committed'. When the sink is started again, it cuts the file back to this size and appends to
+        it, so that earlier output is kept and the file only contains complete diffs, which can be replayed or bulk
+        loaded into the endpoint later. The diff that was recorded last may be written once more if the checkpoint
+        was not saved for it, which is harmless when the updates are replayed. Every file starts with the prefixes,
+        so that each file can be loaded on its own. A compressed file holds one gzip member or zstd frame per diff,
+        which are decompressed as one stream.
+
+        If the files are rotated, the sequence number of the first diff in a file is added to its name, for example
+        'sparql_output.000001234.txt.gz'.
+
+        :param file_path: The path of the output file
+        :param buffer_size: The number of bytes that are collected in memory before they are written to the file
+        :param compression: 'gzip', 'zstd' (which requires the zstandard package) or None for an uncompressed file.
+        The extension of the compression is added to the file name.
+        :param rotate_per_diff: If True, every diff is written to its own file
+        :param max_file_size: If set, a new file is started after the diff during which the file exceeded this size
+        in bytes
+        """
+        if compression is not None and compression not in COMPRESSION_EXTENSIONS:
+            raise SparqlFileSinkException(f"Unknown compression \"{compression}\"")
+        if compression == 'zstd' and zstandard is None:
+            raise SparqlFileSinkException("The zstandard package is required for zstd compression")
+
+        self.file_path = file_path
+        self.buffer_size = buffer_size
+        self.compression = compression
+        self.rotate_per_diff = rotate_per_diff
+        self.max_file_size = max_file_size
+        self.sequence_number = None
+        self.file_paths = []
+        self.__file: Optional[BinaryIO] = None
+        self.__stream: Optional[BinaryIO] = None
+        self.__buffer: list[bytes] = []
+        self.__buffer_bytes = 0
+        self.__committed_size = 0
+
+    def start_diff(self, sequence_number: int) -> None:
+        """
+        Sets the sequence number of the diff whose updates are written next, which names the next rotated file.
+        """
+        self.sequence_number = sequence_number
+
+    def write(self, text: str) -> None:
+        """
+        Adds the passed text to the write buffer, and writes the buffer to the file if it is full.
+        """
+        if self.__file is None:
+            self.__open()
+
+        data = text.encode()
+        self.__buffer.append(data)
+        self.__buffer_bytes += len(data)
+        if self.__buffer_bytes >= self.buffer_size:
+            self.__write_buffer()
+
+    def end_diff(self) -> None:
+        """
+        Writes all buffered updates of the diff, syncs the file to disk and records its size as the end of the last
+        complete diff. Afterward the file is rotated if necessary.
+        """
+        if self.__file is None:
+            return
+
+        self.__end_stream()
+        self.__file.flush()
+        os.fsync(self.__file.fileno())
+        if self.__file.tell() != self.__committed_size:
+            self.__committed_size = self.__file.tell()
+            self.__write_committed_size(self.file_paths[-1], self.__committed_size)
+
+        if self.rotate_per_diff or (self.max_file_size is not None and self.__file.tell() >= self.max_file_size):
+            self.close()
+
+    def discard(self) -> None:
+        """
+        Drops the buffered updates and closes the current file without recording its size, so that the updates of an
+        incomplete diff are cut off when the file is continued.
+        """
+        self.__buffer = []
+        self.__buffer_bytes = 0
+        self.close()
+
+    def close(self) -> None:
+        """
+        Writes all buffered updates and closes the current file. A following write starts a new file. Updates after
+        the last end_diff() are not recorded as complete, so they are cut off when the file is continued.
+        """
+        if self.__file is None:
+            return
+
+        self.__end_stream()
+        self.__file.flush()
+        os.fsync(self.__file.fileno())
+        self.__file.close()
+        self.__file = None
+
+    def __open(self) -> None:
+        """
+        Continues the file after its last complete diff, or starts a new file, which begins with the prefixes.
+        """
+        file_path = self.__get_file_path()
+        committed_size = self.__read_committed_size(file_path)
+        if committed_size > 0 and os.path.exists(file_path) and os.path.getsize(file_path) >= committed_size:
+            self.__file = open(file_path, 'r+b')
+            self.__file.truncate(committed_size)
+            self.__file.seek(committed_size)
+            self.__buffer = []
+            self.__buffer_bytes = 0
+        else:
+            committed_size = 0
+            self.__file = open(file_path, 'wb')
+            self.__buffer = [PREFIXES.encode()]
+            self.__buffer_bytes = len(self.__buffer[0])
+
+        self.__committed_size = committed_size
+        if len(self.file_paths) == 0 or self.file_paths[-1] != file_path:
+            self.file_paths.append(file_path)
+
+    def __start_stream(self) -> None:
+        """
+        Starts the gzip member or zstd frame of a diff, into which the updates are written.
+        """
+        if self.compression == 'gzip':
+            self.__stream = gzip.GzipFile(fileobj=self.__file, mode='wb', compresslevel=6)
+        elif self.compression == 'zstd':
+            self.__stream = zstandard.ZstdCompressor().stream_writer(self.__file, closefd=False)
+        else:
+            self.__stream = self.__file
+
+    def __end_stream(self) -> None:
+        """
+        Writes the buffered updates and ends the gzip member or zstd frame, so that the file can be decompressed up
+        to this point and continued with a new member or frame.
+        """
+        self.__write_buffer()
+        if self.__stream is not None and self.__stream is not self.__file:
+            self.__stream.close()
+        self.__stream = None
+
+    def __read_committed_size(self, file_path: str) -> int:
+        """
+        :return: The recorded size of the passed file after its last complete diff, or 0 if none is recorded for it
+        """
+        try:
+            with open(self.file_path + COMMITTED_SIZE_EXTENSION) as file:
+                committed_size, committed_file_path = file.read().rstrip('\n').split(' ', 1)
+        except (FileNotFoundError, ValueError):
+            return 0
+        return int(committed_size) if committed_file_path == file_path else 0
+
+    def __write_committed_size(self, file_path: str, committed_size: int) -> None:
+        """
+        Records the size of the file after its last complete diff. The record is replaced atomically, so that it
+        is never incomplete.
+        """
+        record_path = self.file_path + COMMITTED_SIZE_EXTENSION
+        with open(record_path + '.tmp', 'w') as file:
+            file.write(f"{committed_size} {file_path}\n")
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(record_path + '.tmp', record_path)
+
+    def __get_file_path(self) -> str:
+        """
+        :return: The path of the next file, with the sequence number of the current diff if the files are rotated
+        """
+        file_path = self.file_path
+        if (self.rotate_per_diff or self.max_file_size is not None) and self.sequence_number is not None:
+            root, extension = os.path.splitext(file_path)
+            file_path = f"{root}.{self.sequence_number:09d}{extension}"
+
+        if self.compression is not None:
+            file_path += COMPRESSION_EXTENSIONS[self.compression]
+
+        return file_path
+
+    def __write_buffer(self) -> None:
+        if len(self.__buffer) == 0:
+            return
+
+        if self.__stream is None:
+            self.__start_stream()
+        self.__stream.write(b''.join(self.__buffer))
+        self.__buffer = []
+        self.__buffer_bytes = 0
+
+
+class SparqlFileSinkException(Exception):
+    pass
@@ -1,113 +1,194 @@
-from typing import Dict
+import csv
+import io
+import json
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
 
 import numpy as np
 import numpy.typing as npt
 
-from OsmLiveUpdates import OsmLiveUpdates
-import logging
-from xml.etree import ElementTree
+from OsmChangeReader import OsmChangeReader
+from ReplicationCache import ReplicationCache
+from ReplicationClient import ReplicationClient
+from Constants import STATISTICS_PERCENTILES, STATISTICS_HISTOGRAM_BINS
+
+# The counters of a diff are ordered by element type and then by action:
+# number_of_nodes_to_delete: index = 0
+# number_of_nodes_to_insert: index = 1
+# number_of_nodes_to_modify: index = 2
+#
+# number_of_ways_to_delete: index = 3
+# number_of_ways_to_insert: index = 4
+# number_of_ways_to_modify: index = 5
+#
+# number_of_relations_to_delete: index = 6
+# number_of_relations_to_insert: index = 7
+# number_of_relations_to_modify: index = 8
+ELEMENT_OFFSETS = {'node': 0, 'way': 3, 'relation': 6}
+ACTION_OFFSETS = {'delete': 0, 'create': 1, 'modify': 2}
+COUNTER_NAMES = [f"{element}s_{action}" for element in ('node', 'way', 'relation')
+                 for action in ('deleted', 'created', 'modified')]
+
+DIFF_STATISTICS_DTYPE = np.dtype([
+    ('sequence_number', np.int64),
+    ('timestamp', 'datetime64[s]'),
+    ('counters', np.int64, (9,)),
+])
+
+replication_client: Optional[ReplicationClient] = None
+
+
+def init_worker(replication_cache_path: Optional[str]) -> None:
+    """
+    Creates the replication client of a worker process.
+    :param replication_cache_path: The directory of the replication cache, if one is used
+    """
+    global replication_client
+    replication_cache = ReplicationCache(replication_cache_path) if replication_cache_path is not None else None
+    replication_client = ReplicationClient(replication_cache=replication_cache)
+
+
+def count_changes_for_sequence_number(sequence_number: int) -> Optional[tuple[int, np.datetime64, list[int]]]:
+    """
+    Fetches the diff for the sequence number and counts its changes by element type and action. Runs in a worker
+    process.
+    :param sequence_number: The sequence number of the diff
+    :return: The sequence number, the timestamp and the counters of the diff, or None if the diff does not exist
+    """
+    diff = replication_client.fetch_diff_if_state_exists(sequence_number)
+    if diff is None:
+        logging.warning(f"Diff with sequence number {sequence_number} does not exist")
+        return None
+
+    data, timestamp = diff
+    counters = [0] * 9
+    for action, element in OsmChangeReader(io.BytesIO(data)):
+        if element.type in ELEMENT_OFFSETS and action in ACTION_OFFSETS:
+            counters[ELEMENT_OFFSETS[element.type] + ACTION_OFFSETS[action]] += 1
+
+    return sequence_number, np.datetime64(timestamp.replace(tzinfo=None), 's'), counters
 
 
 class Statistics:
-    olu: OsmLiveUpdates
-
-    def __init__(self, osm2rdf_path: str, osm2rdf_image_name: str, sparql_endpoint: str):
-        self.olu = OsmLiveUpdates(osm2rdf_path, osm2rdf_image_name, sparql_endpoint)
-
-    def mean_number_of_changes_per_diff(self, number_of_diffs_to_check: int = 10):
-        changes_per_diff = {}
-
-        latest_sequence_id = self.olu.fetch_latest_sequence_number() - 1000
-        for i in range(number_of_diffs_to_check):
-            # number_of_nodes_to_delete: index = 0
-            # number_of_nodes_to_insert: index = 1
-            # number_of_nodes_to_modify: index = 2
-            #
-            # number_of_ways_to_delete: index = 3
-            # number_of_ways_to_insert: index = 4
-            # number_of_ways_to_modify: index = 5
-            #
-            # number_of_relations_to_delete: index = 6
-            # number_of_relations_to_insert: index = 7
-            # number_of_relations_to_modify: index = 8
-            counters: np.ndarray = np.zeros(9)
-
-            seq_number = latest_sequence_id - i
-            num_of_sequences_to_analyze = number_of_diffs_to_check - (latest_sequence_id - seq_number)
-            logging.info(f"Analyze diff with sequence number {seq_number}, {num_of_sequences_to_analyze} more to go")
-            diff_data: bytes = self.olu.fetch_diff_for_sequence_number(seq_number)
-            root: ElementTree = ElementTree.fromstring(diff_data)
-            for element in root:
-                if element.tag == 'delete':
-                    for child_element in element:
-                        if child_element.tag == "way":
-                            counters[3] += 1
-                        elif child_element.tag == "relation":
-                            counters[6] += 1
-                        elif child_element.tag == "node":
-                            counters[0] += 1
-                elif element.tag == 'create':
-                    for child_element in element:
-                        if child_element.tag == "way":
-                            counters[4] += 1
-                        elif child_element.tag == "relation":
-                            counters[7] += 1
-                        elif child_element.tag == "node":
-                            counters[1] += 1
-                elif element.tag == 'modify':
-                    for child_element in element:
-                        if child_element.tag == "way":
-                            counters[5] += 1
-                        elif child_element.tag == "relation":
-                            counters[8] += 1
-                        elif child_element.tag == "node":
-                            counters[2] += 1
-
-            changes_per_diff[seq_number] = counters
-
-        print(
-            f"""
-{number_of_diffs_to_check} diffs where analyzed.
-
-A diff contained in mean {self.get_mean_number_of_changes(changes_per_diff)} changes.
-
-{self.get_mean_number_of(changes_per_diff, 1, 4, 7)} of this changes where insertion of elements
-{self.get_mean_number_of(changes_per_diff, 0, 3, 6)} of this changes where deletion of elements
-{self.get_mean_number_of(changes_per_diff, 2, 5, 8)} of this changes where modifying of elements
-
-{self.get_mean_number_of(changes_per_diff, 0, 1, 2)} of this changes where for nodes
-{self.get_mean_number_of(changes_per_diff, 3, 4, 5)} of this changes where for ways
-{self.get_mean_number_of(changes_per_diff, 6, 7, 8)} of this changes where relations
-            """
-        )
+    replication_cache_path: Optional[str]
+    number_of_processes: Optional[int]
+    diffs: npt.NDArray
+
+    def __init__(self, replication_cache_path: Optional[str] = None, number_of_processes: Optional[int] = None):
+        """
+        Analyzes the number of changes in the diffs on the osm server. The diffs are fetched and counted in parallel
+        by a pool of processes and stored in a structured array with one row per diff.
+
+        :param replication_cache_path: The directory of the replication cache, so that diffs are only fetched once
+        :param number_of_processes: The number of worker processes, defaults to the number of cpus
+        """
+        self.replication_cache_path = replication_cache_path
+        self.number_of_processes = number_of_processes
+        self.diffs = np.zeros(0, dtype=DIFF_STATISTICS_DTYPE)
+
+    def analyze(self, number_of_diffs_to_check: int = 10, offset: int = 1000) -> npt.NDArray:
+        """
+        Counts the changes of the diffs before the latest diff.
+        :param number_of_diffs_to_check: The number of diffs to analyze
+        :param offset: The number of the most recent diffs that are skipped
+        :return: The structured array with the sequence number, timestamp and counters of each analyzed diff
+        """
+        init_worker(self.replication_cache_path)
+        latest_sequence_id = replication_client.fetch_latest_state()[0] - offset
+        sequence_numbers = range(latest_sequence_id - number_of_diffs_to_check + 1, latest_sequence_id + 1)
+
+        logging.info(f"Analyze {number_of_diffs_to_check} diffs up to sequence number {latest_sequence_id}")
+        with ProcessPoolExecutor(max_workers=self.number_of_processes, initializer=init_worker,
+                                 initargs=(self.replication_cache_path,)) as executor:
+            results = executor.map(count_changes_for_sequence_number, sequence_numbers, chunksize=8)
+            self.diffs = np.array([result for result in results if result is not None], dtype=DIFF_STATISTICS_DTYPE)
+
+        return self.diffs
+
+    def get_summary(self) -> dict:
+        """
+        Summarizes the analyzed diffs.
+        :return: The means, percentiles and histogram of the number of changes per diff and the changes per hour
+        """
+        counters = self.diffs['counters']
+        changes = counters.sum(axis=1)
+        histogram, bin_edges = np.histogram(changes, bins=STATISTICS_HISTOGRAM_BINS)
+        percentiles = np.percentile(changes, STATISTICS_PERCENTILES) if len(changes) > 0 \
+            else np.zeros(len(STATISTICS_PERCENTILES))
+
+        # Sum up the changes of all diffs within the same hour
+        hours, hour_indices = np.unique(self.diffs['timestamp'].astype('datetime64[h]'), return_inverse=True)
+        changes_per_hour = np.bincount(hour_indices, weights=changes, minlength=len(hours))
+
+        return {
+            'number_of_diffs': int(len(self.diffs)),
+            'mean_number_of_changes': self.get_mean_number_of_changes(counters),
+            'mean_number_of_insertions': self.get_mean_number_of(counters, 1, 4, 7),
+            'mean_number_of_deletions': self.get_mean_number_of(counters, 0, 3, 6),
+            'mean_number_of_modifications': self.get_mean_number_of(counters, 2, 5, 8),
+            'mean_number_of_node_changes': self.get_mean_number_of(counters, 0, 1, 2),
+            'mean_number_of_way_changes': self.get_mean_number_of(counters, 3, 4, 5),
+            'mean_number_of_relation_changes': self.get_mean_number_of(counters, 6, 7, 8),
+            'mean_per_counter': dict(zip(COUNTER_NAMES, self.__mean(counters).tolist())),
+            'percentiles_of_changes': dict(zip(map(str, STATISTICS_PERCENTILES), percentiles.tolist())),
+            'histogram_of_changes': {
+                'bin_edges': bin_edges.tolist(),
+                'counts': histogram.tolist(),
+            },
+            'changes_per_hour': {str(hour): float(value) for hour, value in zip(hours, changes_per_hour)},
+        }
+
+    def export_csv(self, file_path: str) -> None:
+        """
+        Writes the sequence number, timestamp and counters of each analyzed diff to a CSV file.
+        :param file_path: The path of the CSV file
+        """
+        with open(file_path, 'w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(['sequence_number', 'timestamp'] + COUNTER_NAMES)
+            for sequence_number, timestamp, counters in zip(
+                    self.diffs['sequence_number'].tolist(), self.diffs['timestamp'], self.diffs['counters'].tolist()):
+                writer.writerow([sequence_number, str(timestamp)] + counters)
+
+    def export_json(self, file_path: str) -> None:
+        """
+        Writes the summary of the analyzed diffs to a JSON file.
+        :param file_path: The path of the JSON file
+        """
+        with open(file_path, 'w') as file:
+            json.dump(self.get_summary(), file, indent=2)
+
+    @staticmethod
+    def __mean(counters: npt.NDArray) -> npt.NDArray:
+        if len(counters) == 0:
+            return np.zeros(counters.shape[1:])
+
+        return counters.mean(axis=0)
 
     @staticmethod
-    def get_mean_number_of_changes(counters) -> float:
-        total_number_of_changes: int = 0
-        for seq_num in counters:
-            total_number_of_changes += np.sum(counters[seq_num])
+    def get_mean_number_of_changes(counters: npt.NDArray) -> float:
+        if len(counters) == 0:
+            return 0
 
-        return total_number_of_changes / len(counters)
+        return float(counters.sum(axis=1).mean())
 
     @staticmethod
-    def get_mean_number_of(counters, idx1: int, idx2: int, idx3: int) -> float:
-        total_number_of_insertions: int = 0
-        for seq_num in counters:
-            total_number_of_insertions += counters[seq_num][idx1]
-            total_number_of_insertions += counters[seq_num][idx2]
-            total_number_of_insertions += counters[seq_num][idx3]
+    def get_mean_number_of(counters: npt.NDArray, idx1: int, idx2: int, idx3: int) -> float:
+        if len(counters) == 0:
+            return 0
 
-        return total_number_of_insertions / len(counters)
+        return float(counters[:, [idx1, idx2, idx3]].sum(axis=1).mean())
 
 
 def main() -> None:
     logging.getLogger().setLevel(logging.INFO)
-    sparql_endpoint = "http://Nicolass-MBP.fritz.box:7200/repositories/osm-test/statements"
-    osm2rdf_path = "/Users/nicolasvontrott/Documents/Masterproject/osm2rdf/osm2rdf"
-    osm2rdf_image_name = "nicolano/osm2rdf"
+    replication_cache_path = "replication_cache"
 
-    statistics = Statistics(osm2rdf_path, osm2rdf_image_name, sparql_endpoint)
-    statistics.mean_number_of_changes_per_diff(1000)
+    statistics = Statistics(replication_cache_path)
+    statistics.analyze(1000)
+    statistics.export_csv("statistics.csv")
+    statistics.export_json("statistics.json")
 
 
 if __name__ == '__main__':
@@ -0,0 +1,131 @@
+import gzip
+import random
+from datetime import datetime, timedelta, timezone
+from xml.etree import ElementTree
+
+ACTIONS = ('create', 'modify', 'delete')
+ELEMENT_TYPES = ('node', 'way', 'relation')
+
+
+class SyntheticDiffGenerator:
+    number_of_changes: int
+    element_mix: tuple[float, float, float]
+    action_mix: tuple[float, float, float]
+    nodes_per_way: int
+    members_per_relation: int
+    tags_per_element: int
+    number_of_existing_elements: int
+    seed: int
+    start_timestamp: datetime
+
+    def __init__(
+            self,
+            number_of_changes: int = 1000,
+            element_mix: tuple[float, float, float] = (0.8, 0.15, 0.05),
+            action_mix: tuple[float, float, float] = (0.4, 0.45, 0.15),
+            nodes_per_way: int = 10,
+            members_per_relation: int = 5,
+            tags_per_element: int = 2,
+            number_of_existing_elements: int = 1_000_000,
+            seed: int = 0,
+            start_timestamp: datetime = datetime(2024, 1, 1, tzinfo=timezone.utc)) -> None:
+        """
+        Generates reproducible osmChange diffs with a configurable mix of elements and actions, as a replacement for
+        the diffs of the osm server in benchmarks. Modified and deleted elements, as well as the nodes referenced by
+        ways and the members of relations, are taken from the elements that already exist before the first diff.
+        Their content is derived from their id, so that the node api can be served for any existing node with
+        get_node().
+
+        :param number_of_changes: The number of changes in each diff
+        :param element_mix: The share of nodes, ways and relations in the changes
+        :param action_mix: The share of created, modified and deleted elements in the changes
+        :param nodes_per_way: The number of node references of each way
+        :param members_per_relation: The number of members of each relation
+        :param tags_per_element: The number of tags of each created or modified element
+        :param number_of_existing_elements: The number of elements of each type that exist before the first diff
+        :param seed: The seed of the random generator, the same seed and sequence number always produce the same diff
+        :param start_timestamp: The timestamp of the diff with sequence number 0, every diff is one minute later
+        """
+        self.number_of_changes = number_of_changes
+        self.element_mix = element_mix
+        self.action_mix = action_mix
+        self.nodes_per_way = nodes_per_way
+        self.members_per_relation = members_per_relation
+        self.tags_per_element = tags_per_element
+        self.number_of_existing_elements = number_of_existing_elements
+        self.seed = seed
+        self.start_timestamp = start_timestamp
+
+    def generate(self, sequence_number: int) -> bytes:
+        """
+        Generates the diff for the passed sequence number.
+        :param sequence_number: The sequence number of the diff
+        :return: The gzip compressed osmChange document, like the diffs on the osm server
+        """
+        rng = random.Random(f"{self.seed}-{sequence_number}")
+        root = ElementTree.Element('osmChange', version='0.6', generator='SyntheticDiffGenerator')
+        timestamp = self.get_timestamp(sequence_number).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+        # Created elements get ids above the existing elements, which are unique across all diffs
+        next_created_id = self.number_of_existing_elements + sequence_number * self.number_of_changes + 1
+        for element_type, action in zip(rng.choices(ELEMENT_TYPES, self.element_mix, k=self.number_of_changes),
+                                        rng.choices(ACTIONS, self.action_mix, k=self.number_of_changes)):
+            if action == 'create':
+                identifier = next_created_id
+                next_created_id += 1
+            else:
+                identifier = rng.randint(1, self.number_of_existing_elements)
+
+            action_element = ElementTree.SubElement(root, action)
+            element = ElementTree.SubElement(action_element, element_type, id=str(identifier),
+                                             version='1' if action == 'create' else str(rng.randint(2, 20)),
+                                             timestamp=timestamp, changeset=str(sequence_number))
+            if action == 'delete':
+                element.set('visible', 'false')
+                continue
+
+            if element_type == 'node':
+                lat, lon = self.get_location(identifier)
+                element.set('lat', lat)
+                element.set('lon', lon)
+            elif element_type == 'way':
+                first_node = rng.randint(1, max(1, self.number_of_existing_elements - self.nodes_per_way))
+                for node_id in range(first_node, first_node + self.nodes_per_way):
+                    ElementTree.SubElement(element, 'nd', ref=str(node_id))
+            else:
+                for _ in range(self.members_per_relation):
+                    member_type = rng.choice(ELEMENT_TYPES[:2])
+                    ElementTree.SubElement(element, 'member', type=member_type,
+                                           ref=str(rng.randint(1, self.number_of_existing_elements)), role='outer')
+
+            for tag_number in range(self.tags_per_element):
+                ElementTree.SubElement(element, 'tag', k=f"key{tag_number}", v=f"value {rng.randint(0, 999)}")
+
+        return gzip.compress(ElementTree.tostring(root, encoding='UTF-8'), compresslevel=1)
+
+    def get_timestamp(self, sequence_number: int) -> datetime:
+        """
+        :param sequence_number: The sequence number of the diff
+        :return: The timestamp of the diff
+        """
+        return self.start_timestamp + timedelta(minutes=sequence_number)
+
+    def get_node(self, node_id: int) -> bytes:
+        """
+        Returns an existing node like the node api of the osm server does.
+        :param node_id: The id of the node
+        :return: The node element
+        """
+        lat, lon = self.get_location(node_id)
+        return f'<node id="{node_id}" visible="true" version="1" lat="{lat}" lon="{lon}"/>'.encode()
+
+    @staticmethod
+    def get_location(node_id: int) -> tuple[str, str]:
+        """
+        Derives the location of a node from its id, so that the same node always has the same location.
+        :param node_id: The id of the node
+        :return: The latitude and longitude of the node
+        """
+        lat = (node_id * 7919) % 1_800_000 / 10_000 - 90
+        lon = (node_id * 104729) % 3_600_000 / 10_000 - 180
+        return f"{lat:.7f}", f"{lon:.7f}"
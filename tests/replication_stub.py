@@ -0,0 +1,84 @@
+import gzip
+import re
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from Constants import REPLICATION_GRANULARITIES
+from HttpClient import HttpException, HttpNotFoundException
+
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+EMPTY_OSM_CHANGE = '<osmChange version="0.6"></osmChange>'
+
+
+class ReplicationStub:
+    latest_minute_sequence_number: int
+    minute_delay: int
+    diffs: dict[tuple[str, int], str]
+    missing_states: set[tuple[str, int]]
+    failures: dict[str, int]
+    requests: Counter
+
+    def __init__(self, latest_minute_sequence_number: int, minute_delay: int = 0) -> None:
+        """
+        Stand-in for the HttpClient, which serves the state files and diffs of the replication streams from memory.
+        Each stream starts at sequence number 1 at START, and the diffs that were not added are empty. All other
+        requests fail with HttpNotFoundException, and the requests in failures with HttpException, like a request
+        whose retries were used up.
+        :param latest_minute_sequence_number: The sequence number of the latest minute diff, from whose timestamp the
+        latest hour and day diffs follow
+        :param minute_delay: The number of seconds by which the timestamps of the minute diffs are after full minutes
+        """
+        self.latest_minute_sequence_number = latest_minute_sequence_number
+        self.minute_delay = minute_delay
+        self.diffs = {}
+        self.missing_states = set()
+        self.failures = {}
+        self.requests = Counter()
+
+    def add_diff(self, sequence_number: int, osm_change: str, granularity: str = 'minute') -> None:
+        self.diffs[(granularity, sequence_number)] = osm_change
+
+    def get_timestamp(self, granularity: str, sequence_number: int) -> datetime:
+        if granularity == 'minute':
+            return START + timedelta(minutes=sequence_number, seconds=self.minute_delay)
+        return START + timedelta(seconds=sequence_number * REPLICATION_GRANULARITIES[granularity])
+
+    def get_latest_sequence_number(self, granularity: str) -> int:
+        if granularity == 'minute':
+            return self.latest_minute_sequence_number
+        latest_timestamp = self.get_timestamp('minute', self.latest_minute_sequence_number)
+        return int((latest_timestamp - START).total_seconds()) // REPLICATION_GRANULARITIES[granularity]
+
+    def get(self, url: str) -> bytes:
+        for url_part, number_of_failures in self.failures.items():
+            if url_part in url and number_of_failures > 0:
+                self.failures[url_part] -= 1
+                raise HttpException(f"Request to {url} failed")
+
+        match = re.search(r'/(minute|hour|day)/(?:state\.txt|(\d{3})/(\d{3})/(\d{3})\.(state\.txt|osc\.gz))$', url)
+        if match is None:
+            raise HttpNotFoundException(f"{url} does not exist")
+
+        granularity = match.group(1)
+        self.requests[granularity] += 1
+        sequence_number: Optional[int] = None
+        if match.group(2) is not None:
+            sequence_number = int(match.group(2) + match.group(3) + match.group(4))
+        if sequence_number is None:
+            sequence_number = self.get_latest_sequence_number(granularity)
+        elif (not 1 <= sequence_number <= self.get_latest_sequence_number(granularity)
+              or (granularity, sequence_number) in self.missing_states):
+            raise HttpNotFoundException(f"{url} does not exist")
+
+        if match.group(5) == 'osc.gz':
+            return gzip.compress(self.diffs.get((granularity, sequence_number), EMPTY_OSM_CHANGE).encode())
+
+        timestamp = self.get_timestamp(granularity, sequence_number).strftime('%Y-%m-%dT%H\\:%M\\:%SZ')
+        return f"sequenceNumber={sequence_number}\ntimestamp={timestamp}\n".encode()
+
+    def get_latency_histograms(self) -> dict[str, dict[str, int]]:
+        return {}
+
+    def close(self) -> None:
+        pass
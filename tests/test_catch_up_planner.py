@@ -0,0 +1,46 @@
+import unittest
+from datetime import timedelta
+
+from CatchUpPlanner import CatchUpPlanner
+from ReplicationClient import ReplicationClient
+from replication_stub import ReplicationStub, START
+
+
+class CatchUpPlannerTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        # The latest minute diff is 10 days and 5 hours after the start of the streams
+        self.replication = ReplicationStub(10 * 24 * 60 + 5 * 60, minute_delay=2)
+        self.planner = CatchUpPlanner(ReplicationClient(self.replication))
+
+    def test_find_sequence_number_returns_the_last_diff_before_the_timestamp(self) -> None:
+        for granularity in ('minute', 'hour', 'day'):
+            latest_sequence_number = self.replication.get_latest_sequence_number(granularity)
+            for timestamp in (START + timedelta(hours=30, minutes=7), START + timedelta(days=8, seconds=1),
+                              self.replication.get_timestamp(granularity, 5)):
+                sequence_number = self.planner.find_sequence_number(granularity, timestamp)
+                self.assertLessEqual(self.replication.get_timestamp(granularity, sequence_number), timestamp)
+                self.assertLess(sequence_number, latest_sequence_number)
+                self.assertGreater(self.replication.get_timestamp(granularity, sequence_number + 1), timestamp)
+
+            latest_timestamp = self.replication.get_timestamp('minute', self.replication.latest_minute_sequence_number)
+            self.assertEqual(self.planner.find_sequence_number(granularity, latest_timestamp + timedelta(hours=1)),
+                             latest_sequence_number)
+
+    def test_find_sequence_number_skips_a_missing_state(self) -> None:
+        self.replication.missing_states.add(('hour', 31))
+
+        self.assertEqual(self.planner.find_sequence_number('hour', START + timedelta(hours=32, minutes=10)), 32)
+
+    def test_plan_starts_with_the_diff_after_the_one_that_contains_the_timestamp(self) -> None:
+        steps = self.planner.plan(START + timedelta(days=6, hours=23, minutes=30))
+
+        # The day diffs up to day 10 are followed by the hour diffs of the remaining 5 hours
+        self.assertEqual(steps, [('day', 7, 10), ('hour', 241, 245)])
+
+    def test_plan_uses_hour_diffs_from_a_lag_of_three_hours(self) -> None:
+        latest_timestamp = self.replication.get_timestamp('minute', self.replication.latest_minute_sequence_number)
+
+        self.assertEqual(self.planner.plan(latest_timestamp - timedelta(hours=3)), [('hour', 243, 245)])
+        self.assertEqual(self.planner.plan(latest_timestamp - timedelta(hours=3) + timedelta(seconds=1)), [])
+        self.assertEqual(self.planner.plan(latest_timestamp - timedelta(days=2)), [('day', 9, 10), ('hour', 241, 245)])
@@ -0,0 +1,34 @@
+import unittest
+
+from ChangeConsolidator import ChangeConsolidator
+from ChangeRecord import ChangeRecord
+
+
+class ChangeConsolidatorTest(unittest.TestCase):
+
+    @staticmethod
+    def get_keys(consolidator: ChangeConsolidator) -> list[tuple[str, str, str]]:
+        return [(action, element.type, element.id) for action, element in consolidator.get_changes()]
+
+    def test_changed_node_stays_before_the_way_that_references_it(self) -> None:
+        consolidator = ChangeConsolidator()
+        consolidator.add_changes([('create', ChangeRecord('create', 'node', '1', lat='48.0', lon='7.8')),
+                                  ('create', ChangeRecord('create', 'way', '10', node_refs=['1']))])
+        consolidator.add_changes([('modify', ChangeRecord('modify', 'node', '1', lat='48.1', lon='7.8'))])
+
+        self.assertEqual(self.get_keys(consolidator), [('create', 'node', '1'), ('create', 'way', '10')])
+        self.assertEqual(consolidator.get_changes()[0][1].lat, '48.1')
+
+    def test_net_changes_are_grouped_by_type(self) -> None:
+        consolidator = ChangeConsolidator()
+        consolidator.add_changes([('modify', ChangeRecord('modify', 'relation', '100')),
+                                  ('modify', ChangeRecord('modify', 'way', '10')),
+                                  ('create', ChangeRecord('create', 'node', '2')),
+                                  ('modify', ChangeRecord('modify', 'node', '1'))])
+        consolidator.add_changes([('create', ChangeRecord('create', 'way', '11')),
+                                  ('delete', ChangeRecord('delete', 'node', '2')),
+                                  ('delete', ChangeRecord('delete', 'node', '1'))])
+
+        self.assertEqual(self.get_keys(consolidator), [('delete', 'node', '1'), ('modify', 'way', '10'),
+                                                       ('create', 'way', '11'), ('modify', 'relation', '100')])
+        self.assertEqual(consolidator.get_number_of_eliminated_changes(), 3)
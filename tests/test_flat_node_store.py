@@ -0,0 +1,95 @@
+import gzip
+import os
+import struct
+import tempfile
+import tracemalloc
+import unittest
+
+from Constants import FLAT_NODE_STORE_GROWTH
+from FlatNodeStore import FlatNodeStore, COORDINATE_OFFSET, COORDINATE_PRECISION
+
+
+class FlatNodeStoreTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self.directory.name, 'nodes.bin')
+        self.store = FlatNodeStore(self.file_path)
+
+    def tearDown(self) -> None:
+        self.store.close()
+        self.directory.cleanup()
+
+    def read_entry(self, node_id: int) -> tuple[int, int]:
+        self.store.flush()
+        with open(self.file_path, 'rb') as file:
+            file.seek(node_id * 8)
+            return struct.unpack('=II', file.read(8))
+
+    def write_extract(self, file_name: str, number_of_nodes: int) -> str:
+        extract_path = os.path.join(self.directory.name, file_name)
+        opener = gzip.open if file_name.endswith('.gz') else open
+        with opener(extract_path, 'wt') as file:
+            file.write('<?xml version="1.0" encoding="UTF-8"?>\n<osm version="0.6">\n'
+                       '<bounds minlat="-90" minlon="-180" maxlat="90" maxlon="180"/>\n')
+            for node_id in range(1, number_of_nodes + 1):
+                file.write(f'<node id="{node_id}" version="1" lat="{node_id / 1000:.7f}" lon="-{node_id / 500:.7f}">'
+                           f'<tag k="name" v="node {node_id}"/></node>\n')
+            file.write('<way id="1" version="1"><nd ref="1"/><nd ref="2"/><tag k="highway" v="path"/></way>\n'
+                       '<relation id="1" version="1"><member type="node" ref="1" role=""/></relation>\n</osm>\n')
+        return extract_path
+
+    def test_locations_are_stored_as_offset_fixed_point_numbers(self) -> None:
+        locations = {1: ('0', '0'), 2: ('90', '180'), 3: ('-90', '-180'), 4: ('-33.8688197', '151.2092955'),
+                     5: ('52.5', '-0.0000001')}
+        for node_id, (lat, lon) in locations.items():
+            self.store.set(node_id, lat, lon)
+
+        for node_id, (lat, lon) in locations.items():
+            self.assertEqual(self.read_entry(node_id), (round(float(lat) * COORDINATE_PRECISION) + COORDINATE_OFFSET,
+                                                        round(float(lon) * COORDINATE_PRECISION) + COORDINATE_OFFSET))
+            self.assertEqual(self.store.get(node_id), (f"{float(lat):.7f}", f"{float(lon):.7f}"))
+
+        self.assertEqual(self.read_entry(1), (2 ** 31, 2 ** 31))
+        self.assertEqual(self.read_entry(3), (2 ** 31 - 900_000_000, 2 ** 31 - 1_800_000_000))
+        self.assertEqual(self.store.get_node('4'), b'<node id="4" lat="-33.8688197" lon="151.2092955"/>')
+
+    def test_unknown_and_deleted_nodes_have_no_location(self) -> None:
+        self.store.set(7, '48.0', '7.8')
+        self.store.delete(7)
+        self.store.delete(10 * FLAT_NODE_STORE_GROWTH)
+
+        self.assertIsNone(self.store.get(6))
+        self.assertIsNone(self.store.get(7))
+        self.assertIsNone(self.store.get(10 * FLAT_NODE_STORE_GROWTH))
+        self.assertEqual(self.read_entry(7), (0, 0))
+
+    def test_store_grows_and_keeps_its_locations_after_reopening(self) -> None:
+        node_id = FLAT_NODE_STORE_GROWTH + 5
+        self.store.set(node_id, '-12.3456789', '98.7654321')
+        self.assertEqual(self.store.capacity, 2 * FLAT_NODE_STORE_GROWTH)
+        self.store.close()
+
+        self.store = FlatNodeStore(self.file_path)
+        self.assertEqual(self.store.get(node_id), ('-12.3456789', '98.7654321'))
+
+    def test_seed_reads_the_nodes_of_an_extract(self) -> None:
+        for file_name in ('extract.osm', 'extract.osm.gz'):
+            self.assertEqual(self.store.seed(self.write_extract(file_name, 100)), 100)
+
+        self.assertEqual(self.store.get(1), ('0.0010000', '-0.0020000'))
+        self.assertEqual(self.store.get(100), ('0.1000000', '-0.2000000'))
+        self.assertIsNone(self.store.get(101))
+
+    def test_seed_does_not_keep_the_read_elements(self) -> None:
+        extract_path = self.write_extract('extract.osm', 100_000)
+
+        tracemalloc.start()
+        try:
+            self.assertEqual(self.store.seed(extract_path), 100_000)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        # Keeping the cleared elements below the root would take about 80 bytes for each node
+        self.assertLess(peak, 2 * 1024 ** 2)
@@ -0,0 +1,68 @@
+import socket
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from HttpClient import HttpClient, HttpException
+
+
+class FailingHandler(BaseHTTPRequestHandler):
+    """
+    Answers every request with a server error and counts the requests per method.
+    """
+
+    def handle_request(self) -> None:
+        self.server.requests[self.command] = self.server.requests.get(self.command, 0) + 1
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.send_response(self.server.status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    do_GET = handle_request
+    do_POST = handle_request
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+
+class HttpClientTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), FailingHandler)
+        self.server.requests = {}
+        self.server.status = 500
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/data"
+        self.client = HttpClient(max_retries=2, backoff_base=0)
+
+    def tearDown(self) -> None:
+        self.client.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_get_is_retried_after_a_server_error(self) -> None:
+        with self.assertRaises(HttpException):
+            self.client.get(self.url)
+        self.assertEqual(self.server.requests, {'GET': 3})
+
+    def test_post_is_not_retried_after_a_server_error(self) -> None:
+        with self.assertRaises(HttpException):
+            self.client.request('POST', self.url, b'<a> <b> <c> .')
+        self.assertEqual(self.server.requests, {'POST': 1})
+
+    def test_post_is_retried_after_rate_limiting_or_if_allowed(self) -> None:
+        self.server.status = 429
+        with self.assertRaises(HttpException):
+            self.client.request('POST', self.url, b'<a> <b> <c> .')
+        self.server.status = 503
+        with self.assertRaises(HttpException):
+            self.client.request('POST', self.url, b'<a> <b> <c> .', idempotent=True)
+        self.assertEqual(self.server.requests, {'POST': 6})
+
+    def test_post_is_retried_if_the_connection_fails(self) -> None:
+        with socket.socket() as unused_socket:
+            unused_socket.bind(('127.0.0.1', 0))
+            port = unused_socket.getsockname()[1]
+
+        with self.assertRaisesRegex(HttpException, 'after 3 attempts'):
+            self.client.request('POST', f"http://127.0.0.1:{port}/data", b'<a> <b> <c> .')
@@ -0,0 +1,99 @@
+import os
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+from ChangeRecord import ChangeRecord
+from FlatNodeStore import FlatNodeStore
+from HttpClient import HttpClient
+from NodeResolver import NodeResolver
+
+
+class NodesHandler(BaseHTTPRequestHandler):
+    """
+    Serves the multi-fetch endpoint of the osm api for the nodes of the server, which fails with 404 like the osm
+    api if one of the requested nodes does not exist.
+    """
+
+    def do_GET(self) -> None:
+        node_ids = parse_qs(urlsplit(self.path).query)['nodes'][0].split(',')
+        self.server.requested_node_ids.append(node_ids)
+        if any(node_id not in self.server.nodes for node_id in node_ids):
+            status, body = 404, b''
+        else:
+            status = 200
+            body = b'<osm version="0.6">' + b''.join(
+                f'<node id="{node_id}" version="1" lat="{lat}" lon="{lon}"/>'.encode()
+                for node_id, (lat, lon) in ((node_id, self.server.nodes[node_id]) for node_id in node_ids)) + b'</osm>'
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+
+class NodeResolverTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), NodesHandler)
+        self.server.nodes = {str(node_id): ('48.0', f"7.{node_id}") for node_id in range(1, 17)}
+        self.server.requested_node_ids = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.directory = tempfile.TemporaryDirectory()
+        self.node_store = FlatNodeStore(os.path.join(self.directory.name, 'nodes.bin'))
+        self.http_client = HttpClient(max_retries=0)
+        self.resolver = NodeResolver(self.http_client, f"http://127.0.0.1:{self.server.server_address[1]}",
+                                     chunk_size=16, node_store=self.node_store)
+
+    def tearDown(self) -> None:
+        self.http_client.close()
+        self.node_store.close()
+        self.directory.cleanup()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_nodes_are_resolved_from_the_diff_cache_store_and_api_in_this_order(self) -> None:
+        self.resolver.add_diff_node(ChangeRecord('modify', 'node', '1', version='2', lat='50.0', lon='8.0'))
+        self.resolver.add_diff_node(ChangeRecord('modify', 'node', '2', version='2', lat='50.0', lon='8.1'))
+        self.resolver.clear_diff()
+        self.resolver.add_diff_node(ChangeRecord('modify', 'node', '1', version='3', lat='51.0', lon='9.0'))
+        # The store holds an older location of node 2 than the cache
+        self.node_store.set(2, '49.0', '8.2')
+        self.node_store.set(3, '49.0', '8.3')
+
+        nodes = self.resolver.resolve(['1', '2', '3', '4'])
+
+        self.assertEqual(nodes.count(b'<node '), 4)
+        self.assertIn(b'lat="51.0" lon="9.0"', nodes)
+        self.assertIn(b'lat="50.0" lon="8.1"', nodes)
+        self.assertIn(b'lat="49.0000000" lon="8.3000000"', nodes)
+        self.assertIn(b'lat="48.0" lon="7.4"', nodes)
+        self.assertEqual((self.resolver.diff_hits, self.resolver.cache_hits, self.resolver.store_hits,
+                          self.resolver.misses), (1, 1, 1, 1))
+        self.assertEqual(self.server.requested_node_ids, [['4']])
+
+    def test_failed_chunk_is_bisected_until_the_missing_node_is_found(self) -> None:
+        del self.server.nodes['11']
+
+        nodes = self.resolver.resolve([str(node_id) for node_id in range(1, 17)])
+
+        self.assertEqual(nodes.count(b'<node '), 15)
+        self.assertNotIn(b'id="11"', nodes)
+        # One request for the chunk and two for each of four halvings, instead of one per node
+        self.assertEqual(self.resolver.number_of_requests, 9)
+        self.assertIn(['11'], self.server.requested_node_ids)
+
+    def test_updated_node_replaces_its_cached_version(self) -> None:
+        self.resolver.add_diff_node(ChangeRecord('create', 'node', '1', version='1', lat='50.0', lon='8.0'))
+        self.resolver.add_diff_node(ChangeRecord('create', 'node', '2', version='1', lat='50.0', lon='8.1'))
+        self.resolver.clear_diff()
+
+        self.resolver.update_node(ChangeRecord('modify', 'node', '1', version='2', lat='60.0', lon='10.0'))
+        self.resolver.remove_node('2')
+
+        self.assertEqual(self.resolver.resolve(['1']), b'<node id="1" lat="60.0000000" lon="10.0000000"/>')
+        self.assertIsNone(self.resolver.get_known_node('2'))
@@ -0,0 +1,59 @@
+import subprocess
+import unittest
+from unittest import mock
+
+from ChangeRecord import ChangeRecord
+from Constants import TEMPORARY_TAG
+from Osm2RdfBackend import FakeOsm2RdfBackend, PersistentDockerBackend, Osm2RdfException
+from Osm2RdfConnector import Osm2RdfConnector
+
+NODES = (b'<node id="1" version="1" lat="48.0" lon="7.8"><tag k="amenity" v="bench"/></node>'
+         b'<node id="2" version="1" lat="48.1" lon="7.9"/>')
+WAY = b'<way id="10" version="1"><nd ref="1"/><nd ref="2"/><tag k="highway" v="path"/></way>'
+
+
+class Osm2RdfConnectorTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.connector = Osm2RdfConnector('', '', FakeOsm2RdfBackend(), workers=2)
+
+    def tearDown(self) -> None:
+        self.connector.close()
+
+    def test_convert_lines_drops_prefixes_and_temporary_tags(self) -> None:
+        node = ChangeRecord('create', 'node', '3', version='1', lat='48.2', lon='7.7')
+        lines = self.connector.convert_lines(node.to_xml(((TEMPORARY_TAG, TEMPORARY_TAG),)), ['osmnode:3'])
+
+        self.assertEqual(lines, ['osmnode:3 rdf:type osm:node .',
+                                 'osmnode:3 geo:hasGeometry osm2rdfgeom:osm_node_3 .',
+                                 'osm2rdfgeom:osm_node_3 geo:asWKT "POINT(7.7 48.2)"^^geo:wktLiteral .'])
+
+    def test_split_by_subject_assigns_blank_nodes_and_geometries_to_their_element(self) -> None:
+        lines = self.connector.convert_lines(NODES + WAY)
+        triples = Osm2RdfConnector.split_by_subject(lines, ['osmway:10', 'osmnode:1'])
+
+        way_subjects = {line.split(' ', 1)[0] for line in triples['osmway:10']}
+        self.assertEqual(len([subject for subject in way_subjects if subject.startswith('_:')]), 2)
+        self.assertIn('osm2rdfgeom:osm_way_10', way_subjects)
+        self.assertFalse(any(subject.startswith('osmnode:') for subject in way_subjects))
+        self.assertIn('osm2rdfgeom:osm_way_10 geo:asWKT "LINESTRING(7.8 48.0,7.9 48.1)"^^geo:wktLiteral .',
+                      triples['osmway:10'])
+        self.assertEqual({line.split(' ', 1)[0] for line in triples['osmnode:1']},
+                         {'osmnode:1', 'osm2rdfgeom:osm_node_1'})
+        self.assertEqual(len(triples['osmway:10']) + len(triples['osmnode:1']), len(lines))
+
+    def test_shards_are_converted_in_order(self) -> None:
+        shards = self.connector.convert_shards([NODES + WAY, NODES])
+
+        self.assertEqual(len(shards), 2)
+        self.assertIn('osmway:10 rdf:type osm:way .', shards[0])
+        self.assertEqual(shards[1], self.connector.convert_lines(NODES))
+
+
+class PersistentDockerBackendTest(unittest.TestCase):
+
+    def test_image_without_entrypoint_needs_the_binary(self) -> None:
+        inspect = subprocess.CompletedProcess([], 0, stdout='null\n', stderr='')
+        with mock.patch('Osm2RdfBackend.run', return_value=inspect):
+            with self.assertRaisesRegex(Osm2RdfException, 'has no entrypoint'):
+                PersistentDockerBackend('', 'osm2rdf').convert('<osm/>')
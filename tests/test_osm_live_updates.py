@@ -0,0 +1,122 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from Checkpoint import Checkpoint
+from ElementStateStore import ElementStateStore
+from Osm2RdfBackend import FakeOsm2RdfBackend
+from OsmLiveUpdates import OsmLiveUpdates
+from RegionFilter import RegionFilter
+from SparqlConnector import OutputFormat
+from SparqlFileSink import SparqlFileSink
+from replication_stub import ReplicationStub
+
+
+class StopFollowing(Exception):
+    pass
+
+
+class OsmLiveUpdatesTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self.directory.name, 'output.txt')
+        self.replication = ReplicationStub(100)
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def create_live_updates(self, **kwargs) -> OsmLiveUpdates:
+        kwargs.setdefault('sparql_file_sink', SparqlFileSink(self.file_path))
+        return OsmLiveUpdates('', '', '', OutputFormat.FILE, osm2rdf_backend=FakeOsm2RdfBackend(),
+                              http_client=self.replication, **kwargs)
+
+    def read_output(self) -> str:
+        with open(self.file_path) as file:
+            return file.read()
+
+    def test_stored_triples_of_a_way_exclude_its_tagged_nodes(self) -> None:
+        self.replication.latest_minute_sequence_number = 101
+        self.replication.add_diff(101, """<osmChange version="0.6"><create>
+            <node id="1" version="1" lat="48.0" lon="7.8"><tag k="amenity" v="bench"/></node>
+            <node id="2" version="1" lat="48.1" lon="7.9"/>
+            <way id="10" version="1"><nd ref="1"/><nd ref="2"/><tag k="highway" v="path"/></way>
+        </create></osmChange>""")
+        element_state_store = ElementStateStore(os.path.join(self.directory.name, 'state.sqlite'))
+        live_updates = self.create_live_updates(element_state_store=element_state_store)
+
+        self.assertEqual(live_updates.fetch_change(100), 101)
+        way_lines = element_state_store.get('osmway:10')
+        node_lines = element_state_store.get('osmnode:1')
+        live_updates.close()
+
+        self.assertIn('osmway:10 osmkey:highway "path" .', way_lines)
+        self.assertFalse(any(line.startswith('osmnode:') for line in way_lines))
+        self.assertIn('osmnode:1 osmkey:amenity "bench" .', node_lines)
+
+    def test_region_filter_keeps_a_way_whose_node_changed_again_in_a_consolidated_diff(self) -> None:
+        self.replication.latest_minute_sequence_number = 102
+        self.replication.add_diff(101, """<osmChange version="0.6"><create>
+            <node id="1" version="1" lat="48.0" lon="7.8"/>
+            <way id="10" version="1"><nd ref="1"/><tag k="highway" v="path"/></way>
+        </create></osmChange>""")
+        self.replication.add_diff(102, """<osmChange version="0.6"><modify>
+            <node id="1" version="2" lat="48.01" lon="7.81"/>
+        </modify></osmChange>""")
+        live_updates = self.create_live_updates(region_filter=RegionFilter(bbox=(7.5, 47.5, 8.5, 48.5)))
+
+        self.assertEqual(live_updates.fetch_change(100, consolidation_window=2), 102)
+        live_updates.close()
+
+        self.assertIn('osmway:10 osmkey:highway "path" .', self.read_output())
+        self.assertEqual(live_updates.regionFilter.number_of_skipped_changes, {'node': 0, 'way': 0, 'relation': 0})
+
+    def test_catch_up_saves_the_timestamp_of_the_minute_diff_it_continues_after(self) -> None:
+        self.replication = ReplicationStub(1000, minute_delay=2)
+        # The minute diffs after the catch-up are not published yet
+        self.replication.missing_states.add(('minute', 960))
+        checkpoint_file = os.path.join(self.directory.name, 'checkpoint.txt')
+        live_updates = self.create_live_updates()
+
+        self.assertEqual(live_updates.fetch_change(100, checkpoint_file=checkpoint_file, catch_up=True), 959)
+        live_updates.close()
+
+        checkpoint = Checkpoint(checkpoint_file)
+        self.assertEqual(checkpoint.load(), 959)
+        self.assertEqual(checkpoint.granularity, 'minute')
+        # The last hour diff ends at 16:00, and the minute diff before it at 15:59:02
+        self.assertEqual(checkpoint.timestamp, self.replication.get_timestamp('minute', 959))
+        self.assertEqual(live_updates.metrics.counters['catch_up.hour_diffs'], 15)
+
+    def test_follow_retries_from_the_checkpoint_after_an_error(self) -> None:
+        self.replication.latest_minute_sequence_number = 102
+        self.replication.add_diff(101, """<osmChange version="0.6"><create>
+            <node id="1" version="1" lat="48.0" lon="7.8"><tag k="amenity" v="bench"/></node>
+        </create></osmChange>""")
+        self.replication.add_diff(102, """<osmChange version="0.6"><create>
+            <node id="2" version="1" lat="48.1" lon="7.9"><tag k="amenity" v="bench"/></node>
+            <way id="20" version="1"><nd ref="2"/><nd ref="9"/><tag k="highway" v="path"/></way>
+        </create></osmChange>""")
+        # Fetching the node of the way fails once, after the node of the diff was written to the output file
+        self.replication.failures['/nodes?nodes=9'] = 1
+        checkpoint_file = os.path.join(self.directory.name, 'checkpoint.txt')
+        element_state_store = ElementStateStore(os.path.join(self.directory.name, 'state.sqlite'))
+        live_updates = self.create_live_updates(sparql_file_sink=SparqlFileSink(self.file_path, buffer_size=1),
+                                                element_state_store=element_state_store)
+        checkpoint = Checkpoint(checkpoint_file)
+
+        def sleep(seconds: float) -> None:
+            if checkpoint.load() == 102:
+                raise StopFollowing()
+
+        with mock.patch('OsmLiveUpdates.time.sleep', side_effect=sleep):
+            with self.assertRaises(StopFollowing):
+                live_updates.follow(checkpoint_file, from_sequence_number=100)
+        live_updates.close()
+
+        output = self.read_output()
+        self.assertEqual(live_updates.metrics.counters['follow.errors'], 1)
+        self.assertEqual(output.count('osmnode:1 osmkey:amenity'), 1)
+        self.assertEqual(output.count('osmnode:2 osmkey:amenity'), 1)
+        self.assertEqual(output.count('osmway:20 osmkey:highway'), 1)
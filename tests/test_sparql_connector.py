@@ -0,0 +1,119 @@
+import os
+import re
+import tempfile
+import unittest
+
+from BenchmarkServer import BenchmarkServer
+from Constants import PREFIXES
+from SparqlConnector import SparqlConnector, OutputFormat
+from SparqlFileSink import SparqlFileSink
+from SyntheticDiffGenerator import SyntheticDiffGenerator
+
+
+class SparqlConnectorTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self.directory.name, 'output.txt')
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def create_connector(self, **kwargs) -> SparqlConnector:
+        return SparqlConnector('', OutputFormat.FILE, file_sink=SparqlFileSink(self.file_path), **kwargs)
+
+    def read_operations(self, connector: SparqlConnector) -> list[str]:
+        connector.close()
+        with open(self.file_path) as file:
+            return [line for line in file.read().split('\n') if line.startswith(('DELETE', 'INSERT'))]
+
+    def test_full_delete_chunk_runs_before_pending_inserts(self) -> None:
+        connector = self.create_connector(max_batch_operations=100, delete_chunk_size=4)
+        connector.delete_subject('osmnode:1')
+        connector.insert_triples(['osmnode:1 osmkey:a "1" .'])
+        for node_id in range(2, 5):
+            connector.delete_subject(f'osmnode:{node_id}')
+
+        operations = self.read_operations(connector)
+        self.assertEqual(len(operations), 2)
+        self.assertTrue(operations[0].startswith('DELETE'))
+        self.assertIn('osmnode:1 osmnode:2 osmnode:3 osmnode:4', operations[0])
+        self.assertTrue(operations[1].startswith('INSERT DATA { osmnode:1 '))
+
+    def test_deletes_of_a_flush_run_before_its_inserts(self) -> None:
+        connector = self.create_connector(max_batch_operations=100, delete_chunk_size=4)
+        connector.delete_subject('osmnode:1')
+        connector.insert_triples(['osmnode:1 osmkey:a "1" .'])
+
+        operations = self.read_operations(connector)
+        self.assertEqual([operation.split()[0] for operation in operations], ['DELETE', 'INSERT'])
+
+    def test_deleted_subjects_count_towards_the_batch_size(self) -> None:
+        connector = self.create_connector(max_batch_operations=100, max_batch_bytes=300, delete_chunk_size=1000)
+        connector.insert_triples(['osmnode:0 osmkey:name "' + 'a' * 60 + '" .'])
+        subjects = [f'osmnode:{node_id}' for node_id in range(1, 41)]
+        for subject in subjects:
+            connector.delete_subject(subject)
+
+        operations = self.read_operations(connector)
+        deletes = [operation for operation in operations if operation.startswith('DELETE')]
+        self.assertEqual(sorted(subject for delete in deletes for subject in re.findall(r'osmnode:\d+', delete)),
+                         sorted(subjects))
+        self.assertTrue(all(len(delete.encode()) + 1 <= 300 for delete in deletes))
+        total_bytes = sum(len(operation.encode()) + 1 for operation in operations)
+        self.assertGreaterEqual(connector.metrics.counters['sparql.requests'], -(-total_bytes // 300))
+
+    def test_blank_nodes_of_inserts_in_one_request_are_kept_apart(self) -> None:
+        connector = self.create_connector(max_batch_operations=100)
+        connector.insert_triples(['osmway:1 osmway:node _:0 .', '_:0 osmway:node osmnode:1 .'])
+        connector.insert_triples(['osmway:2 osmway:node _:0 .', '_:0 osmkey:note "_:0 stays" .'])
+
+        operations = self.read_operations(connector)
+        labels = [re.findall(r'(?<!")_:\w+', operation) for operation in operations]
+        self.assertEqual(len(set(labels[0])), 1)
+        self.assertEqual(len(set(labels[1])), 1)
+        self.assertNotEqual(labels[0][0], labels[1][0])
+        self.assertIn('"_:0 stays"', operations[1])
+
+
+class GraphStoreTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.server = BenchmarkServer(SyntheticDiffGenerator(1), 1, 1, record_graph_store_documents=True)
+        self.server.start()
+        self.connector = SparqlConnector(self.server.get_sparql_url(), OutputFormat.GRAPH_STORE,
+                                         max_batch_operations=100, graph_store_url=self.server.get_graph_store_url())
+
+    def tearDown(self) -> None:
+        self.connector.close()
+        self.server.stop()
+
+    def read_posted_triples(self) -> list[str]:
+        self.connector.flush()
+        self.assertEqual(len(self.server.graph_store_documents), 1)
+        lines = self.server.graph_store_documents[0].decode().split('\n')
+        prefixes = {line.split()[1] for line in lines if line.startswith('@prefix ')}
+        self.assertEqual(prefixes, set(re.findall(r'PREFIX (\S+)', PREFIXES)))
+        return [line for line in lines if line != '' and not line.startswith('@prefix ')]
+
+    def test_posted_turtle_round_trips(self) -> None:
+        triples = ['osmnode:1 rdf:type osm:node .', 'osmnode:1 osmkey:name "Caf\u00e9 \\"Zum\\" <&>" .']
+        self.connector.insert_triples(triples)
+        self.assertEqual(self.read_posted_triples(), triples)
+
+    def test_blank_nodes_are_relabeled_outside_literals(self) -> None:
+        self.connector.insert_triples(['osmrel:1 osmrel:member _:0 .', '_:0 osm2rdfmember:id osmnode:1 .',
+                                       'osmrel:1 osmkey:name "a _:0 \\" _:1" .'])
+        self.connector.insert_triples(['osmrel:2 osmrel:member _:0 .'])
+
+        posted = self.read_posted_triples()
+        first_label = posted[0].split()[2]
+        second_label = posted[3].split()[2]
+        self.assertTrue(first_label.startswith('_:'))
+        self.assertEqual(posted[1].split()[0], first_label)
+        self.assertNotEqual(first_label, second_label)
+        self.assertEqual(posted[2], 'osmrel:1 osmkey:name "a _:0 \\" _:1" .')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import gzip
+import os
+import tempfile
+import unittest
+from typing import Optional
+
+from Constants import PREFIXES
+from SparqlFileSink import SparqlFileSink
+
+
+class SparqlFileSinkTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self.directory.name, 'output.txt')
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def write_interrupted_run(self, compression: Optional[str]) -> None:
+        sink = SparqlFileSink(self.file_path, buffer_size=1, compression=compression)
+        sink.start_diff(1)
+        sink.write('INSERT DATA { osmnode:1 osmkey:a "1" . };\n')
+        sink.end_diff()
+        # The second diff is written to the file, but the run stops before its end
+        sink.start_diff(2)
+        sink.write('INSERT DATA { osmnode:2 osmkey:a "partial" . };\n')
+
+    def resume(self, compression: Optional[str]) -> None:
+        sink = SparqlFileSink(self.file_path, buffer_size=1, compression=compression)
+        sink.start_diff(2)
+        sink.write('INSERT DATA { osmnode:2 osmkey:a "2" . };\n')
+        sink.end_diff()
+        sink.close()
+
+    def test_restart_keeps_complete_diffs_and_drops_the_interrupted_one(self) -> None:
+        self.write_interrupted_run(None)
+        self.resume(None)
+
+        with open(self.file_path) as file:
+            content = file.read()
+        self.assertEqual(content, PREFIXES + 'INSERT DATA { osmnode:1 osmkey:a "1" . };\n'
+                         + 'INSERT DATA { osmnode:2 osmkey:a "2" . };\n')
+
+    def test_restart_continues_a_gzip_file(self) -> None:
+        self.write_interrupted_run('gzip')
+        self.resume('gzip')
+
+        with gzip.open(self.file_path + '.gz', 'rt') as file:
+            content = file.read()
+        self.assertEqual(content, PREFIXES + 'INSERT DATA { osmnode:1 osmkey:a "1" . };\n'
+                         + 'INSERT DATA { osmnode:2 osmkey:a "2" . };\n')
+
+    def test_new_file_without_recorded_size_starts_over(self) -> None:
+        with open(self.file_path, 'w') as file:
+            file.write('INSERT DATA { osmnode:3 osmkey:a "unknown" . };\n')
+
+        self.resume(None)
+
+        with open(self.file_path) as file:
+            self.assertEqual(file.read(), PREFIXES + 'INSERT DATA { osmnode:2 osmkey:a "2" . };\n')